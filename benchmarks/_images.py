@@ -0,0 +1,35 @@
+"""Synthetic test images shared by the benchmarks (Pillow only)."""
+
+from __future__ import annotations
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+
+def photo_like(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Camera-style RGB image: smooth gradients plus blurred sensor noise."""
+    bands = []
+    for i, sigma in enumerate((48, 56, 64)):
+        gradient = Image.linear_gradient("L").resize((width, height))
+        if (i + seed) % 2:
+            gradient = gradient.transpose(Image.Transpose.ROTATE_180)
+        noise = Image.effect_noise((width, height), sigma).filter(ImageFilter.GaussianBlur(1.5))
+        bands.append(ImageChops.blend(gradient, noise, 0.5))
+    return Image.merge("RGB", bands)
+
+
+def graphic_like(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Screenshot-style RGB image: flat fills, boxes and thin lines."""
+    img = Image.new("RGB", (width, height), (245, 245, 245))
+    draw = ImageDraw.Draw(img)
+    step = max(8, min(width, height) // 24)
+    for n, y in enumerate(range(0, height, step)):
+        color = ((n * 37 + seed) % 255, (n * 91) % 255, (n * 53) % 255)
+        draw.rectangle((step, y, width // 2, y + step // 2), fill=color)
+        draw.line((width // 2, y, width - step, y + step), fill=(20, 20, 20), width=2)
+    return img
+
+
+CORPUS = {
+    "photo": photo_like,
+    "graphic": graphic_like,
+}
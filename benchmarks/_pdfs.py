@@ -0,0 +1,80 @@
+"""Synthetic multi-page text PDFs shared by the benchmarks (no dependencies)."""
+
+from __future__ import annotations
+
+import random
+
+_WORDS = (
+    "agreement party shall term notice payment service data report annual "
+    "revenue section clause schedule delivery period margin total review"
+).split()
+
+
+def _page_stream(page: int, lines: int, columns: int, rng: random.Random) -> bytes:
+    ops = ["BT", "/F1 10 Tf", "12 TL"]
+    width = 500 // columns
+    for col in range(columns):
+        ops.append(f"1 0 0 1 {50 + col * width} 780 Tm")
+        for _ in range(lines):
+            words = " ".join(rng.choice(_WORDS) for _ in range(max(3, 12 // columns)))
+            ops.append(f"({words}) Tj T*")
+    ops.append(f"1 0 0 1 280 30 Tm (Page {page + 1}) Tj")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def text_pdf(
+    path: str,
+    pages: int,
+    lines: int = 50,
+    columns: int = 1,
+    seed: int = 0,
+    variant: dict | None = None,
+    page_columns: dict | None = None,
+) -> None:
+    """Write a PDF with ``pages`` pages of pseudo-random text.
+
+    Args:
+        path: Output file path.
+        pages: Number of pages.
+        lines: Text lines per column.
+        columns: Text columns per page (1 for simple pages).
+        seed: Random seed for the text.
+        variant: Optional {page_index: seed} overriding the text of some
+            pages, e.g. to simulate a revised document.
+        page_columns: Optional {page_index: columns} overriding ``columns``
+            for some pages, e.g. to mix simple and multi-column layouts.
+    """
+    variant = variant or {}
+    page_columns = page_columns or {}
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        rng = random.Random(variant.get(page, seed * 100003 + page))
+        stream = _page_stream(page, lines, page_columns.get(page, columns), rng)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
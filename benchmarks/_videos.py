@@ -0,0 +1,76 @@
+"""Synthetic test videos shared by the benchmarks (NumPy + moviepy's ffmpeg)."""
+
+from __future__ import annotations
+
+import subprocess
+
+import imageio_ffmpeg
+import numpy as np
+
+
+def camera_like(width: int, height: int, t: float, seed: int = 0) -> np.ndarray:
+    """Handheld-camera style frame: panning gradients plus sensor noise."""
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    pan = 0.35 * t
+    r = 0.5 + 0.5 * np.sin(6 * (x + pan) + 2 * y)
+    g = 0.5 + 0.5 * np.cos(5 * (y - 0.2 * t) + 3 * x)
+    b = 0.5 + 0.5 * np.sin(4 * (x * y) + t)
+    frame = np.stack([r, g, b], axis=2) * 200
+    rng = np.random.default_rng(seed * 100003 + int(t * 1000))
+    frame += rng.normal(0, 8, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def screen_like(width: int, height: int, t: float, seed: int = 0) -> np.ndarray:
+    """Screen-recording style frame: static window, text rows, moving cursor."""
+    frame = np.full((height, width, 3), 242, dtype=np.uint8)
+    bar = max(8, height // 20)
+    frame[:bar] = (60, 64, 72)
+    rows = max(4, height // 24)
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(width // 5, width - width // 8, size=height // rows)
+    typed = int(t * 4)  # a new line of "text" every quarter second
+    for n, length in enumerate(lengths[: min(len(lengths), 6 + typed)]):
+        top = bar + 6 + n * rows
+        frame[top:top + rows // 3, width // 16:length] = (40, 40, 40)
+    cx = int((0.2 + 0.6 * (0.5 + 0.5 * np.sin(t))) * width)
+    cy = int((0.3 + 0.4 * (0.5 + 0.5 * np.cos(0.7 * t))) * height)
+    size = max(6, width // 60)
+    frame[cy:cy + size, cx:cx + size // 2] = (10, 10, 10)
+    return frame
+
+
+CLIPS = {
+    "camera": camera_like,
+    "screen": screen_like,
+}
+
+
+def write_clip(path: str, kind: str, width: int, height: int, duration: float, fps: int = 30) -> None:
+    """Encode a synthetic clip to H.264 with moviepy's bundled ffmpeg."""
+    make = CLIPS[kind]
+    writer = imageio_ffmpeg.write_frames(
+        path, (width, height), fps=fps, codec="libx264", quality=7,
+        macro_block_size=16, ffmpeg_log_level="error",
+    )
+    writer.send(None)
+    try:
+        for n in range(int(duration * fps)):
+            writer.send(make(width, height, n / fps))
+    finally:
+        writer.close()
+
+
+def write_pattern(path: str, width: int, height: int, duration: float, fps: int = 30) -> None:
+    """Encode ffmpeg's noisy test pattern; fast enough for 4K inputs.
+
+    Keyframes are one second apart, like phone footage, so seeks are cheap.
+    """
+    subprocess.run(
+        [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y", "-f", "lavfi",
+         "-i", f"testsrc2=size={width}x{height}:rate={fps},noise=alls=12:allf=t",
+         "-t", f"{duration}", "-c:v", "libx264", "-preset", "ultrafast", "-g", str(fps),
+         "-pix_fmt", "yuv420p", path],
+        check=True,
+    )
@@ -0,0 +1,80 @@
+"""Benchmark imgsizer.auto_adjust against the previous linear quality sweep.
+
+Usage:
+    uv run --package imgsizer python benchmarks/bench_auto_adjust.py [--megapixels 24]
+
+Reports encode count, wall time and the chosen (quality, scale) for each
+target size on a synthetic camera-style photo.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+
+from PIL import Image
+
+from imgsizer import search_quality_scale
+
+from _images import photo_like
+
+
+def legacy_auto_adjust(img: Image.Image, target_bytes: int):
+    """The original linear sweep, instrumented to count encodes."""
+    encodes = 0
+
+    def size_at(image, quality):
+        nonlocal encodes
+        encodes += 1
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=quality, optimize=True)
+        return buf.tell()
+
+    for quality in range(100, 10, -5):
+        if size_at(img, quality) <= target_bytes:
+            return quality, 1.0, encodes
+
+    best_quality, best_scale = 30, 1.0
+    low, high = 0.1, 1.0
+    while high - low > 0.01:
+        scale = (low + high) / 2
+        test_img = img.resize((int(img.width * scale), int(img.height * scale)), Image.Resampling.LANCZOS)
+        if size_at(test_img, best_quality) <= target_bytes:
+            low = best_scale = scale
+        else:
+            high = scale
+    return best_quality, best_scale, encodes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=24.0)
+    parser.add_argument("--targets-kb", type=int, nargs="+", default=[4096, 1024, 256, 64])
+    args = parser.parse_args()
+
+    width = int((args.megapixels * 1e6 * 1.5) ** 0.5)
+    height = int(width / 1.5)
+    img = photo_like(width, height)
+    print(f"Image: {width}x{height} ({args.megapixels:g} MP)\n")
+    print(f"{'target':>8} | {'legacy enc':>10} {'time':>7} {'q/scale':>10} | "
+          f"{'new enc':>7} {'time':>7} {'q/scale':>10} | speed-up")
+
+    for target_kb in args.targets_kb:
+        target = target_kb * 1024
+
+        t0 = time.perf_counter()
+        lq, ls, lenc = legacy_auto_adjust(img, target)
+        legacy_t = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        result = search_quality_scale(img, target)
+        new_t = time.perf_counter() - t0
+
+        print(f"{target_kb:>6}KB | {lenc:>10} {legacy_t:>6.2f}s {lq:>4}/{ls:<5.3f} | "
+              f"{result.encodes:>7} {new_t:>6.2f}s {result.quality:>4}/{result.scale:<5.3f} | "
+              f"{legacy_t / new_t:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
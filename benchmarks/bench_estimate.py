@@ -0,0 +1,59 @@
+"""Measure imgsizer fast size-estimation accuracy and cost against exact encodes.
+
+Usage:
+    uv run --package imgsizer python benchmarks/bench_estimate.py
+
+For every synthetic corpus image, size and quality, prints the exact
+encoded size, the fast estimate, its stated error bound, whether the exact
+size fell inside that bound, and the time each mode took.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from imgsizer.estimate import estimate_exact, estimate_fast
+
+from _images import CORPUS
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1280, 2048, 4000])
+    parser.add_argument("--qualities", type=int, nargs="+", default=[50, 85])
+    parser.add_argument("--formats", nargs="+", default=["JPEG", "PNG"])
+    args = parser.parse_args()
+
+    print(f"{'image':>8} {'size':>10} {'fmt':>5} {'q':>3} | {'exact':>9} {'fast':>9} "
+          f"{'err':>6} {'bound':>6} ok | {'t exact':>8} {'t fast':>8}")
+
+    inside = total = 0
+    worst = 0.0
+    for name, make in CORPUS.items():
+        for long_side in args.sizes:
+            img = make(long_side, long_side * 2 // 3)
+            for fmt in args.formats:
+                for quality in args.qualities if fmt == "JPEG" else [0]:
+                    t0 = time.perf_counter()
+                    exact = estimate_exact(img, quality, fmt)
+                    t_exact = time.perf_counter() - t0
+
+                    t0 = time.perf_counter()
+                    fast = estimate_fast(img, quality, fmt)
+                    t_fast = time.perf_counter() - t0
+
+                    err = (fast.size - exact.size) / exact.size
+                    ok = abs(err) <= fast.error
+                    inside += ok
+                    total += 1
+                    worst = max(worst, abs(err))
+                    print(f"{name:>8} {img.width:>4}x{img.height:<5} {fmt:>5} {quality:>3} | "
+                          f"{exact.size:>9} {fast.size:>9} {err:>+6.1%} {fast.error:>6.1%} "
+                          f"{'y' if ok else 'n':>2} | {t_exact:>7.3f}s {t_fast:>7.3f}s")
+
+    print(f"\n{inside}/{total} exact sizes inside the stated bound; worst error {worst:.1%}")
+
+
+if __name__ == "__main__":
+    main()
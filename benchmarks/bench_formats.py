@@ -0,0 +1,54 @@
+"""Compare imgsizer format selection against encoding every format in full.
+
+Usage:
+    uv run --package imgsizer python benchmarks/bench_formats.py
+
+For every synthetic corpus image, size and budget, prints the format and
+quality choose_format() picked, its size, the time it took, and the time a
+naive full encode of every available format at the same quality takes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from imgsizer import available_formats, choose_format, export_image
+
+from _images import CORPUS
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1280, 2048, 4000])
+    parser.add_argument("--budgets-kb", type=int, nargs="+", default=[0, 300])
+    parser.add_argument("--quality", type=int, default=85)
+    args = parser.parse_args()
+
+    formats = available_formats()
+    print(f"formats: {', '.join(formats)}\n")
+    print(f"{'image':>8} {'size':>10} {'budget':>7} | {'fmt':>5} {'q':>3} {'bytes':>9} "
+          f"{'fits':>4} | {'t choose':>8} {'t naive':>8}  candidates (ms)")
+
+    for name, make in CORPUS.items():
+        for long_side in args.sizes:
+            img = make(long_side, long_side * 2 // 3)
+
+            t0 = time.perf_counter()
+            for fmt in formats:
+                export_image(img, fmt, args.quality)
+            t_naive = time.perf_counter() - t0
+
+            for budget_kb in args.budgets_kb:
+                target = budget_kb * 1024 or None
+                choice = choose_format(img, target, args.quality)
+                timings = " ".join(f"{c.fmt}@{c.quality}:{c.seconds * 1000:.0f}{c.status[0]}"
+                                   for c in choice.candidates)
+                print(f"{name:>8} {img.width:>4}x{img.height:<5} {budget_kb or '-':>7} | "
+                      f"{choice.fmt:>5} {choice.quality:>3} {choice.size:>9} "
+                      f"{'y' if choice.fits else 'n':>4} | {choice.seconds:>7.3f}s "
+                      f"{t_naive:>7.3f}s  {timings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Measure hub responsiveness while conversions run, per execution backend.
+
+Usage:
+    uv run --package akatz-utils-launcher python benchmarks/bench_launcher_backend.py [--jobs 2 --seconds 6 --pages 80]
+
+Submits --jobs video conversions (moviepy engine, the most Python-heavy
+path) and as many pdfplumber PDF conversions through the launcher's
+routes, first with the "thread" and then with the "process" execution
+backend, while another thread times small hub requests (/api/store/stats).
+Prints request latency percentiles and the time until every conversion
+finished.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from launcher.app import create_app
+from launcher.execution import process_pool
+from launcher.jobs import jobs
+
+from _pdfs import text_pdf
+from _videos import write_clip
+
+
+def _follow(client, tool: str, task_id: str) -> dict:
+    resp = client.get(f"/api/{tool}/progress/{task_id}", buffered=False)
+    last = {}
+    for chunk in resp.response:
+        for line in chunk.decode().splitlines():
+            if line.startswith("data:"):
+                last = json.loads(line[5:])
+    return last
+
+
+def _run(app, mode: str, video: str, pdf: str, count: int) -> tuple[list[float], float, list[dict]]:
+    app.config["EXECUTION_BACKEND"] = mode
+    client = app.test_client()
+    latencies: list[float] = []
+    stop = threading.Event()
+
+    def probe():
+        hub = app.test_client()
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            hub.get("/api/store/stats")
+            latencies.append(time.perf_counter() - t0)
+            time.sleep(0.02)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    t0 = time.perf_counter()
+    tasks = []
+    for _ in range(count):
+        with open(video, "rb") as f:
+            tasks.append(("vid2gif", client.post("/api/vid2gif/convert", data={"file": (f, "clip.mp4")}).json["task_id"]))
+        with open(pdf, "rb") as f:
+            tasks.append(("pdf2md", client.post("/api/pdf2md/convert", data={"file": (f, "doc.pdf")}).json["task_id"]))
+    results = [_follow(client, tool, task_id) for tool, task_id in tasks]
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    prober.join()
+    return latencies, elapsed, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=2, help="conversions of each kind")
+    parser.add_argument("--seconds", type=float, default=6, help="length of the video")
+    parser.add_argument("--pages", type=int, default=80)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=368)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.update(VID2GIF_ENGINE="moviepy", PDF2MD_BACKEND="pdfplumber", PDF2MD_WORKERS=1)
+    t0 = time.perf_counter()
+    process_pool.configure(start=True)
+    print(f"{jobs.workers} job workers; worker processes spawned in {time.perf_counter() - t0:.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "clip.mp4")
+        pdf = os.path.join(tmp, "doc.pdf")
+        write_clip(video, "camera", args.width, args.height, args.seconds)
+        print(f"{args.jobs} x ({args.seconds:g}s video + {args.pages}-page PDF)\n")
+        print(f"{'backend':<8} | {'requests':>8} {'p50':>8} {'p95':>8} {'max':>8} | {'all done':>8} | failed")
+        for seed, mode in enumerate(("thread", "process")):
+            # A fresh PDF per run so the page cache does not skip the work
+            text_pdf(pdf, args.pages, seed=seed + 100)
+            latencies, elapsed, results = _run(app, mode, video, pdf, args.jobs)
+            ms = sorted(x * 1000 for x in latencies)
+            p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+            failed = sum("done" not in r for r in results)
+            print(f"{mode:<8} | {len(ms):>8} {statistics.median(ms):>6.1f}ms {p95:>6.1f}ms {ms[-1]:>6.1f}ms | "
+                  f"{elapsed:>7.1f}s | {failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Load-test the hub on the dev server and under ``akatz-utils serve``.
+
+Usage:
+    uv run --package akatz-utils-launcher --extra serve python benchmarks/bench_launcher_serve.py \
+        [--concurrency 32 --seconds 10 --workers 1 2]
+
+Starts the hub as a subprocess, first with ``akatz-utils --no-browser``
+(Werkzeug's threaded development server) and then with ``akatz-utils serve``
+for each --workers count, and has --concurrency client threads send
+requests over keep-alive connections for --seconds: the hub page, the job
+stats endpoint and imgsizer previews of an uploaded photo at varying sizes
+(the CPU-bound part). Prints throughput and latency percentiles per server
+and per endpoint.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from _images import photo_like
+
+
+def _wait_for_port(port: int, proc: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def _upload(port: int, data: bytes) -> str:
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"photo.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("POST", "/api/imgsizer/upload", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    return json.loads(conn.getresponse().read())["file_id"]
+
+
+def _load(port: int, file_id: str, concurrency: int, seconds: float) -> dict[str, list]:
+    """Run the client threads; returns latencies (None for failures) per endpoint."""
+    results: dict[str, list] = {"hub": [], "stats": [], "preview": []}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(seed: int) -> None:
+        rng = random.Random(seed)
+        conn = None
+        while time.monotonic() < deadline:
+            kind = rng.choice(("hub", "stats", "preview"))
+            if kind == "preview":
+                width = rng.randrange(100, 800)
+                args = ("POST", "/api/imgsizer/preview",
+                        json.dumps({"file_id": file_id, "width": width, "height": width * 2 // 3}),
+                        {"Content-Type": "application/json"})
+            else:
+                args = ("GET", "/" if kind == "hub" else "/api/jobs/stats")
+            t0 = time.perf_counter()
+            try:
+                conn = conn or http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                conn.request(*args)
+                resp = conn.getresponse()
+                resp.read()
+                latency = time.perf_counter() - t0 if resp.status == 200 else None
+                if resp.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                latency = None
+                conn = None
+            with lock:
+                results[kind].append(latency)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def _report(name: str, results: dict[str, list], seconds: float) -> None:
+    done = [x for values in results.values() for x in values if x is not None]
+    failed = sum(x is None for values in results.values() for x in values)
+    rows = [("all", done)] + [(kind, [x for x in values if x is not None]) for kind, values in results.items()]
+    for kind, values in rows:
+        ms = sorted(x * 1000 for x in values) or [0.0]
+        p95, p99 = (ms[min(len(ms) - 1, int(len(ms) * q))] for q in (0.95, 0.99))
+        label = name if kind == "all" else ""
+        extra = f" | {failed} failed" if kind == "all" else ""
+        print(f"{label:<16} {kind:<8} {len(values) / seconds:>8.1f}/s {statistics.median(ms):>7.1f}ms "
+              f"{p95:>7.1f}ms {p99:>7.1f}ms{extra}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="serve worker counts to test")
+    parser.add_argument("--threads", type=int, default=16, help="request threads per serve worker")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    photo = io.BytesIO()
+    photo_like(2400, 1600).save(photo, "JPEG", quality=90)
+    servers = [("dev server", ["--no-browser", "--port", str(args.port)])]
+    for workers in args.workers:
+        servers.append((f"serve x{workers}", ["serve", "--port", str(args.port), "--workers", str(workers),
+                                              "--threads", str(args.threads)]))
+
+    print(f"{args.concurrency} clients for {args.seconds:g}s each\n")
+    print(f"{'server':<16} {'endpoint':<8} {'rate':>10} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, cli in servers:
+        with tempfile.TemporaryDirectory() as tmp:
+            if cli[0] == "serve":
+                cli += ["--set", f"ARTIFACT_DIR={json.dumps(tmp)}"]
+            proc = subprocess.Popen([sys.executable, "-m", "launcher", *cli], cwd=tmp, env=os.environ,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                _wait_for_port(args.port, proc)
+                file_id = _upload(args.port, photo.getvalue())
+                results = _load(args.port, file_id, args.concurrency, args.seconds)
+            finally:
+                proc.terminate()
+                proc.wait(60)
+            _report(name, results, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare eager and reduced-resolution decoding in imgsizer.
+
+Usage:
+    uv run --package imgsizer python benchmarks/bench_load_image.py [--megapixels 24]
+
+Each measurement runs in a fresh subprocess so that its peak RSS growth is
+attributable to a single load + resize of a large synthetic photo, saved as
+JPEG, PNG, palette PNG and GIF.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss survives fork+exec on Linux, so prefer this process's VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child(path: str, strategy: str, width: int, height: int) -> None:
+    from imgsizer import LazyImage, load_image, resize_image
+
+    baseline = _peak_rss_mb()
+    t0 = time.perf_counter()
+    if strategy == "eager":
+        img = load_image(path)
+    else:
+        img = LazyImage.open(path).decode((width, height))
+    decoded = img.size
+    resize_image(img, width, height)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"seconds": elapsed, "rss_mb": _peak_rss_mb() - baseline, "decoded": decoded}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=24.0)
+    parser.add_argument("--targets", type=int, nargs="+", default=[800, 1600, 3000])
+    parser.add_argument("--child", nargs=4, metavar=("PATH", "STRATEGY", "W", "H"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        path, strategy, w, h = args.child
+        child(path, strategy, int(w), int(h))
+        return
+
+    from _images import photo_like
+
+    width = int((args.megapixels * 1e6 * 1.5) ** 0.5)
+    height = int(width / 1.5)
+    img = photo_like(width, height)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = {}
+        for fmt, ext in (("JPEG", ".jpg"), ("PNG", ".png")):
+            sources[fmt] = os.path.join(tmp, "source" + ext)
+            img.save(sources[fmt], format=fmt)
+        # Palette images, which reduce() does not take directly
+        paletted = img.quantize(256)
+        del img
+        for fmt, ext, name in (("PNG", ".png", "PNG-P"), ("GIF", ".gif", "GIF")):
+            sources[name] = os.path.join(tmp, "paletted" + ext)
+            paletted.save(sources[name], format=fmt)
+        del paletted
+
+        print(f"Source: {width}x{height} ({args.megapixels:g} MP)\n")
+        print(f"{'fmt':>5} {'target':>6} | {'eager time':>10} {'peak RSS':>9} | "
+              f"{'lazy time':>9} {'peak RSS':>9} {'decoded at':>11}")
+        for fmt, path in sources.items():
+            for target_w in args.targets:
+                target_h = int(target_w / 1.5)
+                results = {}
+                for strategy in ("eager", "lazy"):
+                    out = subprocess.run(
+                        [sys.executable, __file__, "--child", path, strategy, str(target_w), str(target_h)],
+                        check=True, capture_output=True, text=True,
+                    )
+                    results[strategy] = json.loads(out.stdout)
+                e, l = results["eager"], results["lazy"]
+                decoded = "x".join(map(str, l["decoded"]))
+                print(f"{fmt:>5} {target_w:>6} | {e['seconds']:>9.3f}s {e['rss_mb']:>7.0f}MB | "
+                      f"{l['seconds']:>8.3f}s {l['rss_mb']:>7.0f}MB {decoded:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare pdf2md extraction backends on throughput and output.
+
+Usage:
+    uv run --package pdf2md python benchmarks/bench_pdf2md_backends.py [--pages 100]
+
+Builds a synthetic PDF where a fraction of the pages use a multi-column
+layout, converts it with every backend and prints pages per second, how
+"auto" routed the pages, and how closely each backend's output matches
+pdfplumber's: pages identical, and word-sequence similarity for simple and
+complex pages separately.
+"""
+
+from __future__ import annotations
+
+import argparse
+import difflib
+import os
+import tempfile
+import time
+
+from pdf2md import BACKENDS, open_backend
+
+from _pdfs import text_pdf
+
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a.split(), b.split(), autojunk=False).ratio()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--complex-every", type=int, default=5,
+                        help="every Nth page uses a multi-column layout")
+    parser.add_argument("--columns", type=int, default=2)
+    args = parser.parse_args()
+
+    complex_pages = set(range(0, args.pages, args.complex_every))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mixed.pdf")
+        text_pdf(path, args.pages, page_columns=dict.fromkeys(complex_pages, args.columns))
+        print(f"{args.pages} pages, {len(complex_pages)} with {args.columns} columns\n")
+
+        outputs: dict[str, list[str]] = {}
+        print(f"{'backend':>10} | {'time':>8} {'pages/s':>8} {'routing':>14} | "
+              f"{'identical':>9} {'sim simple':>10} {'sim complex':>11}")
+        for name in ["pdfplumber"] + [n for n in BACKENDS if n != "pdfplumber"]:
+            t0 = time.perf_counter()
+            with open_backend(path, name) as backend:
+                outputs[name] = [backend.extract(i) or "" for i in range(backend.page_count)]
+                routing = (f"{backend.fast_pages} fast/{backend.slow_pages} slow"
+                           if hasattr(backend, "fast_pages") else "-")
+            elapsed = time.perf_counter() - t0
+
+            ref = outputs["pdfplumber"]
+            same = sum(a == b for a, b in zip(outputs[name], ref))
+            sims = {kind: [_similarity(outputs[name][i], ref[i]) for i in range(args.pages)
+                           if (i in complex_pages) == (kind == "complex")]
+                    for kind in ("simple", "complex")}
+            mean = {kind: sum(v) / len(v) if v else 1.0 for kind, v in sims.items()}
+            print(f"{name:>10} | {elapsed:>7.2f}s {args.pages / elapsed:>8.1f} {routing:>14} | "
+                  f"{same:>4}/{args.pages:<4} {mean['simple']:>10.3f} {mean['complex']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
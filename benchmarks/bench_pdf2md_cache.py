@@ -0,0 +1,56 @@
+"""Measure pdf2md's page cache on repeated revisions of one document.
+
+Usage:
+    uv run --package pdf2md python benchmarks/bench_pdf2md_cache.py [--pages 400 --changed 2]
+
+Converts a synthetic document cold, then a series of revisions that each
+change a few pages, all against one fresh PageCache. Prints time, cache
+hits and misses per revision and checks the output against an uncached
+conversion.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from pdf2md import PageCache, convert_pdf
+
+from _pdfs import text_pdf
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--changed", type=int, default=2)
+    parser.add_argument("--revisions", type=int, default=3)
+    parser.add_argument("--backend", default="pdfplumber")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PageCache(os.path.join(tmp, "cache"))
+        variant: dict[int, int] = {}
+        print(f"{'revision':>8} | {'time':>8} {'cached':>6} {'extracted':>9} same")
+        for revision in range(args.revisions + 1):
+            if revision:
+                for page in rng.sample(range(args.pages), args.changed):
+                    variant[page] = 1000 * revision + page
+            path = os.path.join(tmp, f"rev{revision}.pdf")
+            text_pdf(path, args.pages, variant=variant)
+
+            before = cache.stats()
+            t0 = time.perf_counter()
+            markdown = convert_pdf(path, backend=args.backend, cache=cache)
+            elapsed = time.perf_counter() - t0
+            after = cache.stats()
+            same = markdown == convert_pdf(path, backend=args.backend) if revision else True
+            print(f"{revision:>8} | {elapsed:>7.2f}s {after['hits'] - before['hits']:>6} "
+                  f"{after['misses'] - before['misses']:>9} {'y' if same else 'n':>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Check that pdf2md streaming conversion keeps peak memory flat.
+
+Usage:
+    uv run --package pdf2md python benchmarks/bench_pdf2md_memory.py [--pages 50 200 800]
+
+Each measurement runs in a fresh subprocess that streams a synthetic PDF's
+markdown to a file with iter_markdown() (or builds it with convert_pdf()
+for comparison) and reports its peak RSS growth. Exits non-zero if the
+streaming peak for the longest document exceeds the shortest one's by more
+than --tolerance-mb.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss survives fork+exec on Linux, so prefer this process's VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child(path: str, strategy: str) -> None:
+    from pdf2md import convert_pdf, iter_markdown
+
+    baseline = _peak_rss_mb()
+    t0 = time.perf_counter()
+    with open(path + ".md", "w", encoding="utf-8") as out:
+        if strategy == "stream":
+            for page in iter_markdown(path):
+                out.write(page)
+        else:
+            out.write(convert_pdf(path))
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"seconds": elapsed, "rss_mb": _peak_rss_mb() - baseline}))
+
+
+def _measure(path: str, strategy: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", path, strategy],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--tolerance-mb", type=float, default=16.0)
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "STRATEGY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    from _pdfs import text_pdf
+
+    print(f"{'pages':>6} | {'stream time':>11} {'peak RSS':>9} | {'string time':>11} {'peak RSS':>9}")
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in sorted(args.pages):
+            path = os.path.join(tmp, f"doc{pages}.pdf")
+            text_pdf(path, pages)
+            stream = _measure(path, "stream")
+            whole = _measure(path, "string")
+            peaks.append(stream["rss_mb"])
+            print(f"{pages:>6} | {stream['seconds']:>10.2f}s {stream['rss_mb']:>7.1f}MB | "
+                  f"{whole['seconds']:>10.2f}s {whole['rss_mb']:>7.1f}MB")
+
+    growth = peaks[-1] - peaks[0]
+    print(f"\nStreaming peak grew {growth:.1f} MB from {args.pages[0]} to {args.pages[-1]} pages")
+    if growth > args.tolerance_mb:
+        sys.exit(f"FAIL: more than {args.tolerance_mb:g} MB")
+
+
+if __name__ == "__main__":
+    main()
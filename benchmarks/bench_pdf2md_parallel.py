@@ -0,0 +1,51 @@
+"""Measure pdf2md parallel page extraction speed-up against worker count.
+
+Usage:
+    uv run --package pdf2md python benchmarks/bench_pdf2md_parallel.py [--pages 600]
+
+Converts a synthetic multi-page text PDF with 1, 2, 4, ... workers up to
+the CPU count and prints wall time, pages per second and speed-up over the
+single-process run. Every run's output is checked against the serial one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from pdf2md import convert_pdf
+
+from _pdfs import text_pdf
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--columns", type=int, default=2)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    counts = args.workers or sorted({1, cpus} | {2 ** k for k in range(cpus.bit_length()) if 2 ** k <= cpus})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.pdf")
+        text_pdf(path, args.pages, columns=args.columns)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB, {cpus} CPUs\n")
+        print(f"{'workers':>7} | {'time':>8} {'pages/s':>8} {'speed-up':>8} same")
+
+        baseline = reference = None
+        for workers in counts:
+            t0 = time.perf_counter()
+            markdown = convert_pdf(path, workers=workers)
+            elapsed = time.perf_counter() - t0
+            if baseline is None:
+                baseline, reference = elapsed, markdown
+            print(f"{workers:>7} | {elapsed:>7.2f}s {args.pages / elapsed:>8.1f} "
+                  f"{baseline / elapsed:>7.2f}x {'y' if markdown == reference else 'n':>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Measure what open progress streams cost, on threads vs on the event loop.
+
+Usage:
+    uv run --package akatz-utils-launcher python benchmarks/bench_progress_broker.py [--clients 200 1000]
+
+Opens --clients progress streams on one pdf2md task, first through the WSGI
+app with a thread per stream (as the threaded dev server serves them) and
+then as ASGI requests that the adapter in launcher/asgi.py hands to the
+event loop. Once every stream is subscribed it publishes --events events
+through the broker and reports the threads and memory the open streams
+hold and how long the events took to reach every stream. Each measurement
+runs in a fresh subprocess.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _parse(chunk: bytes, received: dict, now: float) -> None:
+    for line in chunk.decode().splitlines():
+        if line.startswith("id:"):
+            received[int(line[3:])] = now
+
+
+def _wait_subscribed(broker, count: int) -> None:
+    while broker.stats()["subscribers"] < count:
+        time.sleep(0.05)
+
+
+def _publish(broker, task_id: str, events: int) -> dict[int, float]:
+    sent = {}
+    for n in range(events):
+        t0 = time.perf_counter()
+        sent[broker.publish(task_id, 1, {"page": n, "total": events, "status": "Extracting"})] = t0
+        time.sleep(0.05)
+    t0 = time.perf_counter()
+    sent[broker.publish(task_id, 1, {"done": True})] = t0
+    return sent
+
+
+def _threaded(app, broker, url: str, task_id: str, clients: int, events: int):
+    streams = [{} for _ in range(clients)]
+
+    def client(received):
+        resp = app.test_client().get(url, buffered=False)
+        for chunk in resp.response:
+            _parse(chunk, received, time.perf_counter())
+
+    threads = [threading.Thread(target=client, args=(received,)) for received in streams]
+    for t in threads:
+        t.start()
+    _wait_subscribed(broker, clients)
+    held = threading.active_count(), _rss_mb()
+    sent = _publish(broker, task_id, events)
+    for t in threads:
+        t.join()
+    return held, sent, streams
+
+
+def _asgi(app, broker, url: str, task_id: str, clients: int, events: int):
+    from launcher.asgi import AsgiApp
+
+    asgi = AsgiApp(app)
+    streams = [{} for _ in range(clients)]
+
+    async def client(received):
+        requested = False
+        closed = asyncio.Event()
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await closed.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                _parse(message.get("body", b""), received, time.perf_counter())
+
+        scope = {"type": "http", "method": "GET", "path": url, "query_string": b"", "headers": [],
+                 "http_version": "1.1", "scheme": "http", "server": ("127.0.0.1", 80), "client": ("127.0.0.1", 1)}
+        await asgi(scope, receive, send)
+        closed.set()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        tasks = [asyncio.ensure_future(client(received)) for received in streams]
+        await loop.run_in_executor(None, _wait_subscribed, broker, clients)
+        held = threading.active_count(), _rss_mb()
+        sent = await loop.run_in_executor(None, _publish, broker, task_id, events)
+        await asyncio.gather(*tasks)
+        return held, sent
+
+    held, sent = asyncio.run(run())
+    return held, sent, streams
+
+
+def child(mode: str, clients: int, events: int) -> None:
+    from launcher.app import create_app
+    from launcher.broker import broker
+    from launcher.tasks import tasks
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"TASK_DB": os.path.join(tmp, "tasks.db")})
+        task_id = "bench"
+        tasks.create(task_id, "pdf2md", filename="bench.pdf", error=None)
+        base = threading.active_count(), _rss_mb()
+        url = f"/api/pdf2md/progress/{task_id}"
+        run = _threaded if mode == "thread" else _asgi
+        held, sent, streams = run(app, broker, url, task_id, clients, events)
+        latencies = [received[seq] - t0 for received in streams for seq, t0 in sent.items() if seq in received]
+        print(json.dumps({
+            "threads": held[0] - base[0],
+            "rss_mb": held[1] - base[1],
+            "latencies": latencies,
+            "missing": clients * len(sent) - len(latencies),
+        }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument("--events", type=int, default=20, help="progress events published per run")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, clients, events = args.child
+        child(mode, int(clients), int(events))
+        return
+
+    print(f"{args.events} events + done per run, fanned out to every stream\n")
+    print(f"{'mode':<6} {'streams':>7} | {'threads':>7} {'RSS':>9} {'per stream':>10} | "
+          f"{'p50':>8} {'p95':>8} {'max':>8} | missing")
+    for clients in args.clients:
+        for mode in ("thread", "asgi"):
+            out = subprocess.run([sys.executable, __file__, "--child", mode, str(clients), str(args.events)],
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            ms = sorted(x * 1000 for x in result["latencies"])
+            p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+            print(f"{mode:<6} {clients:>7} | {result['threads']:>7} {result['rss_mb']:>7.1f}MB "
+                  f"{result['rss_mb'] * 1024 / clients:>8.1f}KB | {statistics.median(ms):>6.1f}ms "
+                  f"{p95:>6.1f}ms {ms[-1]:>6.1f}ms | {result['missing']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare decode-time scaling and trimming with resizing frames in Python.
+
+Usage:
+    uv run --package vid2gif python benchmarks/bench_vid2gif_decode.py [--seconds 8 --start 2 --duration 4 --gif-width 480]
+
+Encodes a synthetic 4K clip (ffmpeg's noisy test pattern), then reads the
+[start, start + duration] window at 10 fps and --gif-width two ways: the
+previous path (moviepy VideoFileClip -> subclipped -> resized, every frame
+decoded at full resolution and resized in Python) and VideoSource, which
+hands the window, frame rate and size to ffmpeg. Prints the time to read
+every frame and to decode plan_gif's sampled segments, plus a full
+convert_video run per engine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from moviepy import VideoFileClip
+from vid2gif import VideoSource, convert_video
+from vid2gif.planning import _SAMPLE_FPS, _sample_spans
+from vid2gif.vid2gif import _sample_frames
+
+from _videos import write_pattern
+
+_FPS = 10
+
+
+def _timed(fn) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    count = fn()
+    return time.perf_counter() - t0, count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=8, help="length of the source clip")
+    parser.add_argument("--start", type=float, default=2)
+    parser.add_argument("--duration", type=float, default=4)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--gif-width", type=int, default=480)
+    parser.add_argument("--skip-convert", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "uhd.mp4")
+        print(f"Encoding {args.width}x{args.height} {args.seconds:g}s source...")
+        write_pattern(src, args.width, args.height, args.seconds)
+        end = args.start + args.duration
+
+        def python_frames() -> int:
+            with VideoFileClip(src) as video:
+                clip = video.subclipped(args.start, end).resized(width=args.gif_width)
+                return sum(1 for _ in clip.iter_frames(fps=_FPS, dtype="uint8"))
+
+        def python_samples() -> int:
+            with VideoFileClip(src) as video:
+                clip = video.subclipped(args.start, end).resized(width=args.gif_width)
+                segments, _ = _sample_frames(clip, clip.duration)
+                return sum(len(s) for s in segments)
+
+        source = VideoSource(src, args.duration, args.gif_width, None, "maintain", args.start)
+        spans, _ = _sample_spans(source.duration)
+
+        rows = [
+            ("all frames", _timed(python_frames), _timed(lambda: sum(1 for _ in source.iter_frames(_FPS)))),
+            ("samples", _timed(python_samples), _timed(lambda: sum(map(len, source.read_spans(spans))))),
+        ]
+        print(f"\n{args.duration:g}s from {args.start:g}s at {_FPS} fps, {source.w}x{source.h} "
+              f"(samples at {_SAMPLE_FPS} fps)")
+        print(f"{'read':<11} | {'python resize':>15} | {'decoder':>15} | {'speedup':>7}")
+        for name, (slow, n_slow), (fast, n_fast) in rows:
+            print(f"{name:<11} | {slow:>6.2f}s {n_slow:>4} fr | {fast:>6.2f}s {n_fast:>4} fr | {slow / fast:>6.1f}x")
+
+        if not args.skip_convert:
+            print()
+            for engine in ("ffmpeg", "moviepy"):
+                t0 = time.perf_counter()
+                mb = convert_video(src, os.path.join(tmp, "out.gif"), duration=args.duration,
+                                   width=args.gif_width, start=args.start, engine=engine)
+                print(f"convert_video(engine={engine!r}): {time.perf_counter() - t0:.2f}s, {mb:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
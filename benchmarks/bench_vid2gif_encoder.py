@@ -0,0 +1,65 @@
+"""Compare vid2gif's global-palette delta encoder with per-frame palettes.
+
+Usage:
+    uv run --package vid2gif python benchmarks/bench_vid2gif_encoder.py [--seconds 6 --width 640 --height 368]
+
+Renders synthetic screen-recording and camera-style frames in memory and
+encodes them with write_gif(method="adaptive") (a Pillow palette per frame,
+full frames) and write_gif(method="global") (one NumPy palette from evenly
+spaced frames, transparent delta rectangles). Prints encode time, GIF size
+and the mean per-pixel error of the decoded frames.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image
+from vid2gif import build_palette, write_gif
+
+from _videos import CLIPS
+
+_FPS = 10
+
+
+def _mean_error(data: bytes, frames: list[np.ndarray]) -> float:
+    errors = []
+    with Image.open(io.BytesIO(data)) as gif:
+        for n in range(gif.n_frames):
+            gif.seek(n)
+            decoded = np.asarray(gif.convert("RGB"), dtype=np.int16)
+            errors.append(np.abs(decoded - frames[n]).mean())
+    return float(np.mean(errors))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=6)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=368)
+    parser.add_argument("--colors", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    size = (args.width, args.height)
+    print(f"{'clip':<7} {'method':<9} | {'time':>7} {'size':>9} {'error':>6}")
+    for kind, make in CLIPS.items():
+        # Distinct frames only, so duplicate merging does not skew the error
+        frames = [make(args.width, args.height, n / _FPS) for n in range(int(args.seconds * _FPS))]
+        frames[1:] = [f for prev, f in zip(frames, frames[1:]) if not np.array_equal(prev, f)]
+        for method in ("adaptive", "global"):
+            buf = io.BytesIO()
+            t0 = time.perf_counter()
+            palette = build_palette(frames[::max(1, len(frames) // 10)], args.colors) if method == "global" else None
+            write_gif(iter(frames), buf, _FPS, size, args.colors, args.workers, method, palette)
+            elapsed = time.perf_counter() - t0
+            data = buf.getvalue()
+            print(f"{kind:<7} {method:<9} | {elapsed:>6.2f}s {len(data) / 1024:>7.0f}KB "
+                  f"{_mean_error(data, frames):>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
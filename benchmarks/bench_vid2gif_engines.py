@@ -0,0 +1,56 @@
+"""Compare vid2gif's ffmpeg and moviepy engines end to end.
+
+Usage:
+    uv run --package vid2gif python benchmarks/bench_vid2gif_engines.py [--seconds 12 --target-mb 0.5 2]
+
+Generates synthetic camera-like and screen-recording clips and runs
+convert_video on each with engine="ffmpeg" (trim, scale, fps and
+palettegen/paletteuse inside ffmpeg) and engine="moviepy" (frames decoded
+into Python and encoded with write_gif). Prints wall time, output size
+against the target and the settings each engine chose.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from vid2gif import convert_video
+
+from _videos import CLIPS, write_clip
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=12)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=368)
+    parser.add_argument("--out-width", type=int, default=480, help="GIF width (aspect kept)")
+    parser.add_argument("--target-mb", type=float, nargs="+", default=[0.5, 2.0])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'clip':<7} {'target':>7} {'engine':<8} | {'time':>7} {'size':>8}  settings")
+        for kind in CLIPS:
+            src = os.path.join(tmp, f"{kind}.mp4")
+            write_clip(src, kind, args.width, args.height, args.seconds)
+            out = os.path.join(tmp, "out.gif")
+            for target in args.target_mb:
+                for engine in ("ffmpeg", "moviepy"):
+                    messages: list[str] = []
+                    t0 = time.perf_counter()
+                    mb = convert_video(src, out, duration=args.seconds, target_size_mb=target,
+                                       width=args.out_width, engine=engine,
+                                       progress_callback=messages.append)
+                    elapsed = time.perf_counter() - t0
+                    chosen = next((m.split(": ", 1)[1] for m in reversed(messages)
+                                   if m.startswith(("Predicted", "Re-encoding"))), "")
+                    print(f"{kind:<7} {target:>5.2f}MB {engine:<8} | {elapsed:>6.1f}s "
+                          f"{mb:>6.2f}MB{'' if mb <= target else '!':1} {chosen}")
+        print("(! = over target)")
+
+
+if __name__ == "__main__":
+    main()
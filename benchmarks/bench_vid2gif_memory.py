@@ -0,0 +1,110 @@
+"""Check that vid2gif's streaming encoder keeps peak memory flat.
+
+Usage:
+    uv run --package vid2gif python benchmarks/bench_vid2gif_memory.py [--seconds 10 60 --width 640 --height 368]
+
+Each measurement runs in a fresh subprocess that encodes a synthetic
+camera-style clip to GIF with write_gif() (or, for comparison, with
+Pillow's multi-frame save, which holds every frame) and reports its peak
+RSS growth. Exits non-zero if the streaming peak for the longest clip
+exceeds the shortest one's by more than --tolerance-mb.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+_FPS = 10
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss survives fork+exec on Linux, so prefer this process's VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child(path: str, strategy: str) -> None:
+    from moviepy import VideoFileClip
+    from vid2gif import write_gif
+    from vid2gif.pipeline import prepare_frame
+
+    with VideoFileClip(path) as video:
+        size = (video.w, video.h)
+        frames = video.iter_frames(fps=_FPS, dtype="uint8")
+        video.get_frame(0)  # open the reader before taking the baseline
+        baseline = _peak_rss_mb()
+        t0 = time.perf_counter()
+        if strategy == "stream":
+            write_gif(frames, path + ".gif", _FPS, size)
+        else:
+            images = (prepare_frame(f, size, 256) for f in frames)
+            first = next(images)
+            first.save(path + ".gif", format="GIF", save_all=True, append_images=images,
+                       duration=round(1000 / _FPS), loop=0)
+        elapsed = time.perf_counter() - t0
+    print(json.dumps({"seconds": elapsed, "rss_mb": _peak_rss_mb() - baseline,
+                      "gif_mb": os.path.getsize(path + ".gif") / (1024 * 1024)}))
+
+
+def _measure(path: str, strategy: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", path, strategy],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60])
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=368)
+    parser.add_argument("--tolerance-mb", type=float, default=32.0)
+    parser.add_argument("--skip-pillow", action="store_true", help="only measure the streaming encoder")
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "STRATEGY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    from _videos import write_clip
+
+    print(f"{'seconds':>7} | {'stream time':>11} {'peak RSS':>9} | {'pillow time':>11} {'peak RSS':>9} | {'GIF':>7}")
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in sorted(args.seconds):
+            path = os.path.join(tmp, f"clip{seconds:g}.mp4")
+            write_clip(path, "camera", args.width, args.height, seconds)
+            stream = _measure(path, "stream")
+            peaks.append(stream["rss_mb"])
+            pillow = "-" * 21 if args.skip_pillow else None
+            if pillow is None:
+                whole = _measure(path, "pillow")
+                pillow = f"{whole['seconds']:>10.2f}s {whole['rss_mb']:>7.1f}MB"
+            print(f"{seconds:>7g} | {stream['seconds']:>10.2f}s {stream['rss_mb']:>7.1f}MB | "
+                  f"{pillow} | {stream['gif_mb']:>5.1f}MB")
+
+    growth = peaks[-1] - peaks[0]
+    print(f"\nStreaming peak grew {growth:.1f} MB from {min(args.seconds):g}s to {max(args.seconds):g}s")
+    if growth > args.tolerance_mb:
+        sys.exit(f"FAIL: more than {args.tolerance_mb:g} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Time vid2gif's draft preview and the full render that reuses it.
+
+Usage:
+    uv run --package vid2gif python benchmarks/bench_vid2gif_preview.py [--seconds 12 --target-mb 1.5]
+
+Encodes synthetic camera-like and screen-recording clips (1 s keyframe
+interval, like phone footage) and, per engine, opens a GifSession, renders
+the draft preview, plans the target size and converts. Compares the
+preview-then-convert total with a cold convert_video, which decodes the
+samples and plans on its own.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import imageio_ffmpeg
+from vid2gif import GifSession, convert_video
+
+from _videos import CLIPS, write_clip
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=12)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=368)
+    parser.add_argument("--target-mb", type=float, default=1.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "out.gif")
+        print(f"{'clip':<7} {'engine':<8} | {'draft':>6} {'plan':>6} {'convert':>8} {'total':>7} | "
+              f"{'cold':>6} | {'predicted':>9} {'actual':>7}")
+        for kind in CLIPS:
+            raw = os.path.join(tmp, f"{kind}-raw.mp4")
+            src = os.path.join(tmp, f"{kind}.mp4")
+            write_clip(raw, kind, args.width, args.height, args.seconds)
+            subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y", "-i", raw,
+                            "-c:v", "libx264", "-g", "30", "-crf", "20", src], check=True)
+            for engine in ("ffmpeg", "moviepy"):
+                t0 = time.perf_counter()
+                with GifSession(src, args.seconds, engine=engine) as session:
+                    session.preview(os.path.join(tmp, "draft.gif"))
+                    t1 = time.perf_counter()
+                    plan = session.plan(args.target_mb)
+                    t2 = time.perf_counter()
+                    mb = session.convert(out, args.target_mb)
+                    t3 = time.perf_counter()
+
+                cold = time.perf_counter()
+                convert_video(src, out, duration=args.seconds, target_size_mb=args.target_mb, engine=engine)
+                cold = time.perf_counter() - cold
+
+                predicted = plan.predicted_bytes / (1024 * 1024)
+                print(f"{kind:<7} {engine:<8} | {t1 - t0:>5.2f}s {t2 - t1:>5.2f}s {t3 - t2:>7.2f}s "
+                      f"{t3 - t0:>6.2f}s | {cold:>5.2f}s | {predicted:>7.2f}MB {mb:>5.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare vid2gif's predictive sizing against encode-then-retry.
+
+Usage:
+    uv run --package vid2gif python benchmarks/bench_vid2gif_sizing.py [--seconds 12 --target-mb 1.5]
+
+Generates synthetic camera-like and screen-recording clips, then converts
+each one twice: with the previous approach (full encode at 10 fps, then a
+second full encode at a reduced frame rate if it is too big) and with
+convert_video. Prints wall time, output size against the target, and the
+prediction error of plan_gif.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from moviepy import VideoFileClip
+from vid2gif import convert_video, plan_gif
+
+from _videos import CLIPS, write_clip
+
+
+def legacy_convert(input_path: str, output_path: str, duration: float, target_mb: float) -> float:
+    """The fixed 10 fps encode with one fps-reducing retry that convert_video used to do."""
+    video = VideoFileClip(input_path)
+    try:
+        video = video.subclipped(0, min(duration, video.duration))
+        video.write_gif(output_path, fps=10, logger=None)
+        size_mb = os.path.getsize(output_path) / (1024 * 1024)
+        if size_mb > target_mb:
+            fps = max(1, int(10 * (target_mb / size_mb) ** 0.5))
+            video.write_gif(output_path, fps=fps, logger=None)
+        return os.path.getsize(output_path) / (1024 * 1024)
+    finally:
+        video.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=12)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=368)
+    parser.add_argument("--target-mb", type=float, nargs="+", default=[0.5, 1.5])
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'clip':<7} {'target':>7} | {'legacy':>16} | {'predictive':>16} | {'predicted':>9} {'error':>6}")
+        for kind in CLIPS:
+            src = os.path.join(tmp, f"{kind}.mp4")
+            write_clip(src, kind, args.width, args.height, args.seconds)
+            out = os.path.join(tmp, "out.gif")
+            for target in args.target_mb:
+                legacy = "-"
+                if not args.skip_legacy:
+                    t0 = time.perf_counter()
+                    mb = legacy_convert(src, out, args.seconds, target)
+                    legacy = f"{time.perf_counter() - t0:>6.1f}s {mb:>5.2f}MB{'' if mb <= target else '!':1}"
+
+                t0 = time.perf_counter()
+                mb = convert_video(src, out, duration=args.seconds, target_size_mb=target, engine="moviepy")
+                predictive = f"{time.perf_counter() - t0:>6.1f}s {mb:>5.2f}MB{'' if mb <= target else '!':1}"
+
+                with VideoFileClip(src) as video:
+                    plan = plan_gif(video.subclipped(0, min(args.seconds, video.duration)),
+                                    int(target * 1024 * 1024))
+                predicted = plan.predicted_bytes / (1024 * 1024)
+                error = (predicted - mb) / mb * 100
+                print(f"{kind:<7} {target:>5.2f}MB | {legacy:>16} | {predictive:>16} | "
+                      f"{predicted:>7.2f}MB {error:>+5.0f}%")
+        print("(! = over target)")
+
+
+if __name__ == "__main__":
+    main()
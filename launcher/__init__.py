@@ -1,17 +1,72 @@
 """Akatz Utils Launcher - Web-based hub for utility tools."""
 
+import argparse
+import json
 import threading
 import webbrowser
+from typing import Optional
 
 __version__ = "0.1.0"
 
 
-def main() -> None:
-    """Start the Flask server and open the browser."""
+def _setting(text: str) -> tuple:
+    """Parse a KEY=VALUE app setting; VALUE is read as JSON when it parses."""
+    key, sep, value = text.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {text!r}")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def _parse_args(argv: Optional[list]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="akatz-utils", description=__doc__)
+    parser.add_argument("--port", type=int, help="port to listen on (default 5000, or 8000 for serve)")
+    parser.add_argument("--no-browser", action="store_true", help="do not open the hub in a browser")
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="run the hub under a production server (needs the 'serve' extra)")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to bind (0.0.0.0 for all)")
+    # Its own dest, so that the unset subcommand option does not overwrite
+    # a --port given before "serve"
+    serve.add_argument("--port", dest="serve_port", type=int, help="port to listen on (default 8000)")
+    serve.add_argument("--workers", type=int, default=1, help="worker processes")
+    serve.add_argument("--threads", type=int, default=16, help="request threads per worker")
+    serve.add_argument("--keep-alive", type=int, default=5, help="seconds an idle connection stays open")
+    serve.add_argument("--request-timeout", type=float, default=300,
+                       help="seconds a request may go without progress before it is answered 408/503 (0 = never)")
+    serve.add_argument("--graceful-timeout", type=int, default=30,
+                       help="seconds open connections get to finish on SIGTERM")
+    serve.add_argument("--drain-timeout", type=float, default=300,
+                       help="seconds running conversions then get to finish before they are cancelled")
+    serve.add_argument("--set", dest="config", type=_setting, action="append", default=[], metavar="KEY=VALUE",
+                       help="override an app setting, e.g. --set JOB_WORKERS=4 (repeatable)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list] = None) -> None:
+    """Start the hub: on the dev server in a browser, or with ``serve`` for production."""
+    args = _parse_args(argv)
+    if args.command == "serve":
+        from .serve import ServeOptions, serve
+
+        serve(ServeOptions(
+            host=args.host,
+            port=args.serve_port or args.port or 8000,
+            workers=args.workers,
+            threads=args.threads,
+            keep_alive=args.keep_alive,
+            request_timeout=args.request_timeout or None,
+            graceful_timeout=args.graceful_timeout,
+            drain_timeout=args.drain_timeout,
+            config=dict(args.config),
+        ))
+        return
+
     from .app import create_app
 
     app = create_app()
-    port = 5000
+    port = args.port or 5000
 
     # Open browser after a short delay to let the server start
     def open_browser():
@@ -19,7 +74,8 @@ def main() -> None:
         time.sleep(0.8)
         webbrowser.open(f"http://localhost:{port}")
 
-    threading.Thread(target=open_browser, daemon=True).start()
+    if not args.no_browser:
+        threading.Thread(target=open_browser, daemon=True).start()
 
     print(f"Akatz Utils Hub running at http://localhost:{port}")
     print("Press Ctrl+C to stop")
@@ -2,6 +2,10 @@
 
 from __future__ import annotations
 
+import os
+import tempfile
+from typing import Optional
+
 from flask import Flask
 
 # Tool registry: id -> metadata
@@ -27,25 +31,108 @@ TOOLS = [
 ]
 
 
-def create_app() -> Flask:
-    """Create and configure the Flask application."""
+def create_app(config: Optional[dict] = None) -> Flask:
+    """Create and configure the Flask application.
+
+    Args:
+        config: Overrides for the default settings below, applied before the
+            shared stores, scheduler and worker pool are configured.
+    """
+    from .uploads import StreamingRequest
+
     app = Flask(__name__, static_folder="static", template_folder="templates")
-    app.config["MAX_CONTENT_LENGTH"] = 500 * 1024 * 1024  # 500 MB upload limit
+    app.request_class = StreamingRequest
+    app.config["MAX_CONTENT_LENGTH"] = 500 * 1024 * 1024  # 500 MB upload limit (also per resumable upload)
+    app.config["UPLOAD_MAX_SESSIONS"] = 64  # resumable uploads open at once (until used or expired) before 429
+    app.config["ARTIFACT_MEMORY_BYTES"] = 256 * 1024 * 1024  # in-memory budget before spilling
+    app.config["ARTIFACT_DISK_BYTES"] = 4 * 1024 * 1024 * 1024  # spill budget before evicting
+    app.config["ARTIFACT_TTL_SECONDS"] = 6 * 3600  # idle artifacts are removed after this
+    app.config["ARTIFACT_BACKEND"] = "memory"  # "memory" (per process) or "shared" (ARTIFACT_DIR, all workers)
+    app.config["ARTIFACT_DIR"] = None  # directory for shared artifacts and uploads (None = system temp dir)
+    app.config["TASK_DB"] = None  # SQLite task database (None = akatz-utils-tasks.db in ARTIFACT_DIR or the temp dir)
+    app.config["IMGSIZER_BATCH_WORKERS"] = None  # batch resize processes (None = CPU count)
+    app.config["PDF2MD_WORKERS"] = None  # page extraction processes per PDF (None = CPU count)
+    app.config["PDF2MD_BACKEND"] = "auto"  # "auto", "pdfium" or "pdfplumber"
+    app.config["PDF2MD_CACHE_DIR"] = None  # per-page cache for revised PDFs (None = ~/.cache)
+    app.config["PDF2MD_CACHE_BYTES"] = 512 * 1024 * 1024  # page cache size before evicting
+    app.config["VID2GIF_WORKERS"] = None  # palette quantization threads per GIF (None = up to 4)
+    app.config["VID2GIF_ENGINE"] = "auto"  # "auto" (ffmpeg, falling back to moviepy), "ffmpeg" or "moviepy"
+    app.config["JOB_WORKERS"] = None  # conversions running at once across tools (None = half the CPUs, at least 2)
+    app.config["JOB_LIMITS"] = {"imgsizer": 1, "pdf2md": 2, "vid2gif": 2}  # per-tool caps on running conversions
+    app.config["JOB_MAX_WAITING"] = 32  # queued conversions before new ones are refused with 429
+    app.config["EXECUTION_BACKEND"] = "thread"  # "thread", or "process" to convert in warm worker processes
+    app.config["SSE_COALESCE_SECONDS"] = 0.25  # minimum interval between page/status progress events of a run
+    app.config["SSE_REPLAY_EVENTS"] = 256  # recent events kept per followed task for reconnecting streams
+    app.config["SSE_DETACH_GRACE_SECONDS"] = 10  # a run left without progress streams is cancelled after this
+    app.config.update(config or {})
+
+    from . import uploads
+    from .broker import broker
+    from .execution import process_pool
+    from .jobs import jobs
+    from .store import ArtifactStore, SharedArtifactStore, artifacts
+    from .tasks import tasks
+
+    # Task state, progress and upload sessions go through the task database,
+    # so with the shared artifact backend any worker process can serve any
+    # request of a task
+    base_dir = app.config["ARTIFACT_DIR"] or tempfile.gettempdir()
+    tasks.configure(
+        path=app.config["TASK_DB"] or os.path.join(base_dir, "akatz-utils-tasks.db"),
+        ttl_seconds=app.config["ARTIFACT_TTL_SECONDS"],
+        detach_grace=app.config["SSE_DETACH_GRACE_SECONDS"],
+    )
+    broker.configure(
+        replay_events=app.config["SSE_REPLAY_EVENTS"],
+        coalesce_seconds=app.config["SSE_COALESCE_SECONDS"],
+    )
+    if app.config["ARTIFACT_BACKEND"] == "shared":
+        shared_dir = os.path.join(base_dir, "akatz-utils-shared")
+        if getattr(artifacts.backend, "directory", None) != shared_dir:
+            artifacts.use(SharedArtifactStore(shared_dir))
+        # Same filesystem as the artifacts, so adopting an upload is a rename
+        uploads.configure(os.path.join(shared_dir, "uploads"))
+    elif not isinstance(artifacts.backend, ArtifactStore):
+        artifacts.use(ArtifactStore())
+        uploads.configure(None)
+    artifacts.configure(
+        max_memory_bytes=app.config["ARTIFACT_MEMORY_BYTES"],
+        max_disk_bytes=app.config["ARTIFACT_DISK_BYTES"],
+        ttl_seconds=app.config["ARTIFACT_TTL_SECONDS"],
+    )
+    jobs.configure(
+        workers=app.config["JOB_WORKERS"],
+        limits=app.config["JOB_LIMITS"],
+        max_waiting=app.config["JOB_MAX_WAITING"],
+    )
+    # One worker process per job worker, started now so they are warm
+    process_pool.configure(size=jobs.workers, start=app.config["EXECUTION_BACKEND"] == "process")
 
     # Register hub route
-    from flask import render_template
+    from flask import jsonify, render_template
 
     @app.route("/")
     def hub():
         return render_template("hub.html", tools=TOOLS)
 
+    @app.route("/api/store/stats")
+    def store_stats():
+        return jsonify(artifacts.stats())
+
+    @app.route("/api/jobs/stats")
+    def job_stats():
+        return jsonify({**jobs.stats(), "processes": process_pool.stats(), "tasks": tasks.stats(),
+                        "progress": broker.stats()})
+
     # Register tool blueprints
     from .routes.imgsizer import bp as imgsizer_bp
     from .routes.pdf2md import bp as pdf2md_bp
+    from .routes.uploads import bp as uploads_bp
     from .routes.vid2gif import bp as vid2gif_bp
 
     app.register_blueprint(imgsizer_bp)
     app.register_blueprint(pdf2md_bp)
+    app.register_blueprint(uploads_bp)
     app.register_blueprint(vid2gif_bp)
 
     return app
@@ -0,0 +1,301 @@
+"""ASGI adapter for the launcher's Flask app.
+
+Flask is a WSGI framework, so every request still runs on a thread, taken
+from a bounded pool, while the event loop moves request bodies in and
+responses out. Progress streams are the exception: the broker hands them to
+the adapter (see ProgressBroker.sse_response), which serves them on the
+event loop once the route has returned. A client idling on a progress
+stream therefore holds a socket and a subscription, but no thread.
+
+With a request timeout, a request whose body stops arriving for that long
+is answered 408, and one whose response has not begun that long after its
+last body data is answered 503 (its thread is released once the route
+returns).
+
+``akatz-utils serve`` runs it under uvicorn (see serve.py); any ASGI server
+works, e.g.:
+
+    uvicorn --factory launcher.asgi:create_asgi_app
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Optional
+
+from werkzeug.exceptions import RequestTimeout
+
+# Request threads when none are configured
+_DEFAULT_THREADS = 16
+
+
+class _Abandoned(Exception):
+    """The request timed out; its response is no longer wanted."""
+
+
+class _Body:
+    """wsgi.input that pulls the request body from the event loop as the app reads it."""
+
+    def __init__(self, receive, loop: asyncio.AbstractEventLoop, timeout: Optional[float]) -> None:
+        self._receive = receive
+        self._loop = loop
+        self._timeout = timeout
+        self._buffer = bytearray()
+        self._more = True
+        # When body data last arrived (or the request started)
+        self.active = time.monotonic()
+
+    def _fill(self, size: int) -> None:
+        while self._more and (size < 0 or len(self._buffer) < size):
+            future = asyncio.run_coroutine_threadsafe(self._receive(), self._loop)
+            try:
+                message = future.result(self._timeout)
+            except FutureTimeout:
+                future.cancel()
+                raise RequestTimeout() from None
+            self.active = time.monotonic()
+            if message["type"] != "http.request":
+                self._more = False  # disconnected
+                break
+            self._buffer += message.get("body", b"")
+            self._more = message.get("more_body", False)
+
+    def read(self, size: int = -1) -> bytes:
+        size = -1 if size is None else size
+        self._fill(size)
+        n = len(self._buffer) if size < 0 else min(size, len(self._buffer))
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        while b"\n" not in self._buffer and self._more and (size < 0 or len(self._buffer) < size):
+            self._fill(len(self._buffer) + 1)
+        end = self._buffer.find(b"\n") + 1 or len(self._buffer)
+        return self.read(end if size < 0 else min(size, end))
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+class AsgiApp:
+    """Serves a WSGI app over ASGI, with progress streams on the event loop.
+
+    Args:
+        wsgi_app: The Flask app (or any WSGI callable).
+        threads: Requests handled at once; further ones wait for a thread.
+            Progress streams do not count once their route has returned.
+        request_timeout: Seconds a request may go without progress (see
+            above); None waits forever.
+
+    Attributes:
+        on_shutdown: Callables run, in a thread, when the server sends the
+            lifespan shutdown event (after it stopped accepting requests).
+    """
+
+    def __init__(self, wsgi_app: Callable, threads: Optional[int] = None,
+                 request_timeout: Optional[float] = None) -> None:
+        self.wsgi_app = wsgi_app
+        self.threads = threads or _DEFAULT_THREADS
+        self.request_timeout = request_timeout
+        self.on_shutdown: list[Callable[[], None]] = []
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="akatz-http")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(None, self._shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _shutdown(self) -> None:
+        for callback in self.on_shutdown:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Shutdown hook failed: {e}", file=sys.stderr)
+        self._executor.shutdown(wait=False)
+
+    async def _http(self, scope, receive, send) -> None:
+        loop = asyncio.get_running_loop()
+        handoff: list[Callable] = []
+        body = _Body(receive, loop, self.request_timeout)
+        response = {"lock": threading.Lock(), "begun": asyncio.Event()}
+        environ = _environ(scope, body, handoff.append)
+        call = loop.run_in_executor(self._executor, self._run_wsgi, environ, send, loop, response)
+        if self.request_timeout is not None and not await self._started(call, body, response):
+            call.add_done_callback(lambda f: f.cancelled() or f.exception())
+            await _send_timeout(send)
+            return
+        if not await call:
+            return  # the client went away while the response was sent
+        if handoff:
+            await _stream(handoff[0](), receive, send)
+        else:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _started(self, call: asyncio.Future, body: _Body, response: dict) -> bool:
+        """Wait for the response to begin; False if the request timed out first."""
+        begun = asyncio.ensure_future(response["begun"].wait())
+        try:
+            while not call.done() and not begun.done():
+                idle = time.monotonic() - body.active
+                if idle >= self.request_timeout:
+                    with response["lock"]:
+                        response["abandoned"] = not response.get("sent")
+                    return not response["abandoned"]
+                await asyncio.wait({call, begun}, timeout=self.request_timeout - idle,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            return True
+        finally:
+            begun.cancel()
+
+    def _run_wsgi(self, environ: dict, send, loop: asyncio.AbstractEventLoop, response: dict) -> bool:
+        """Call the WSGI app on a request thread and send its response.
+
+        Leaves the response open (more_body) for the caller to end or to
+        continue with a progress stream. Returns False if sending failed or
+        the request timed out meanwhile.
+        """
+
+        def emit(message: dict) -> None:
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status: str, headers: list, exc_info=None):
+            if exc_info and response.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["start"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+            }
+            return write
+
+        def write(data: bytes) -> None:
+            if not response.get("sent"):
+                with response["lock"]:
+                    if response.get("abandoned"):
+                        raise _Abandoned
+                    response["sent"] = True
+                loop.call_soon_threadsafe(response["begun"].set)
+                emit(response["start"])
+            if data:
+                emit({"type": "http.response.body", "body": data, "more_body": True})
+
+        body = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in body:
+                write(chunk)
+            write(b"")
+        except _Abandoned:
+            return False
+        except Exception:
+            if response.get("sent"):
+                return False
+            raise
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        return True
+
+
+async def _stream(chunks, receive, send) -> None:
+    """Send a progress stream's chunks until it ends or the client disconnects."""
+
+    async def disconnected() -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(chunks.__anext__())
+            await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                return  # the client went away
+            try:
+                chunk = step.result()
+            except StopAsyncIteration:
+                break
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    except asyncio.CancelledError:
+        pass  # the server's graceful shutdown timed out; end the stream so the client reconnects
+    finally:
+        watcher.cancel()
+        if step is not None and not step.done():
+            # Runs the stream's cleanup (detaching from its task)
+            step.cancel()
+            await asyncio.wait({step})
+        await chunks.aclose()
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def _send_timeout(send) -> None:
+    body = json.dumps({"error": "Request timed out"}).encode()
+    await send({"type": "http.response.start", "status": 503, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        (b"connection", b"close"),
+    ]})
+    await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+def _environ(scope: dict, body: _Body, handoff: Callable) -> dict:
+    """Build a WSGI environ for an ASGI http scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        # Progress routes register their stream here (see broker.py)
+        "akatz.sse": handoff,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def create_asgi_app(config: Optional[dict] = None, threads: Optional[int] = None,
+                    request_timeout: Optional[float] = None) -> AsgiApp:
+    """Create the Flask app (see create_app) wrapped for ASGI servers."""
+    from .app import create_app
+
+    return AsgiApp(create_app(config), threads, request_timeout)
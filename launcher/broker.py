@@ -0,0 +1,458 @@
+"""Progress broker: fans task events out to any number of progress streams.
+
+Progress events are stored in the task database (see tasks.py). Each
+process has one broker in front of it, so that a progress stream no longer
+needs a thread and a database poll of its own:
+
+- Events published through the broker are written to the database and
+  wake this process's subscribers of that task directly. One poller thread
+  picks up events written by other processes, for all subscribed tasks in
+  a single query.
+- Recent events of each followed task are kept in a replay buffer. A
+  stream that reconnects with Last-Event-ID (an event's sequence number)
+  resumes right after it, from the buffer or, once the event has left the
+  buffer, from the database.
+- High-rate updates published with coalesce=True, such as per-page pdf2md
+  progress, are written at most every coalesce_seconds per run. The latest
+  one wins, and a pending one is written before the run's next regular
+  event, so followers never see events out of order.
+- Subscribers wait on a threading.Event (follow) or an asyncio.Event
+  (afollow). Behind the ASGI adapter (asgi.py), progress routes hand their
+  stream to the event loop, so an idle progress connection holds no thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from flask import Response, request
+
+from .tasks import TaskStore, event_state, tasks
+
+# Seconds between polls for events written by other processes
+_POLL = 0.2
+# Reconnect delay, in milliseconds, suggested to EventSource clients
+_RETRY_MS = 2000
+# Headers of every progress stream; proxies must not buffer it
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Sent on idle streams so that proxies and the client keep them open
+_KEEPALIVE_MESSAGE = f"data: {json.dumps({'keepalive': True})}\n\n"
+
+
+class Subscription:
+    """A follower's position in one run of a task, and how to wake it.
+
+    Attributes:
+        after: Sequence number of the last event handed out.
+        ended: Set once the run finished, was superseded or the task is gone.
+    """
+
+    __slots__ = ("task_id", "run", "after", "ended", "wake")
+
+    def __init__(self, task_id: str, run: int, after: int, wake: Callable[[], None]) -> None:
+        self.task_id = task_id
+        self.run = run
+        self.after = after
+        self.ended = False
+        self.wake = wake
+
+
+class _Buffer:
+    """Replay buffer of one task run: (seq, final, event) in publish order.
+
+    Holds every event of the run after complete_after; older ones have to
+    be read from the database.
+    """
+
+    __slots__ = ("run", "events", "complete_after", "loading")
+
+    def __init__(self, run: int, size: int) -> None:
+        self.run = run
+        self.events: collections.deque = collections.deque(maxlen=size)
+        self.complete_after = 0
+        # Set while the run's earlier events are read from the database
+        self.loading = False
+
+    def append(self, seq: int, final: bool, event: dict) -> bool:
+        if self.events and seq <= self.events[-1][0]:
+            return False  # already seen (the poller may return local events)
+        if len(self.events) == self.events.maxlen:
+            self.complete_after = self.events[0][0]
+        self.events.append((seq, final, event))
+        return True
+
+
+class ProgressBroker:
+    """Publishes task events and delivers them to local subscribers.
+
+    Args:
+        store: Task store the events are written to and read from.
+        replay_events: Events kept per followed task for resuming streams.
+        coalesce_seconds: Minimum interval between coalesced events of a run.
+    """
+
+    def __init__(self, store: TaskStore, replay_events: int = 256, coalesce_seconds: float = 0.25) -> None:
+        self.store = store
+        self.replay_events = replay_events
+        self.coalesce_seconds = coalesce_seconds
+        self._subs: dict[str, set[Subscription]] = {}
+        self._buffers: dict[str, _Buffer] = {}
+        # Tasks with runs publishing in this process; the poller skips them
+        self._local: set[str] = set()
+        # Coalesced events not written yet, and when each run last wrote one
+        self._pending: dict[tuple[str, int], tuple[dict, Optional[str], dict]] = {}
+        self._written: dict[tuple[str, int], float] = {}
+        self._lock = threading.Lock()
+        # Serializes writes so a pending event cannot overtake a later one
+        self._write_lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._cursor = 0
+        self._counters = dict.fromkeys(("published", "coalesced", "delivered", "resumed_from_db"), 0)
+
+    def configure(self, replay_events: Optional[int] = None, coalesce_seconds: Optional[float] = None) -> None:
+        """Change the replay buffer size (for buffers created later) or the coalescing interval."""
+        if replay_events is not None:
+            self.replay_events = replay_events
+        if coalesce_seconds is not None:
+            self.coalesce_seconds = coalesce_seconds
+
+    # -- Publishing -------------------------------------------------------
+
+    def publish(self, task_id: str, run: int, event: dict, state: Optional[str] = None,
+                coalesce: bool = False, **data) -> Optional[int]:
+        """Publish a task event (see TaskStore.publish) and wake its local followers.
+
+        With coalesce, an event arriving within coalesce_seconds of the
+        run's last coalesced write is held back, replacing any event held
+        before it; the poller writes it once the interval is over. Returns
+        the event's sequence number, or None if it was held back or the run
+        was superseded.
+        """
+        key = (task_id, run)
+        with self._lock:
+            self._local.add(task_id)
+            if coalesce and time.monotonic() - self._written.get(key, float("-inf")) < self.coalesce_seconds:
+                self._counters["coalesced"] += key in self._pending
+                self._pending[key] = (event, state, data)
+                held = True
+            else:
+                held = False
+        if held:
+            self._start()  # its poller writes the event later
+            return None
+        with self._write_lock:
+            self._flush(key)
+            return self._write(task_id, run, event, state, data, coalesce)
+
+    def _write(self, task_id: str, run: int, event: dict, state: Optional[str], data: dict,
+               coalesced: bool) -> Optional[int]:
+        """Store an event and deliver it locally (write lock held)."""
+        seq = self.store.publish(task_id, run, event, state, **data)
+        final = (state or event_state(event)) in ("done", "error")
+        with self._lock:
+            if coalesced:
+                self._written[(task_id, run)] = time.monotonic()
+            if final:
+                self._written.pop((task_id, run), None)
+                self._local.discard(task_id)
+            self._counters["published"] += seq is not None
+        if seq is not None:
+            self._deliver(task_id, run, [(seq, final, event)])
+        return seq
+
+    def _flush(self, key: tuple[str, int]) -> None:
+        """Write the run's pending coalesced event, if any (write lock held)."""
+        with self._lock:
+            pending = self._pending.pop(key, None)
+        if pending is not None:
+            event, state, data = pending
+            self._write(*key, event, state, data, True)
+
+    def _deliver(self, task_id: str, run: int, items: list[tuple[int, bool, dict]]) -> None:
+        """Add events of a run to its replay buffer and wake its subscribers."""
+        with self._lock:
+            buf = self._buffers.get(task_id)
+            if buf is None or buf.run > run:
+                return  # nobody follows the run here
+            if buf.run < run:
+                # A new run: every event of it is delivered, starting with this one
+                buf = self._buffers[task_id] = _Buffer(run, self.replay_events)
+            added = [item for item in items if buf.append(*item)]
+            subs = [sub for sub in self._subs.get(task_id, ()) if sub.run == run]
+            self._counters["delivered"] += len(added) * len(subs)
+        if added:
+            for sub in subs:
+                _wake(sub)
+
+    # -- Following --------------------------------------------------------
+
+    def subscribe(self, task_id: str, run: Optional[int] = None, after: int = 0,
+                  wake: Callable[[], None] = lambda: None) -> Optional[Subscription]:
+        """Start following a run (default: the current one) after sequence number after.
+
+        wake() is called, from any thread, when the run has new events or
+        ends. Returns None if the task does not exist.
+        """
+        self._start()
+        current = self.store.get(task_id)
+        if current is None:
+            return None
+        sub = Subscription(task_id, run or current["run"], after, wake)
+        sub.ended = sub.run != current["run"]
+        with self._lock:
+            self._subs.setdefault(task_id, set()).add(sub)
+            buf = self._buffers.get(task_id)
+            load = buf is None or buf.run < current["run"]
+            if load:
+                buf = self._buffers[task_id] = _Buffer(current["run"], self.replay_events)
+                buf.loading = True
+        if load:
+            # Events delivered meanwhile are merged in. Events of other
+            # processes written after mark are left to the poller, which
+            # may already be past them for other tasks, so it goes back.
+            mark = self.store.query("SELECT COALESCE(MAX(seq), 0) FROM events")[0][0]
+            rows = self._read(task_id, current["run"], 0)
+            with self._lock:
+                merged = sorted({item[0]: item for item in (*rows, *buf.events)}.values(), key=lambda i: i[0])
+                buf.events.clear()
+                for item in merged:
+                    buf.append(*item)
+                buf.loading = False
+                self._cursor = min(self._cursor, mark)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        """Stop following; the task's buffer goes with its last local subscriber."""
+        with self._lock:
+            subs = self._subs.get(sub.task_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.task_id]
+                    self._buffers.pop(sub.task_id, None)
+
+    def fetch(self, sub: Subscription) -> list[tuple[int, dict]]:
+        """Return (seq, event) pairs the subscriber has not seen, and advance it.
+
+        Reads the task database unless the buffer covers them (see
+        _buffered). Marks the subscription ended after the run's final event.
+        """
+        items = self._buffered(sub)
+        if items is None:
+            self._counters["resumed_from_db"] += 1
+            items = self._read(sub.task_id, sub.run, sub.after)
+        return _advance(sub, items)
+
+    def _buffered(self, sub: Subscription) -> Optional[list[tuple[int, bool, dict]]]:
+        """Return the subscriber's unseen events from the buffer, or None if it does not cover them.
+
+        The buffer does not cover them while it is loading, for another run,
+        or when the subscriber resumes from before its oldest event.
+        """
+        with self._lock:
+            buf = self._buffers.get(sub.task_id)
+            if buf is None or buf.run != sub.run or buf.loading or sub.after < buf.complete_after:
+                return None
+            return [item for item in buf.events if item[0] > sub.after]
+
+    def follow(self, task_id: str, run: Optional[int] = None, after: int = 0,
+               keepalive: float = 15.0) -> Iterator[Optional[tuple[int, dict]]]:
+        """Yield a run's (seq, event) pairs after after, until it ends, on this thread.
+
+        Yields None whenever keepalive seconds pass without an event.
+        Yields nothing if the task does not exist.
+        """
+        signal = threading.Event()
+        sub = self.subscribe(task_id, run, after, signal.set)
+        if sub is None:
+            return
+        try:
+            while True:
+                signal.clear()
+                items = self.fetch(sub)
+                yield from items
+                if sub.ended:
+                    return
+                if not items and not signal.wait(keepalive):
+                    yield None
+        finally:
+            self.unsubscribe(sub)
+
+    async def afollow(self, task_id: str, run: Optional[int] = None, after: int = 0,
+                      keepalive: float = 15.0) -> AsyncIterator[Optional[tuple[int, dict]]]:
+        """Like follow, but waits on the running event loop instead of a thread."""
+        loop = asyncio.get_running_loop()
+        signal = asyncio.Event()
+        sub = await loop.run_in_executor(None, self.subscribe, task_id, run, after,
+                                         lambda: loop.call_soon_threadsafe(signal.set))
+        if sub is None:
+            return
+        try:
+            while True:
+                signal.clear()
+                items = self._buffered(sub)
+                if items is None:
+                    # A slow database read must not stall the other streams on the loop
+                    items = await loop.run_in_executor(None, self.fetch, sub)
+                else:
+                    items = _advance(sub, items)
+                for item in items:
+                    yield item
+                if sub.ended:
+                    return
+                if not items:
+                    try:
+                        await asyncio.wait_for(signal.wait(), keepalive)
+                    except asyncio.TimeoutError:
+                        yield None
+        finally:
+            self.unsubscribe(sub)
+
+    # -- Server-sent events -----------------------------------------------
+
+    def sse_response(self, task_id: str, run: int, last_event_id: Optional[str] = None,
+                     keepalive: float = 15.0) -> Response:
+        """Return an SSE response streaming a run's events, resuming after last_event_id.
+
+        Each event carries its sequence number as the SSE id, so a browser
+        that reconnects sends it back as Last-Event-ID. While the stream is
+        open the task counts it as attached (see TaskStore.attach). Behind
+        the ASGI adapter the stream is served by the event loop; otherwise
+        by the request's thread.
+        """
+        after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+        handoff = request.environ.get("akatz.sse")
+        if handoff is not None:
+            handoff(lambda: self._astream(task_id, run, after, keepalive))
+            return Response(iter(()), mimetype="text/event-stream", headers=_SSE_HEADERS)
+        return Response(self._stream(task_id, run, after, keepalive), mimetype="text/event-stream",
+                        headers=_SSE_HEADERS)
+
+    def _stream(self, task_id: str, run: int, after: int, keepalive: float) -> Iterator[str]:
+        self.store.attach(task_id)
+        finished = False
+        try:
+            yield f"retry: {_RETRY_MS}\n\n"
+            for item in self.follow(task_id, run, after, keepalive):
+                yield _KEEPALIVE_MESSAGE if item is None else _message(*item)
+            finished = True
+        finally:
+            self.store.detach(task_id, finished)
+
+    async def _astream(self, task_id: str, run: int, after: int, keepalive: float) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.store.attach, task_id)
+        events = self.afollow(task_id, run, after, keepalive)
+        finished = False
+        try:
+            yield f"retry: {_RETRY_MS}\n\n"
+            async for item in events:
+                yield _KEEPALIVE_MESSAGE if item is None else _message(*item)
+            finished = True
+        finally:
+            await events.aclose()
+            await loop.run_in_executor(None, self.store.detach, task_id, finished)
+
+    # -- Reading ----------------------------------------------------------
+
+    def stats(self) -> dict:
+        """Return subscriber, buffer and pending counts and event counters."""
+        with self._lock:
+            return {
+                "subscribers": sum(map(len, self._subs.values())),
+                "followed_tasks": len(self._subs),
+                "buffers": len(self._buffers),
+                "pending": len(self._pending),
+                "replay_events": self.replay_events,
+                "coalesce_seconds": self.coalesce_seconds,
+                **self._counters,
+            }
+
+    # -- Internals ------------------------------------------------------------
+
+    def _read(self, task_id: str, run: int, after: int) -> list[tuple[int, bool, dict]]:
+        rows = self.store.query("SELECT seq, final, data FROM events WHERE task_id = ? AND run = ? AND seq > ? "
+                                "ORDER BY seq", (task_id, run, after))
+        return [(seq, bool(final), json.loads(data)) for seq, final, data in rows]
+
+    def _start(self) -> None:
+        """Start the poller, once, from the newest event in the database."""
+        with self._lock:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target=self._poll, daemon=True, name="akatz-broker")
+        self._cursor = self.store.query("SELECT COALESCE(MAX(seq), 0) FROM events")[0][0]
+        self._poller.start()
+
+    def _poll(self) -> None:
+        """Write due coalesced events, relay other processes' events and end stale subscriptions."""
+        while True:
+            time.sleep(_POLL)
+            try:
+                self._poll_once()
+            except Exception:
+                pass  # a locked or replaced database; retried on the next tick
+
+    def _poll_once(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            due = [key for key in self._pending if now - self._written.get(key, 0.0) >= self.coalesce_seconds]
+            followed = list(self._subs)
+            remote = [task_id for task_id in followed if task_id not in self._local]
+        for key in due:
+            with self._write_lock:
+                self._flush(key)
+        if not followed:
+            return
+        marks = ",".join("?" * len(followed))
+        runs = dict(self.store.query(f"SELECT id, run FROM tasks WHERE id IN ({marks})", tuple(followed)))
+        if remote:
+            rows = self.store.query(
+                f"SELECT seq, task_id, run, final, data FROM events WHERE seq > ? AND task_id IN "
+                f"({','.join('?' * len(remote))}) ORDER BY seq", (self._cursor, *remote),
+            )
+            grouped: dict[tuple[str, int], list] = {}
+            for seq, task_id, run, final, data in rows:
+                grouped.setdefault((task_id, run), []).append((seq, bool(final), json.loads(data)))
+                self._cursor = max(self._cursor, seq)
+            for (task_id, run), items in grouped.items():
+                self._deliver(task_id, run, items)
+        with self._lock:
+            stale = [sub for task_id in followed for sub in self._subs.get(task_id, ())
+                     if runs.get(task_id) != sub.run and not sub.ended]
+            for sub in stale:
+                sub.ended = True
+        for sub in stale:
+            _wake(sub)
+
+
+def _message(seq: int, event: dict) -> str:
+    return f"id: {seq}\ndata: {json.dumps(event)}\n\n"
+
+
+def _advance(sub: Subscription, items: list[tuple[int, bool, dict]]) -> list[tuple[int, dict]]:
+    """Move sub past items, up to and including the run's final event, and return them as (seq, event)."""
+    out = []
+    for seq, final, event in items:
+        out.append((seq, event))
+        sub.after = seq
+        if final:
+            sub.ended = True
+            break
+    return out
+
+
+def _wake(sub: Subscription) -> None:
+    try:
+        sub.wake()
+    except RuntimeError:
+        pass  # its event loop has closed
+
+
+# Process-wide broker used by all tool blueprints (configured in create_app)
+broker = ProgressBroker(tasks)
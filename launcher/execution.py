@@ -0,0 +1,314 @@
+"""Warm worker processes for CPU-bound conversions.
+
+With the "process" execution backend, scheduler jobs hand their conversion
+to one of these processes instead of running it on the job's thread, so
+pdfplumber, moviepy and Pillow do not share the hub's GIL with request
+handling. Workers are spawned once, import the tools up front and then
+serve one conversion at a time.
+
+Each worker has two one-way pipes. The hub sends (task, kwargs), "cancel"
+if the job is cancelled and None to shut the worker down (cancelling a
+running task first) on one. The worker answers on the other with
+("progress", args) messages for the progress callback, then ("done",
+result) or ("error", exception). Inputs and outputs are file paths, so
+only small arguments and progress messages are pickled.
+"""
+
+from __future__ import annotations
+
+import atexit
+import importlib
+import multiprocessing
+import signal
+import threading
+import time
+from typing import Any, Callable, Optional
+
+# Seconds between cancel checks while a worker has not replied
+_POLL = 0.2
+# Seconds a worker gets to exit at shutdown before it is terminated
+_EXIT_TIMEOUT = 5.0
+# Imported by each worker at start so the first conversion does not pay for it
+_PRELOAD = ("pdf2md", "vid2gif", "imgsizer")
+
+
+# Page caches opened by this worker, by (directory, max_bytes); opening one
+# scans its directory
+_page_caches: dict[tuple, Any] = {}
+
+
+def _pdf2md_task(progress, cancel, input_path: str, output_path: str, cache_dir: Optional[str] = None,
+                 cache_bytes: Optional[int] = None, **options) -> None:
+    """Write a PDF's markdown to output_path (see pdf2md.iter_markdown).
+
+    With cache_dir, pages go through a PageCache on that directory, which
+    the hub and other workers may share.
+    """
+    from pdf2md import PageCache, iter_markdown
+
+    cache = None
+    if cache_dir:
+        key = (cache_dir, cache_bytes)
+        cache = _page_caches.get(key) or _page_caches.setdefault(key, PageCache(*key))
+    with open(output_path, "w", encoding="utf-8", newline="") as out:
+        for page in iter_markdown(input_path, progress, cache=cache, cancel=cancel, **options):
+            out.write(page)
+
+
+def _vid2gif_task(progress, cancel, input_path: str, output_path: str, target_size_mb: float,
+                  **options) -> float:
+    """Convert a video to a GIF at output_path and return its size in MB."""
+    from vid2gif import GifSession
+
+    with GifSession(input_path, progress_callback=progress, cancel=cancel, **options) as session:
+        return session.convert(output_path, target_size_mb)
+
+
+_TASKS: dict[str, Callable[..., Any]] = {
+    "pdf2md": _pdf2md_task,
+    "vid2gif": _vid2gif_task,
+}
+
+
+def _serve(requests, events) -> None:
+    """Worker process main loop."""
+    # Ctrl+C reaches the whole process group; the hub shuts workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    send_lock = threading.Lock()
+
+    def progress(*args):
+        # Tasks may report from several threads
+        with send_lock:
+            events.send(("progress", args))
+
+    for name in _PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    while True:
+        try:
+            msg = requests.recv()
+        except (EOFError, OSError):
+            return  # the hub went away
+        if msg is None:
+            return
+        if msg == "cancel":
+            continue  # arrived after its task finished
+        task, kwargs = msg
+        cancel, finished, shutdown = threading.Event(), threading.Event(), threading.Event()
+
+        def watch():
+            while not finished.is_set():
+                try:
+                    if not requests.poll(_POLL):
+                        continue
+                    msg = requests.recv()
+                except (EOFError, OSError):
+                    msg = None  # the hub went away
+                if msg is None:
+                    # Shutdown: stop the task and exit once it has returned
+                    shutdown.set()
+                    cancel.set()
+                    return
+                if msg == "cancel":
+                    cancel.set()
+
+        watcher = threading.Thread(target=watch, daemon=True)
+        watcher.start()
+        try:
+            result = _TASKS[task](progress, cancel, **kwargs)
+            reply = ("done", result)
+        except Exception as e:
+            reply = ("error", e)
+        finally:
+            finished.set()
+            watcher.join()
+        try:
+            events.send(reply)
+        except (BrokenPipeError, EOFError):
+            return  # the hub went away
+        except Exception as e:
+            # The exception (or result) could not be pickled
+            events.send(("error", RuntimeError(str(e) if reply[0] == "done" else str(reply[1]))))
+        if shutdown.is_set():
+            return
+
+
+class _Worker:
+    """One worker process and the hub's ends of its pipes."""
+
+    def __init__(self, ctx) -> None:
+        requests_out, self.requests = ctx.Pipe(duplex=False)
+        self.events, events_in = ctx.Pipe(duplex=False)
+        # Not a daemon: pdf2md starts its own extraction processes
+        self.process = ctx.Process(target=_serve, args=(requests_out, events_in),
+                                   name="akatz-worker", daemon=False)
+        self.process.start()
+        requests_out.close()
+        events_in.close()
+
+    def request_stop(self) -> None:
+        """Ask the worker to exit, cancelling its task first if it has one."""
+        try:
+            self.requests.send(None)
+        except OSError:
+            pass
+
+    def stop(self, timeout: float = _EXIT_TIMEOUT) -> None:
+        self.request_stop()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class ProcessPool:
+    """A fixed number of warm worker processes that run conversions by name.
+
+    Args:
+        size: Worker processes; match it to the job scheduler's workers so
+            every running job has one.
+    """
+
+    def __init__(self, size: int = 2) -> None:
+        self.size = size
+        self._idle: list[_Worker] = []
+        self._live: set[_Worker] = set()
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._closed = False
+        self._atexit = False
+
+    def configure(self, size: Optional[int] = None, start: bool = False) -> None:
+        """Resize the pool; with start, spawn the workers now rather than on first use."""
+        with self._cond:
+            if size is not None:
+                self.size = size
+            while len(self._idle) + self._busy > self.size and self._idle:
+                worker = self._idle.pop()
+                self._live.discard(worker)
+                worker.stop()
+            while start and len(self._idle) + self._busy < self.size:
+                self._idle.append(self._spawn())
+            self._cond.notify_all()
+
+    def run(
+        self,
+        task: str,
+        progress: Optional[Callable[..., None]] = None,
+        cancel: Optional[threading.Event] = None,
+        **kwargs,
+    ) -> Any:
+        """Run a named task on a worker and return its result.
+
+        Blocks until a worker is free. progress(*args) is called on this
+        thread for each progress message. Setting cancel tells the worker to
+        set the task's own cancel event.
+
+        Raises:
+            Whatever the task raised, or RuntimeError if the worker died.
+        """
+        worker = self._checkout()
+        healthy = False
+        try:
+            kind, value = self._exchange(worker, (task, kwargs), progress, cancel)
+            healthy = True
+        except (EOFError, OSError):
+            raise RuntimeError("Worker process exited unexpectedly") from None
+        finally:
+            self._checkin(worker, healthy)
+        if kind == "error":
+            raise value
+        return value
+
+    def stats(self) -> dict:
+        """Return the pool size and how many workers are idle and busy."""
+        with self._cond:
+            return {"size": self.size, "idle": len(self._idle), "busy": self._busy}
+
+    def close(self) -> None:
+        """Stop every worker. Called at exit.
+
+        Busy workers cancel their task and exit once it returns; workers
+        still running after _EXIT_TIMEOUT are terminated.
+        """
+        with self._cond:
+            self._closed = True
+            self._idle = []
+            workers = list(self._live)
+        for worker in workers:
+            worker.request_stop()
+        deadline = time.monotonic() + _EXIT_TIMEOUT
+        for worker in workers:
+            worker.stop(max(0.0, deadline - time.monotonic()))
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx)
+        with self._cond:
+            self._live.add(worker)
+            if not self._atexit:
+                # Registered after multiprocessing's own exit handler, which
+                # joins child processes, so that this one runs first
+                atexit.register(self.close)
+                self._atexit = True
+        return worker
+
+    @staticmethod
+    def _exchange(worker: _Worker, request: tuple, progress, cancel) -> tuple[str, Any]:
+        """Send a request and relay progress until the final reply.
+
+        Raises:
+            EOFError, OSError: If the worker died or its pipe broke.
+        """
+        worker.requests.send(request)
+        cancel_sent = False
+        while True:
+            if not worker.events.poll(_POLL):
+                if cancel is not None and cancel.is_set() and not cancel_sent:
+                    worker.requests.send("cancel")
+                    cancel_sent = True
+                if not worker.process.is_alive():
+                    raise EOFError
+                continue
+            kind, value = worker.events.recv()
+            if kind != "progress":
+                return kind, value
+            if progress is not None:
+                progress(*value)
+
+    def _checkout(self) -> _Worker:
+        with self._cond:
+            while not self._idle and self._busy >= self.size:
+                self._cond.wait()
+            self._busy += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return self._spawn()
+        except BaseException:
+            with self._cond:
+                self._busy -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, worker: _Worker, healthy: bool) -> None:
+        with self._cond:
+            self._busy -= 1
+            keep = healthy and not self._closed and len(self._idle) + self._busy < self.size
+            if keep:
+                self._idle.append(worker)
+            else:
+                self._live.discard(worker)
+            self._cond.notify()
+        if not keep:
+            if healthy:
+                worker.stop()
+            else:
+                worker.process.kill()
+                worker.process.join()
+
+
+# Process-wide pool used by the tool blueprints (configured in create_app)
+process_pool = ProcessPool()
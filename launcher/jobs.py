@@ -0,0 +1,310 @@
+"""Bounded job scheduler shared by the tool blueprints.
+
+Conversions run on a fixed pool of worker threads instead of a thread per
+request. Each job belongs to a tool, and a tool may have a cap on how many
+of its jobs run at once, so a burst of video encodes cannot crowd out a PDF
+conversion. Waiting jobs start in priority order (higher first, then in
+submission order); once the waiting queue is full, submit() raises
+QueueFull and routes answer 429. At shutdown, drain() refuses new jobs the
+same way and lets the accepted ones finish.
+
+Waiting jobs are told their queue position and a rough ETA through an
+on_wait callback whenever the queue changes. The ETA comes from a moving
+average of each tool's recent run times, so it is None until a tool has
+finished a job.
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+# Weight of the newest run time in each tool's moving average
+_EWMA_ALPHA = 0.3
+# Seconds drain() waits for cancelled jobs to wind down
+_CANCEL_WAIT = 5.0
+
+
+class QueueFull(Exception):
+    """The waiting queue is full. Carries a suggested retry delay in seconds."""
+
+    def __init__(self, message: str, retry_after: int = 5) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    """A unit of work submitted to the scheduler.
+
+    Attributes:
+        tool: Tool the job belongs to (for per-tool caps and run times).
+        fn: Called with no arguments on a worker thread; handles its own
+            errors.
+        priority: Higher priorities start first.
+        cancel: Optional event the job checks itself; see JobScheduler.cancel.
+        on_wait: Optional callback(position, eta_seconds) while waiting.
+        state: "waiting", "running", "done" or "dropped".
+    """
+
+    tool: str
+    fn: Callable[[], None] = field(repr=False)
+    priority: int = 0
+    cancel: Optional[threading.Event] = field(default=None, repr=False)
+    on_wait: Optional[Callable[[int, Optional[float]], None]] = field(default=None, repr=False)
+    seq: int = 0
+    state: str = "waiting"
+    submitted: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    # Last (position, eta) reported through on_wait
+    reported: Optional[tuple] = field(default=None, repr=False)
+
+    def _order(self) -> tuple[int, int]:
+        return (-self.priority, self.seq)
+
+
+class JobScheduler:
+    """Thread pool with per-tool concurrency caps, priorities and a bounded queue.
+
+    Args:
+        workers: Jobs running at once across all tools (None = half the
+            CPUs, at least 2).
+        limits: Per-tool caps on running jobs, e.g. {"vid2gif": 1}; tools
+            not listed are only bound by workers.
+        max_waiting: Waiting jobs allowed before submit() raises QueueFull.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        limits: Optional[dict[str, int]] = None,
+        max_waiting: int = 32,
+    ) -> None:
+        self.workers = workers or max(2, (os.cpu_count() or 2) // 2)
+        self.limits = dict(limits or {})
+        self.max_waiting = max_waiting
+        self._waiting: list[Job] = []
+        self._running: list[Job] = []
+        self._run_times: dict[str, float] = {}
+        self._seq = itertools.count()
+        self._threads = 0
+        self._draining = False
+        self._cond = threading.Condition()
+        self._counters = dict.fromkeys(("submitted", "completed", "rejected", "dropped"), 0)
+
+    def configure(
+        self,
+        workers: Optional[int] = None,
+        limits: Optional[dict[str, int]] = None,
+        max_waiting: Optional[int] = None,
+    ) -> None:
+        """Adjust the pool at runtime; surplus workers exit once idle."""
+        with self._cond:
+            if workers is not None:
+                self.workers = workers
+            if limits is not None:
+                self.limits = dict(limits)
+            if max_waiting is not None:
+                self.max_waiting = max_waiting
+            self._cond.notify_all()
+        self._report()
+
+    # -- Submitting -------------------------------------------------------
+
+    def submit(
+        self,
+        tool: str,
+        fn: Callable[[], None],
+        priority: int = 0,
+        cancel: Optional[threading.Event] = None,
+        on_wait: Optional[Callable[[int, Optional[float]], None]] = None,
+    ) -> Job:
+        """Queue fn to run on a worker thread and return its Job.
+
+        on_wait(position, eta_seconds) is called right away if the job has
+        to wait, and again whenever its position or ETA changes.
+
+        Raises:
+            QueueFull: If max_waiting jobs are already waiting, or the
+                scheduler is draining.
+        """
+        job = Job(tool, fn, priority, cancel, on_wait)
+        with self._cond:
+            if self._draining:
+                self._counters["rejected"] += 1
+                raise QueueFull("The server is shutting down; try again shortly")
+            if len(self._waiting) >= self.max_waiting:
+                self._counters["rejected"] += 1
+                eta = self._eta(len(self._waiting), self._waiting[-1]) if self._waiting else None
+                raise QueueFull("Too many conversions queued; try again shortly",
+                                max(1, math.ceil(eta)) if eta else 5)
+            job.seq = next(self._seq)
+            self._waiting.append(job)
+            self._waiting.sort(key=Job._order)
+            self._counters["submitted"] += 1
+            while self._threads < self.workers:
+                self._threads += 1
+                threading.Thread(target=self._worker, daemon=True, name="akatz-job").start()
+            self._cond.notify_all()
+        self._report()
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """Set a job's cancel event; a waiting job leaves the queue at once.
+
+        A dropped job's fn still runs, on its own thread and with the event
+        set, so that it can report the cancellation and clean up. Returns
+        False if the job had already finished.
+        """
+        with self._cond:
+            if job.state == "done":
+                return False
+            if job.cancel is not None:
+                job.cancel.set()
+            dropped = job.state == "waiting"
+            if dropped:
+                self._waiting.remove(job)
+                job.state = "dropped"
+                self._counters["dropped"] += 1
+        if dropped:
+            threading.Thread(target=job.fn, daemon=True).start()
+            self._report()
+        return True
+
+    def drain(self, timeout: float) -> int:
+        """Refuse new jobs and wait up to timeout seconds for the accepted ones.
+
+        Jobs still waiting or running then are cancelled, and given a few
+        seconds to report it. Returns how many were cancelled.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._draining = True
+            while (self._waiting or self._running) and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            left = self._waiting + self._running
+        for job in left:
+            self.cancel(job)
+        deadline = time.monotonic() + _CANCEL_WAIT
+        with self._cond:
+            while self._running and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+        return len(left)
+
+    # -- Reading ----------------------------------------------------------
+
+    def position(self, job: Job) -> Optional[int]:
+        """Return a waiting job's 1-based queue position, or None."""
+        with self._cond:
+            return self._waiting.index(job) + 1 if job in self._waiting else None
+
+    def stats(self) -> dict:
+        """Return pool size, caps, per-tool counts and event counters."""
+        with self._cond:
+            tools = {j.tool for j in self._waiting + self._running} | set(self.limits)
+            return {
+                "workers": self.workers,
+                "max_waiting": self.max_waiting,
+                "running": len(self._running),
+                "waiting": len(self._waiting),
+                "draining": self._draining,
+                "tools": {
+                    tool: {
+                        "limit": self.limits.get(tool),
+                        "running": sum(j.tool == tool for j in self._running),
+                        "waiting": sum(j.tool == tool for j in self._waiting),
+                        "avg_seconds": self._run_times.get(tool),
+                    }
+                    for tool in sorted(tools)
+                },
+                **self._counters,
+            }
+
+    # -- Internals ------------------------------------------------------------
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    if self._threads > self.workers:
+                        self._threads -= 1
+                        return
+                    self._cond.wait()
+                    job = self._next()
+                self._waiting.remove(job)
+                self._running.append(job)
+                job.state, job.started = "running", time.monotonic()
+            self._report()
+            try:
+                job.fn()
+            except Exception:
+                pass
+            finally:
+                with self._cond:
+                    self._running.remove(job)
+                    job.state = "done"
+                    self._counters["completed"] += 1
+                    elapsed = time.monotonic() - job.started
+                    avg = self._run_times.get(job.tool)
+                    self._run_times[job.tool] = elapsed if avg is None else avg + _EWMA_ALPHA * (elapsed - avg)
+                    self._cond.notify_all()
+                self._report()
+
+    def _next(self) -> Optional[Job]:
+        """Return the first waiting job whose tool is under its cap (lock held)."""
+        if len(self._running) >= self.workers:
+            return None
+        for job in self._waiting:
+            limit = self.limits.get(job.tool)
+            if limit is None or sum(j.tool == job.tool for j in self._running) < limit:
+                return job
+        return None
+
+    def _remaining(self, job: Job) -> float:
+        avg = self._run_times.get(job.tool, 0.0)
+        if job.started is None:
+            return avg
+        return max(0.0, avg - (time.monotonic() - job.started))
+
+    def _eta(self, position: int, job: Job) -> Optional[float]:
+        """Rough seconds until the job starts (lock held).
+
+        The work ahead of it (remaining run time of running jobs plus the
+        jobs queued before it) is spread over the workers, or over the
+        tool's cap for jobs of the same tool, whichever is slower.
+        """
+        if job.tool not in self._run_times:
+            return None
+        ahead = self._waiting[:position - 1]
+        total = sum(map(self._remaining, self._running + ahead)) / self.workers
+        limit = self.limits.get(job.tool)
+        if limit:
+            same = [j for j in self._running + ahead if j.tool == job.tool]
+            total = max(total, sum(map(self._remaining, same)) / limit)
+        return total
+
+    def _report(self) -> None:
+        """Send changed positions and ETAs to waiting jobs (lock not held)."""
+        updates = []
+        with self._cond:
+            for position, job in enumerate(self._waiting, 1):
+                eta = self._eta(position, job)
+                report = (position, None if eta is None else round(eta))
+                if job.on_wait is not None and report != job.reported:
+                    job.reported = report
+                    updates.append((job.on_wait, report))
+        for on_wait, report in updates:
+            try:
+                on_wait(*report)
+            except Exception:
+                pass
+
+
+# Process-wide scheduler used by all tool blueprints (configured in create_app)
+jobs = JobScheduler()
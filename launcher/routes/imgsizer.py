@@ -2,103 +2,280 @@
 
 from __future__ import annotations
 
+import json
+import os
+import tempfile
+import threading
 import uuid
+from collections import OrderedDict
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 
-from flask import Blueprint, request, jsonify, render_template, send_file
+from flask import Blueprint, Response, current_app, g, request, jsonify, render_template, send_file
 
-from imgsizer import load_image, resize_image, estimate_size, auto_adjust, export_image
+from imgsizer import (
+    LazyImage,
+    resize_image,
+    build_pyramid,
+    pyramid_level,
+    estimate,
+    search_quality_scale,
+    export_image,
+    FORMATS,
+    available_formats,
+    choose_format,
+    BatchOptions,
+    BatchResult,
+    create_executor,
+    resize_batch,
+    stream_zip,
+)
+
+from ..broker import broker
+from ..jobs import QueueFull, jobs
+from ..store import artifacts
+from ..tasks import tasks
+from ..uploads import receive_file, receive_files
 
 bp = Blueprint("imgsizer", __name__)
 
-# In-memory store: file_id -> {"image": PIL.Image, "filename": str, "original_size": int}
-_uploads: dict[str, dict] = {}
+
+class _RenderCache:
+    """Thread-safe LRU of rendered previews, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: dict) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old["data"])
+            self._entries[key] = entry
+            self._bytes += len(entry["data"])
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted["data"])
+
+
+# Rendered previews keyed by (file_id, width, height, mode, quality, estimate mode)
+_previews = _RenderCache(max_bytes=64 * 1024 * 1024)
+
+
+def _build_pyramid(source: LazyImage) -> list:
+    # Proxies start at half size; larger requests decode from source
+    return build_pyramid(source.decode((source.width // 2, source.height // 2)))
+
+
+def _pyramid_bytes(pyramid: list) -> int:
+    return sum(level.width * level.height * len(level.getbands()) for level in pyramid)
+
+
+@bp.teardown_app_request
+def _close_payloads(exc) -> None:
+    stack = g.pop("imgsizer_payloads", None)
+    if stack is not None:
+        stack.close()
+
+
+def _load_upload(file_id: str | None) -> dict | None:
+    """Return an upload's LazyImage, proxy pyramid and metadata, or None.
+
+    Uploads live in the shared artifact store as encoded bytes, mapped
+    (if spilled) until the request ends. The decoded pyramid is attached as
+    the artifact's cache, so it counts toward the store's memory budget and
+    is rebuilt if the upload was spilled.
+    """
+    if not file_id:
+        return None
+    artifact = artifacts.get(f"imgsizer:{file_id}")
+    if artifact is None:
+        return None
+    if "imgsizer_payloads" not in g:
+        g.imgsizer_payloads = ExitStack()
+    source = LazyImage(g.imgsizer_payloads.enter_context(artifact.open()))
+    pyramid = artifact.cache
+    if pyramid is None:
+        pyramid = _build_pyramid(source)
+        artifacts.set_cache(artifact.key, pyramid, _pyramid_bytes(pyramid))
+    return {"source": source, "pyramid": pyramid, **artifact.meta}
+
+
+def _source_for(upload: dict, width: int, height: int, exact: bool = False):
+    """Return the smallest decoded image that covers width x height.
+
+    Proxies from the pyramid are used unless exact is set or none is large
+    enough; otherwise the upload is decoded straight to the needed size.
+    """
+    if not exact:
+        level = pyramid_level(upload["pyramid"], width, height)
+        if level.width >= width and level.height >= height:
+            return level
+    return upload["source"].decode((width, height))
 
 
 @bp.route("/imgsizer")
 def imgsizer_page():
-    return render_template("imgsizer.html")
+    return render_template("imgsizer.html", formats=available_formats())
 
 
 @bp.route("/api/imgsizer/upload", methods=["POST"])
 def imgsizer_upload():
-    """Upload an image. Returns file_id + metadata."""
-    f = request.files.get("file")
-    if not f:
+    """Upload an image. Returns file_id + metadata.
+
+    Accepts a multipart "file" or the upload_id of a completed resumable
+    upload. The encoded file is adopted by the artifact store on disk and
+    read back through mmap, so it is never held in memory whole.
+    """
+    upload = receive_file(request)
+    if upload is None:
         return jsonify(error="No file provided"), 400
 
-    raw = f.read()
+    file_id = uuid.uuid4().hex[:12]
+    key = f"imgsizer:{file_id}"
+    artifact = artifacts.put_file(key, upload.path, meta={
+        "filename": upload.filename or "image.jpg",
+        "original_bytes": upload.size,
+    })
     try:
-        img = load_image(BytesIO(raw))
+        with artifact.open() as data:
+            source = LazyImage(data)
+            pyramid = _build_pyramid(source)
     except Exception as e:
+        artifacts.delete(key)
         return jsonify(error=f"Failed to load image: {e}"), 400
-
-    file_id = uuid.uuid4().hex[:12]
-    _uploads[file_id] = {
-        "image": img,
-        "filename": f.filename or "image.jpg",
-        "original_bytes": len(raw),
-    }
+    artifacts.set_cache(key, pyramid, _pyramid_bytes(pyramid))
 
     return jsonify(
         file_id=file_id,
-        filename=f.filename,
-        width=img.width,
-        height=img.height,
-        original_bytes=len(raw),
+        filename=upload.filename,
+        width=source.width,
+        height=source.height,
+        original_bytes=upload.size,
     )
 
 
 @bp.route("/api/imgsizer/preview", methods=["POST"])
 def imgsizer_preview():
-    """Return a resized JPEG preview."""
+    """Return a resized JPEG preview.
+
+    JSON option "estimate" selects the size estimate: "exact" (default) serves
+    the single encode it measures, "fast" samples tiles and reports an error
+    bound in X-Estimate-Error.
+    """
     data = request.get_json(silent=True) or {}
     file_id = data.get("file_id")
-    if not file_id or file_id not in _uploads:
+    upload = _load_upload(file_id)
+    if upload is None:
         return jsonify(error="Invalid file_id"), 400
 
-    img = _uploads[file_id]["image"]
+    img = upload["source"]
     width = int(data.get("width", img.width))
     height = int(data.get("height", img.height))
     quality = int(data.get("quality", 85))
     mode = data.get("mode", "stretch")
 
-    resized = resize_image(img, width, height, mode)
-    est = estimate_size(resized, quality)
-    preview_bytes = export_image(resized, "JPEG", min(quality, 80))
+    estimate_mode = data.get("estimate", "exact")
+    if estimate_mode not in ("exact", "fast"):
+        return jsonify(error=f"Unknown estimate mode: {estimate_mode}"), 400
+
+    key = (file_id, width, height, mode, quality, estimate_mode)
+    preview = _previews.get(key)
+    if preview is None:
+        # Render from the smallest proxy that covers the target; exact
+        # full-resolution work is left to imgsizer_export.
+        source = _source_for(upload, width, height)
+        resized = resize_image(source, width, height, mode)
+        est = estimate(resized, quality, mode=estimate_mode)
+        if est.data is not None:
+            # Exact mode: the estimate's encode doubles as the preview
+            preview_bytes = est.data
+        else:
+            preview_bytes = export_image(resized, "JPEG", min(quality, 80))
+        preview = {
+            "data": preview_bytes,
+            "estimated_bytes": est.size,
+            "estimate_error": est.error,
+            "estimate_mode": est.mode,
+            "width": resized.width,
+            "height": resized.height,
+        }
+        _previews.put(key, preview)
 
-    buf = BytesIO(preview_bytes)
+    buf = BytesIO(preview["data"])
     return send_file(buf, mimetype="image/jpeg", download_name="preview.jpg"), 200, {
-        "X-Estimated-Bytes": str(est),
-        "X-Width": str(resized.width),
-        "X-Height": str(resized.height),
+        "X-Estimated-Bytes": str(preview["estimated_bytes"]),
+        "X-Estimate-Error": str(preview["estimate_error"]),
+        "X-Estimate-Mode": preview["estimate_mode"],
+        "X-Width": str(preview["width"]),
+        "X-Height": str(preview["height"]),
     }
 
 
 @bp.route("/api/imgsizer/export", methods=["POST"])
 def imgsizer_export():
-    """Export the processed image as a file download."""
+    """Export the processed image as a file download.
+
+    format may be any available format, or "AUTO" to pick the smallest
+    format/quality pair under target_kb (or the smallest at quality if no
+    target is given). Auto exports report the choice in X-Format and
+    X-Quality and the time spent per candidate in X-Format-Candidates.
+    """
     data = request.get_json(silent=True) or {}
     file_id = data.get("file_id")
-    if not file_id or file_id not in _uploads:
+    upload = _load_upload(file_id)
+    if upload is None:
         return jsonify(error="Invalid file_id"), 400
 
-    img = _uploads[file_id]["image"]
-    filename = _uploads[file_id]["filename"]
+    img = upload["source"]
+    filename = upload["filename"]
     width = int(data.get("width", img.width))
     height = int(data.get("height", img.height))
     quality = int(data.get("quality", 85))
     mode = data.get("mode", "stretch")
     fmt = data.get("format", "JPEG").upper()
+    target_kb = data.get("target_kb")
+    if fmt != "AUTO" and fmt.replace("JPG", "JPEG") not in available_formats():
+        return jsonify(error=f"Unsupported format: {fmt}"), 400
 
-    resized = resize_image(img, width, height, mode)
-    img_bytes = export_image(resized, fmt, quality)
+    source = _source_for(upload, width, height, exact=True)
+    resized = resize_image(source, width, height, mode)
+    headers = {}
+    if fmt == "AUTO":
+        choice = choose_format(resized, int(float(target_kb) * 1024) if target_kb else None, quality)
+        fmt, img_bytes = choice.fmt, choice.data
+        headers = {
+            "X-Format": choice.fmt,
+            "X-Quality": str(choice.quality),
+            "X-Fits": str(choice.fits).lower(),
+            "X-Format-Candidates": json.dumps([
+                {"format": c.fmt, "quality": c.quality, "bytes": c.size,
+                 "ms": round(c.seconds * 1000, 1), "status": c.status}
+                for c in choice.candidates
+            ]),
+        }
+    else:
+        fmt = fmt.replace("JPG", "JPEG")
+        img_bytes = export_image(resized, fmt, quality)
 
-    ext = ".png" if fmt == "PNG" else ".jpg"
+    ext, mime = FORMATS[fmt]
     out_name = filename.rsplit(".", 1)[0] + f"_resized{ext}"
-    mime = "image/png" if fmt == "PNG" else "image/jpeg"
 
-    return send_file(BytesIO(img_bytes), mimetype=mime, as_attachment=True, download_name=out_name)
+    response = send_file(BytesIO(img_bytes), mimetype=mime, as_attachment=True, download_name=out_name)
+    response.headers.update(headers)
+    return response
 
 
 @bp.route("/api/imgsizer/auto-adjust", methods=["POST"])
@@ -106,19 +283,201 @@ def imgsizer_auto_adjust():
     """Find optimal quality/scale for target size."""
     data = request.get_json(silent=True) or {}
     file_id = data.get("file_id")
-    if not file_id or file_id not in _uploads:
+    upload = _load_upload(file_id)
+    if upload is None:
         return jsonify(error="Invalid file_id"), 400
 
-    img = _uploads[file_id]["image"]
+    img = upload["source"]
     width = int(data.get("width", img.width))
     height = int(data.get("height", img.height))
     mode = data.get("mode", "stretch")
     target_kb = int(data.get("target_kb", 1024))
 
-    resized = resize_image(img, width, height, mode)
-    quality, scale = auto_adjust(resized, target_kb * 1024)
+    source = _source_for(upload, width, height)
+    resized = resize_image(source, width, height, mode)
+    result = search_quality_scale(resized, target_kb * 1024)
+
+    return jsonify(
+        quality=result.quality,
+        scale=round(result.scale, 3),
+        width=result.width,
+        height=result.height,
+        estimated_bytes=result.size,
+        encodes=result.encodes,
+        fits=result.fits,
+    )
+
+
+# -- Batch -------------------------------------------------------------------
+
+# Batches are tasks in the task store whose events are the per-file result
+# records, published through the broker, so any worker process can stream
+# their progress or the ZIP;
+# encoded outputs live in the artifact store under
+# "imgsizer-batch:<batch_id>:<index>" and the batch is dropped when its
+# "imgsizer-batch:<batch_id>" placeholder expires
+
+# Seconds between keepalives on an idle batch progress stream
+_KEEPALIVE = 30
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _batch_pool() -> ProcessPoolExecutor:
+    """Return the process pool shared by all batches, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_executor(current_app.config.get("IMGSIZER_BATCH_WORKERS"))
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died so the next batch starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _drop_batch(key: str) -> None:
+    batch = tasks.get(key.split(":", 1)[1])
+    if batch is not None:
+        tasks.delete(key.split(":", 1)[1])
+        for index in range(batch["total"]):
+            artifacts.delete(f"{key}:{index}")
+
+
+def _batch_options(form) -> BatchOptions:
+    def _int(name):
+        value = form.get(name)
+        return int(value) if value not in (None, "") else None
+
+    return BatchOptions(
+        width=_int("width"),
+        height=_int("height"),
+        mode=form.get("mode", "stretch"),
+        quality=_int("quality") or 85,
+        fmt=form.get("format", "JPEG").upper().replace("JPG", "JPEG"),
+        target_kb=_int("target_kb"),
+    )
+
+
+@bp.route("/api/imgsizer/batch", methods=["POST"])
+def imgsizer_batch():
+    """Start resizing many images with one set of options. Returns batch_id.
+
+    Accepts multipart "files" and/or upload_id fields of completed resumable
+    uploads, plus form options width, height, mode, quality, format and
+    target_kb (not for PNG, which answers 400). Images are processed across a shared process pool; follow
+    progress over /progress and download the ZIP from /download, which
+    streams entries as they finish. Answers 429 with Retry-After when the
+    conversion queue is full.
+    """
+    try:
+        options = _batch_options(request.form)
+    except ValueError:
+        return jsonify(error="Invalid options"), 400
+    if options.fmt not in available_formats():
+        return jsonify(error=f"Unsupported format: {options.fmt}"), 400
+    if options.target_kb and options.fmt == "PNG":
+        return jsonify(error="target_kb needs a lossy format; PNG cannot be sized"), 400
+
+    uploads = receive_files(request)
+    if not uploads:
+        return jsonify(error="No files provided"), 400
+
+    batch_id = uuid.uuid4().hex[:12]
+    key = f"imgsizer-batch:{batch_id}"
+    run_no = tasks.create(batch_id, "imgsizer", total=len(uploads), error=None)
+    artifacts.put(key, on_evict=_drop_batch)
+    pool = _batch_pool()
+
+    def run():
+        completed = failed = 0
+        try:
+            sources = [(u.path, u.filename) for u in uploads]
+            for result in resize_batch(sources, options, executor=pool, output_dir=tempfile.gettempdir()):
+                record = {"index": result.index, "file": result.name, "bytes": result.size,
+                          "width": result.width, "height": result.height, "quality": result.quality}
+                if result.error is not None:
+                    record["error"] = result.error
+                    failed += 1
+                else:
+                    artifacts.put_file(f"{key}:{result.index}", result.path)
+                completed += 1
+                record.update(completed=completed, total=len(uploads))
+                # A failed image carries "error" but does not end the batch
+                broker.publish(batch_id, run_no, record, state="running")
+            broker.publish(batch_id, run_no, {"done": True, "completed": completed, "failed": failed})
+        except Exception as e:
+            broker.publish(batch_id, run_no, {"error": str(e)}, error=str(e))
+            if isinstance(e, BrokenProcessPool):
+                _reset_pool(pool)
+        finally:
+            for upload in uploads:
+                try:
+                    os.unlink(upload.path)
+                except OSError:
+                    pass
+
+    def on_wait(position, eta):
+        broker.publish(batch_id, run_no, {"queued": True, "position": position, "eta": eta})
+
+    try:
+        jobs.submit("imgsizer", run, on_wait=on_wait)
+    except QueueFull as e:
+        tasks.delete(batch_id)
+        artifacts.delete(key)
+        for upload in uploads:
+            os.unlink(upload.path)
+        return jsonify(error=str(e)), 429, {"Retry-After": str(e.retry_after)}
+    return jsonify(batch_id=batch_id, total=len(uploads))
+
+
+def _records(batch_id: str):
+    """Yield a batch's result records in completion order, waiting for new ones."""
+    for item in broker.follow(batch_id, keepalive=_KEEPALIVE):
+        if item is not None and "index" in item[1]:
+            yield item[1]
+
+
+@bp.route("/api/imgsizer/batch/<batch_id>/progress")
+def imgsizer_batch_progress(batch_id):
+    """SSE stream with one event per finished file, then a final done event.
+
+    While the batch waits for a free worker, {"queued": true} events carry
+    its queue position and an ETA in seconds (null until known). A
+    reconnecting EventSource resumes after the last event it saw.
+    """
+    batch = tasks.get(batch_id)
+    if batch is None:
+        return jsonify(error="Invalid batch_id"), 404
+    return broker.sse_response(batch_id, batch["run"], request.headers.get("Last-Event-ID"), _KEEPALIVE)
+
+
+@bp.route("/api/imgsizer/batch/<batch_id>/download")
+def imgsizer_batch_download(batch_id):
+    """Stream a ZIP of the batch, adding each image as soon as it is ready.
+
+    May be requested while the batch is still running; failed images are
+    listed in ERRORS.txt at the end of the archive.
+    """
+    if tasks.get(batch_id) is None:
+        return jsonify(error="Invalid batch_id"), 404
 
-    new_width = int(width * scale)
-    new_height = int(height * scale)
+    def results():
+        for record in _records(batch_id):
+            artifact = artifacts.get(f"imgsizer-batch:{batch_id}:{record['index']}")
+            if "error" in record or artifact is None:
+                yield BatchResult(record["index"], record["file"],
+                                  error=record.get("error", "result expired"))
+            else:
+                yield BatchResult(record["index"], record["file"], path=artifact.path)
 
-    return jsonify(quality=quality, scale=round(scale, 3), width=new_width, height=new_height)
+    return Response(stream_zip(results()), mimetype="application/zip", headers={
+        "Content-Disposition": f'attachment; filename="imgsizer-{batch_id}.zip"',
+        "X-Accel-Buffering": "no",
+    })
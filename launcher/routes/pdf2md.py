@@ -2,21 +2,71 @@
 
 from __future__ import annotations
 
-import json
 import os
-import queue
 import tempfile
 import threading
 import uuid
 
-from flask import Blueprint, request, jsonify, render_template, Response, send_file
+from flask import Blueprint, current_app, request, jsonify, render_template, Response, send_file
 
-from pdf2md import convert_pdf, format_size
+from pdf2md import ConversionCancelled, LazyDocument, PageCache, format_size, iter_markdown
+
+from ..execution import process_pool
+from ..jobs import QueueFull, jobs
+from ..broker import broker
+from ..store import artifacts
+from ..tasks import tasks
+from ..uploads import receive_file
 
 bp = Blueprint("pdf2md", __name__)
 
-# In-memory task store
-_tasks: dict[str, dict] = {}
+# Task state and progress live in the task store, published through the
+# broker, so any worker process can stream, cancel or download a conversion;
+# results live in the artifact
+# store under "pdf2md:<task_id>" and the task is dropped when that expires.
+# The conversion itself runs in the process that accepted the upload.
+
+# Seconds between keepalives on an idle progress stream; a client that went
+# away is noticed on the next write
+_KEEPALIVE = 15
+
+# The preview returns at most this much markdown; download has the rest
+_PREVIEW_BYTES = 1024 * 1024
+
+# Open documents for on-demand page rendering. The PDF itself lives in the
+# artifact store under "pdf2md-doc:<doc_id>"; the document is closed and
+# dropped when that expires
+_docs: dict[str, LazyDocument] = {}
+_docs_lock = threading.Lock()
+
+# Pages after (and before) the one requested that are converted ahead
+_PREFETCH_AFTER = 3
+_PREFETCH_BEFORE = 1
+
+
+_page_cache: PageCache | None = None
+_page_cache_lock = threading.Lock()
+
+
+def _get_page_cache() -> PageCache:
+    """Return the shared page cache, created on first use from the app config."""
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache(current_app.config.get("PDF2MD_CACHE_DIR"),
+                                    current_app.config.get("PDF2MD_CACHE_BYTES", 512 * 1024 * 1024))
+        return _page_cache
+
+
+def _drop_task(key: str) -> None:
+    tasks.delete(key.split(":", 1)[1])
+
+
+def _drop_doc(key: str) -> None:
+    with _docs_lock:
+        doc = _docs.pop(key.split(":", 1)[1], None)
+    if doc is not None:
+        doc.close()
 
 
 @bp.route("/pdf2md")
@@ -26,107 +76,253 @@ def pdf2md_page():
 
 @bp.route("/api/pdf2md/convert", methods=["POST"])
 def pdf2md_convert():
-    """Upload a PDF and start conversion. Returns task_id."""
-    f = request.files.get("file")
-    if not f:
-        return jsonify(error="No file provided"), 400
+    """Queue an uploaded PDF for conversion. Returns task_id.
 
-    # Save to temp file
-    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-    f.save(tmp)
-    tmp.close()
+    Accepts a multipart "file" or the upload_id of a completed resumable
+    upload (see routes/uploads.py), and an optional "pages" selection such
+    as "1-3,7" to convert only those pages. Answers 429 with Retry-After
+    when the conversion queue is full.
+    """
+    upload = receive_file(request)
+    if upload is None:
+        return jsonify(error="No file provided"), 400
 
     task_id = uuid.uuid4().hex[:12]
-    q: queue.Queue = queue.Queue()
-
-    _tasks[task_id] = {
-        "queue": q,
-        "input_path": tmp.name,
-        "input_size": os.path.getsize(tmp.name),
-        "filename": f.filename or "document.pdf",
-        "result": None,
-        "error": None,
-    }
+    run_no = tasks.create(task_id, "pdf2md", filename=upload.filename or "document.pdf",
+                          input_size=upload.size, error=None)
+    cancel = threading.Event()
+    # Placeholder so the task is bounded by the store's TTL even if it fails
+    artifacts.put(f"pdf2md:{task_id}", on_evict=_drop_task)
+    workers = current_app.config.get("PDF2MD_WORKERS")
+    backend = current_app.config.get("PDF2MD_BACKEND", "pdfplumber")
+    pages = request.form.get("pages") or None
+    cache = _get_page_cache()
+    in_process = current_app.config.get("EXECUTION_BACKEND") == "process"
 
     def run():
         try:
             def progress_cb(current, total, msg):
-                q.put({"page": current, "total": total, "status": msg})
+                broker.publish(task_id, run_no, {"page": current, "total": total, "status": msg}, coalesce=True)
 
-            md_text = convert_pdf(tmp.name, progress_callback=progress_cb)
-            _tasks[task_id]["result"] = md_text
-            q.put({"done": True, "output_size": len(md_text.encode("utf-8"))})
+            # Pages are written to a spool file as they are extracted, which
+            # the store then adopts, so the markdown is never held whole
+            fd, md_path = tempfile.mkstemp(suffix=".md", prefix="akatz-pdf2md-")
+            try:
+                if in_process:
+                    os.close(fd)
+                    if cancel.is_set():
+                        raise ConversionCancelled("Conversion cancelled")
+                    process_pool.run("pdf2md", progress_cb, cancel, input_path=upload.path,
+                                     output_path=md_path, workers=workers, backend=backend, pages=pages,
+                                     cache_dir=cache.directory, cache_bytes=cache.max_bytes)
+                else:
+                    with os.fdopen(fd, "w", encoding="utf-8", newline="") as out:
+                        for page in iter_markdown(upload.path, progress_callback=progress_cb,
+                                                  workers=workers, backend=backend, pages=pages,
+                                                  cache=cache, cancel=cancel):
+                            out.write(page)
+                artifact = artifacts.put_file(f"pdf2md:{task_id}", md_path)
+            except BaseException:
+                os.unlink(md_path)
+                raise
+            broker.publish(task_id, run_no, {"done": True, "output_size": artifact.size})
+        except ConversionCancelled as e:
+            broker.publish(task_id, run_no, {"error": str(e), "cancelled": True}, error=str(e))
         except Exception as e:
-            _tasks[task_id]["error"] = str(e)
-            q.put({"error": str(e)})
+            broker.publish(task_id, run_no, {"error": str(e)}, error=str(e))
         finally:
             try:
-                os.unlink(tmp.name)
+                os.unlink(upload.path)
             except OSError:
                 pass
 
-    threading.Thread(target=run, daemon=True).start()
+    def on_wait(position, eta):
+        broker.publish(task_id, run_no, {"queued": True, "position": position, "eta": eta})
+
+    try:
+        job = jobs.submit("pdf2md", run, cancel=cancel, on_wait=on_wait)
+    except QueueFull as e:
+        tasks.delete(task_id)
+        artifacts.delete(f"pdf2md:{task_id}")
+        os.unlink(upload.path)
+        return jsonify(error=str(e)), 429, {"Retry-After": str(e.retry_after)}
+    tasks.watch(task_id, run_no, lambda: jobs.cancel(job))
     return jsonify(task_id=task_id)
 
 
+@bp.route("/api/pdf2md/cancel/<task_id>", methods=["POST"])
+def pdf2md_cancel(task_id):
+    """Stop a running conversion; its stream then reports the cancellation."""
+    if tasks.get(task_id) is None:
+        return jsonify(error="Invalid task_id"), 404
+    return jsonify(cancelled=tasks.cancel(task_id))
+
+
 @bp.route("/api/pdf2md/progress/<task_id>")
 def pdf2md_progress(task_id):
-    """SSE stream for conversion progress."""
-    if task_id not in _tasks:
+    """SSE stream for conversion progress, from any worker process.
+
+    While the conversion waits for a free worker, {"queued": true} events
+    carry its queue position and an ETA in seconds (null until known).
+    Page progress is coalesced. Each event has an id, so a reconnecting
+    EventSource resumes after the last one it saw (Last-Event-ID); a
+    conversion left without a stream for SSE_DETACH_GRACE_SECONDS is
+    cancelled.
+    """
+    task = tasks.get(task_id)
+    if task is None:
         return jsonify(error="Invalid task_id"), 404
+    return broker.sse_response(task_id, task["run"], request.headers.get("Last-Event-ID"), _KEEPALIVE)
 
-    def generate():
-        q = _tasks[task_id]["queue"]
-        while True:
-            try:
-                msg = q.get(timeout=30)
-                yield f"data: {json.dumps(msg)}\n\n"
-                if "done" in msg or "error" in msg:
-                    break
-            except queue.Empty:
-                yield f"data: {json.dumps({'keepalive': True})}\n\n"
 
-    return Response(generate(), mimetype="text/event-stream",
-                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+def _result(task_id: str):
+    """Return (task, artifact) for a task, with artifact None until done."""
+    task = tasks.get(task_id)
+    if task is None or task["state"] != "done":
+        return task, None
+    return task, artifacts.get(f"pdf2md:{task_id}")
 
 
 @bp.route("/api/pdf2md/download/<task_id>")
 def pdf2md_download(task_id):
     """Download the converted markdown file."""
-    if task_id not in _tasks:
+    task, artifact = _result(task_id)
+    if task is None:
         return jsonify(error="Invalid task_id"), 404
 
-    task = _tasks[task_id]
     if task["error"]:
         return jsonify(error=task["error"]), 500
-    if task["result"] is None:
+    if artifact is None:
         return jsonify(error="Conversion not complete"), 425
 
     filename = task["filename"].rsplit(".", 1)[0] + ".md"
-    md_bytes = task["result"].encode("utf-8")
+    if artifact.path:
+        return send_file(artifact.path, mimetype="text/markdown",
+                         as_attachment=True, download_name=filename)
 
     from io import BytesIO
-    return send_file(BytesIO(md_bytes), mimetype="text/markdown",
+    return send_file(BytesIO(artifact.data), mimetype="text/markdown",
                      as_attachment=True, download_name=filename)
 
 
 @bp.route("/api/pdf2md/preview/<task_id>")
 def pdf2md_preview(task_id):
-    """Return the markdown content for inline preview."""
-    if task_id not in _tasks:
+    """Return the start of the markdown for inline preview, plus sizes."""
+    task, artifact = _result(task_id)
+    if task is None:
         return jsonify(error="Invalid task_id"), 404
 
-    task = _tasks[task_id]
-    if task["result"] is None:
+    if artifact is None:
         return jsonify(error="Conversion not complete"), 425
 
     input_size = task["input_size"]
-    output_size = len(task["result"].encode("utf-8"))
+    output_size = artifact.size
     reduction = ((input_size - output_size) / input_size * 100) if input_size > 0 else 0
 
+    # Slicing the mmap copies only the preview; a character split at the
+    # cut is dropped
+    with artifact.open() as data:
+        head = bytes(data[:_PREVIEW_BYTES]).decode("utf-8", errors="ignore")
+
     return jsonify(
-        markdown=task["result"],
+        markdown=head,
+        truncated=output_size > _PREVIEW_BYTES,
         input_size=format_size(input_size),
         output_size=format_size(output_size),
         reduction=round(reduction, 1),
     )
+
+
+def _doc_index(doc_id: str, doc: LazyDocument) -> dict:
+    artifact = artifacts.get(f"pdf2md-doc:{doc_id}")
+    return {
+        "doc_id": doc_id,
+        "filename": artifact.meta["filename"] if artifact else None,
+        "page_count": doc.page_count,
+        "pages": doc.index(),
+    }
+
+
+@bp.route("/api/pdf2md/open", methods=["POST"])
+def pdf2md_open():
+    """Open an uploaded PDF for on-demand page rendering. Returns its page index.
+
+    Accepts the same upload fields as /api/pdf2md/convert. Nothing is
+    converted until a page is requested from /api/pdf2md/doc/<id>/page/<n>.
+    """
+    upload = receive_file(request)
+    if upload is None:
+        return jsonify(error="No file provided"), 400
+
+    doc_id = uuid.uuid4().hex[:12]
+    key = f"pdf2md-doc:{doc_id}"
+    artifact = artifacts.put_file(key, upload.path, meta={
+        "filename": upload.filename or "document.pdf",
+    }, on_evict=_drop_doc)
+    try:
+        doc = LazyDocument(artifact.path, current_app.config.get("PDF2MD_BACKEND", "pdfplumber"))
+    except Exception as e:
+        artifacts.delete(key)
+        return jsonify(error=f"Could not open PDF: {e}"), 400
+    with _docs_lock:
+        _docs[doc_id] = doc
+    return jsonify(_doc_index(doc_id, doc))
+
+
+def _get_doc(doc_id: str):
+    """Return the open document, opening it here if another process stored it."""
+    # Looking the artifact up also refreshes its TTL
+    artifact = artifacts.get(f"pdf2md-doc:{doc_id}")
+    if artifact is None:
+        return None
+    with _docs_lock:
+        doc = _docs.get(doc_id)
+        if doc is not None:
+            return doc
+    try:
+        doc = LazyDocument(artifact.path, current_app.config.get("PDF2MD_BACKEND", "pdfplumber"))
+    except Exception:
+        return None
+    with _docs_lock:
+        if doc_id in _docs:
+            doc.close()
+            return _docs[doc_id]
+        _docs[doc_id] = doc
+    artifacts.set_on_evict(artifact.key, _drop_doc)
+    return doc
+
+
+@bp.route("/api/pdf2md/doc/<doc_id>")
+def pdf2md_doc_index(doc_id):
+    """Return page count and per-page sizes (markdown bytes once converted)."""
+    doc = _get_doc(doc_id)
+    if doc is None:
+        return jsonify(error="Invalid doc_id"), 404
+    return jsonify(_doc_index(doc_id, doc))
+
+
+@bp.route("/api/pdf2md/doc/<doc_id>/page/<int:number>")
+def pdf2md_doc_page(doc_id, number):
+    """Convert (or fetch from cache) one page and return its markdown.
+
+    Neighbouring pages are converted in the background so that paging
+    through the document does not wait on each page.
+    """
+    doc = _get_doc(doc_id)
+    if doc is None:
+        return jsonify(error="Invalid doc_id"), 404
+    if not 1 <= number <= doc.page_count:
+        return jsonify(error=f"Page {number} out of range (document has {doc.page_count} pages)"), 404
+
+    cached = doc.is_converted(number)
+    try:
+        markdown = doc.page(number)
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+    doc.prefetch([*range(number + 1, number + 1 + _PREFETCH_AFTER),
+                  *range(number - _PREFETCH_BEFORE, number)])
+    return Response(markdown, mimetype="text/markdown", headers={
+        "X-Page": str(number),
+        "X-Page-Count": str(doc.page_count),
+        "X-Cache": "hit" if cached else "miss",
+    })
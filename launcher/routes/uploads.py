@@ -0,0 +1,55 @@
+"""Resumable chunked upload routes shared by all tools."""
+
+from __future__ import annotations
+
+from flask import Blueprint, current_app, request, jsonify
+
+from ..uploads import UploadError, append_chunk, create_session, discard_session, get_session
+
+bp = Blueprint("uploads", __name__)
+
+
+@bp.app_errorhandler(UploadError)
+def upload_error(e: UploadError):
+    return jsonify(error=str(e)), e.status
+
+
+@bp.route("/api/uploads", methods=["POST"])
+def uploads_create():
+    """Start a resumable upload. Body: {filename, size, sha256?}.
+
+    Sizes above MAX_CONTENT_LENGTH are refused with 413, and a new session
+    beyond UPLOAD_MAX_SESSIONS open ones with 429.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data["size"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error="size is required"), 400
+    session = create_session(data.get("filename", "upload"), size, data.get("sha256"),
+                             max_size=current_app.config["MAX_CONTENT_LENGTH"],
+                             max_sessions=current_app.config["UPLOAD_MAX_SESSIONS"])
+    return jsonify(session.status()), 201
+
+
+@bp.route("/api/uploads/<upload_id>", methods=["GET"])
+def uploads_status(upload_id):
+    """Report the next expected offset so an interrupted client can resume."""
+    return jsonify(get_session(upload_id).status())
+
+
+@bp.route("/api/uploads/<upload_id>", methods=["PATCH"])
+def uploads_append(upload_id):
+    """Append the raw request body at the Upload-Offset header."""
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        return jsonify(error="Upload-Offset header is required"), 400
+    session = append_chunk(upload_id, offset, request.stream)
+    return jsonify(session.status())
+
+
+@bp.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def uploads_discard(upload_id):
+    discard_session(upload_id)
+    return "", 204
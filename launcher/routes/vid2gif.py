@@ -2,20 +2,144 @@
 
 from __future__ import annotations
 
-import json
+import contextlib
 import os
-import queue
 import tempfile
 import threading
 import uuid
 
-from flask import Blueprint, request, jsonify, render_template, Response, send_file
+from flask import Blueprint, current_app, request, jsonify, render_template, send_file
 
-from vid2gif import convert_video
+from vid2gif import ConversionCancelled, GifSession
+
+from ..execution import process_pool
+from ..jobs import QueueFull, jobs
+from ..broker import broker
+from ..store import artifacts
+from ..tasks import tasks
+from ..uploads import receive_file
 
 bp = Blueprint("vid2gif", __name__)
 
-_tasks: dict[str, dict] = {}
+# Task state and progress live in the task store, published through the
+# broker, so any worker process can stream, cancel or download a run; output GIFs are adopted by the artifact
+# store under "vid2gif:<task_id>" and the task is dropped when the GIF
+# expires or is evicted.
+#
+# Preview tasks keep their draft under "vid2gif-preview:<task_id>" and own
+# the upload plus an open GifSession (decoded samples, plans), so later
+# previews and the final convert can name the task as preview_id instead of
+# uploading and decoding again. The session is held here, in the process
+# that rendered the preview; elsewhere a preview_id answers 404 and the page
+# uploads the video again. Both are released when the draft expires.
+#
+# Each run is a scheduler job with its own cancel event, handed to the
+# preview session while the run borrows it. Running a preview again starts
+# a new run of its task. A preview remembers the last job that borrowed it,
+# and a new preview or convert of the same preview_id cancels that job,
+# whether it is running or still queued.
+_previews: dict[str, dict] = {}
+
+# Scheduler priority of previews, which the user is waiting on, over renders
+_PREVIEW_PRIORITY = 1
+
+# Seconds between keepalives on an idle progress stream; a client that went
+# away is noticed on the next write
+_KEEPALIVE = 15
+
+
+def _drop_task(key: str) -> None:
+    tasks.delete(key.split(":", 1)[1])
+
+
+def _release(preview: dict) -> None:
+    """Close a preview's session and delete its upload."""
+    session, path = preview.get("session"), preview.get("path")
+    preview["session"] = preview["path"] = None
+    if session is not None:
+        session.close()
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _close_preview(key: str) -> None:
+    task_id = key.split(":", 1)[1]
+    tasks.delete(task_id)
+    preview = _previews.pop(task_id, None)
+    if preview is None:
+        return
+    preview["closed"] = True
+    # A running preview or convert releases the preview when it finishes
+    if preview["lock"].acquire(blocking=False):
+        try:
+            _release(preview)
+        finally:
+            preview["lock"].release()
+
+
+@contextlib.contextmanager
+def _borrow(preview: dict, cancel: threading.Event):
+    """Hold a preview's upload and session for one preview or convert."""
+    if cancel.is_set():
+        raise ConversionCancelled("Conversion cancelled")
+    with preview["lock"]:
+        try:
+            if preview["path"] is None:
+                raise RuntimeError("Preview expired; upload the video again")
+            yield preview
+        finally:
+            if preview["closed"]:
+                _release(preview)
+
+
+def _session_for(preview: dict, options: dict, progress_cb, cancel, workers, engine) -> GifSession:
+    """Return the preview's session, reopening it if the options changed."""
+    session = preview["session"]
+    if session is not None and preview["options"] == options:
+        session.progress_callback = progress_cb
+        session.cancel = cancel
+        return session
+    if session is not None:
+        preview["session"] = None
+        session.close()
+    preview["session"] = GifSession(preview["path"], progress_callback=progress_cb,
+                                    workers=workers, engine=engine, cancel=cancel, **options)
+    preview["options"] = options
+    return preview["session"]
+
+
+def _parse_options(form) -> dict:
+    """Window and geometry options shared by preview and convert."""
+    width = form.get("width")
+    height = form.get("height")
+    return {
+        "start": float(form.get("start", 0)),
+        "duration": float(form.get("duration", 5)),
+        "width": int(width) if width else None,
+        "height": int(height) if height else None,
+        "aspect_mode": form.get("aspect_mode", "maintain"),
+    }
+
+
+def _gif_name(filename) -> str:
+    return (filename or "video").rsplit(".", 1)[0] + ".gif"
+
+
+def _submit(task_id: str, run_no: int, run, cancel: threading.Event, priority: int = 0):
+    """Queue a run, reporting its queue position as task events. Returns the Job.
+
+    Raises:
+        QueueFull: If the scheduler's queue is full.
+    """
+    def on_wait(position, eta):
+        broker.publish(task_id, run_no, {"queued": True, "position": position, "eta": eta})
+
+    job = jobs.submit("vid2gif", run, priority, cancel, on_wait)
+    tasks.watch(task_id, run_no, lambda: jobs.cancel(job))
+    return job
 
 
 @bp.route("/vid2gif")
@@ -23,106 +147,227 @@ def vid2gif_page():
     return render_template("vid2gif.html")
 
 
+@bp.route("/api/vid2gif/preview", methods=["POST"])
+def vid2gif_preview():
+    """Render a low-resolution draft GIF and predict the final size. Returns task_id.
+
+    Accepts a multipart "file", the upload_id of a completed resumable
+    upload, or the preview_id of an earlier preview of the same video. The
+    SSE stream sends {"preview": true} once the draft can be fetched from
+    /api/vid2gif/preview/<task_id>, then the predicted size. Previews are
+    queued ahead of full conversions; answers 429 with Retry-After when the
+    queue is full.
+    """
+    options = _parse_options(request.form)
+    target_size_mb = float(request.form.get("target_size_mb", 5))
+    workers = current_app.config.get("VID2GIF_WORKERS")
+    engine = current_app.config.get("VID2GIF_ENGINE", "auto")
+
+    task_id = request.form.get("preview_id")
+    if task_id:
+        preview = _previews.get(task_id)
+        run_no = tasks.restart(task_id, error=None, draft=False) if preview is not None else None
+        if run_no is None:
+            return jsonify(error="Preview expired; upload the video again"), 404
+        if preview["borrower"] is not None:
+            jobs.cancel(preview["borrower"])
+    else:
+        upload = receive_file(request)
+        if upload is None:
+            return jsonify(error="No file provided"), 400
+        task_id = uuid.uuid4().hex[:12]
+        preview = _previews[task_id] = {
+            "lock": threading.Lock(),
+            "borrower": None,
+            "closed": False,
+            "path": upload.path,
+            "session": None,
+            "options": None,
+            "filename": _gif_name(upload.filename),
+        }
+        run_no = tasks.create(task_id, "vid2gif-preview", filename=preview["filename"], error=None, draft=False)
+        artifacts.put(f"vid2gif-preview:{task_id}", on_evict=_close_preview)
+
+    cancel = threading.Event()
+
+    def run():
+        tmp_out = None
+        try:
+            def progress_cb(msg):
+                broker.publish(task_id, run_no, {"status": msg}, coalesce=True)
+
+            with _borrow(preview, cancel):
+                session = _session_for(preview, options, progress_cb, cancel, workers, engine)
+                with tempfile.NamedTemporaryFile(suffix=".gif", delete=False) as f:
+                    tmp_out = f.name
+                settings = session.preview(tmp_out)
+                artifacts.put_file(f"vid2gif-preview:{task_id}", tmp_out)
+                broker.publish(task_id, run_no, {"preview": True, "fps": settings.fps}, draft=True)
+                plan = session.plan(target_size_mb)
+            broker.publish(task_id, run_no, {
+                "done": True,
+                "predicted_mb": round(plan.predicted_bytes / (1024 * 1024), 2),
+                "fps": plan.settings.fps,
+                "scale": plan.settings.scale,
+                "colors": plan.settings.colors,
+            })
+        except ConversionCancelled as e:
+            broker.publish(task_id, run_no, {"error": str(e), "cancelled": True}, error=str(e))
+        except Exception as e:
+            broker.publish(task_id, run_no, {"error": str(e)}, error=str(e))
+        finally:
+            if tmp_out and os.path.exists(tmp_out):
+                os.unlink(tmp_out)
+
+    try:
+        job = _submit(task_id, run_no, run, cancel, _PREVIEW_PRIORITY)
+    except QueueFull as e:
+        if request.form.get("preview_id"):
+            broker.publish(task_id, run_no, {"error": str(e)}, error=str(e))
+        else:
+            artifacts.delete(f"vid2gif-preview:{task_id}")
+            _close_preview(f"vid2gif-preview:{task_id}")
+        return jsonify(error=str(e)), 429, {"Retry-After": str(e.retry_after)}
+    preview["borrower"] = job
+    return jsonify(task_id=task_id)
+
+
+@bp.route("/api/vid2gif/preview/<task_id>")
+def vid2gif_preview_image(task_id):
+    """Serve the draft GIF of a preview task."""
+    task = tasks.get(task_id)
+    artifact = artifacts.get(f"vid2gif-preview:{task_id}")
+    if task is None or not task.get("draft") or artifact is None or not artifact.path:
+        return jsonify(error="Preview not ready"), 404
+    return send_file(artifact.path, mimetype="image/gif", max_age=0)
+
+
 @bp.route("/api/vid2gif/convert", methods=["POST"])
 def vid2gif_convert():
-    """Upload a video and start conversion. Returns task_id."""
-    f = request.files.get("file")
-    if not f:
-        return jsonify(error="No file provided"), 400
+    """Queue an uploaded video for conversion. Returns task_id.
 
-    # Parse options from form data
-    duration = float(request.form.get("duration", 5))
+    Accepts a multipart "file", the upload_id of a completed resumable
+    upload (see routes/uploads.py), or the preview_id of a preview, whose
+    upload, decoded samples and plan are reused. Answers 429 with
+    Retry-After when the conversion queue is full.
+    """
+    options = _parse_options(request.form)
     target_size_mb = float(request.form.get("target_size_mb", 5))
-    width = request.form.get("width")
-    height = request.form.get("height")
-    aspect_mode = request.form.get("aspect_mode", "maintain")
+    workers = current_app.config.get("VID2GIF_WORKERS")
+    engine = current_app.config.get("VID2GIF_ENGINE", "auto")
 
-    width = int(width) if width else None
-    height = int(height) if height else None
-
-    # Save uploaded video to temp file
-    suffix = os.path.splitext(f.filename or "video.mp4")[1]
-    tmp_in = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
-    f.save(tmp_in)
-    tmp_in.close()
+    preview = upload = None
+    preview_id = request.form.get("preview_id")
+    if preview_id:
+        preview = _previews.get(preview_id)
+        if preview is None:
+            return jsonify(error="Preview expired; upload the video again"), 404
+        if preview["borrower"] is not None:
+            jobs.cancel(preview["borrower"])
+    else:
+        upload = receive_file(request)
+        if upload is None:
+            return jsonify(error="No file provided"), 400
 
     # Prepare output temp file
     tmp_out = tempfile.NamedTemporaryFile(suffix=".gif", delete=False)
     tmp_out.close()
 
     task_id = uuid.uuid4().hex[:12]
-    q: queue.Queue = queue.Queue()
-
-    _tasks[task_id] = {
-        "queue": q,
-        "output_path": tmp_out.name,
-        "filename": (f.filename or "video").rsplit(".", 1)[0] + ".gif",
-        "result_size": None,
-        "error": None,
-    }
+    run_no = tasks.create(task_id, "vid2gif", filename=preview["filename"] if preview else _gif_name(upload.filename),
+                          result_size=None, error=None)
+    cancel = threading.Event()
+    # Placeholder so the task is bounded by the store's TTL even if it fails
+    artifacts.put(f"vid2gif:{task_id}", on_evict=_drop_task)
+    # A preview's session (and its decoded samples) lives in this process,
+    # so only conversions of a fresh upload can move to a worker process
+    in_process = preview is None and current_app.config.get("EXECUTION_BACKEND") == "process"
 
     def run():
         try:
             def progress_cb(msg):
-                q.put({"status": msg})
-
-            final_size = convert_video(
-                input_path=tmp_in.name,
-                output_path=tmp_out.name,
-                duration=duration,
-                target_size_mb=target_size_mb,
-                width=width,
-                height=height,
-                aspect_mode=aspect_mode,
-                progress_callback=progress_cb,
-            )
-            _tasks[task_id]["result_size"] = final_size
-            q.put({"done": True, "size_mb": round(final_size, 2)})
+                broker.publish(task_id, run_no, {"status": msg}, coalesce=True)
+
+            if preview is not None:
+                with _borrow(preview, cancel):
+                    session = _session_for(preview, options, progress_cb, cancel, workers, engine)
+                    final_size = session.convert(tmp_out.name, target_size_mb)
+            elif in_process:
+                if cancel.is_set():
+                    raise ConversionCancelled("Conversion cancelled")
+                final_size = process_pool.run("vid2gif", progress_cb, cancel, input_path=upload.path,
+                                              output_path=tmp_out.name, target_size_mb=target_size_mb,
+                                              workers=workers, engine=engine, **options)
+            else:
+                with GifSession(upload.path, progress_callback=progress_cb, workers=workers,
+                                engine=engine, cancel=cancel, **options) as session:
+                    final_size = session.convert(tmp_out.name, target_size_mb)
+            artifacts.put_file(f"vid2gif:{task_id}", tmp_out.name)
+            broker.publish(task_id, run_no, {"done": True, "size_mb": round(final_size, 2)},
+                          result_size=final_size)
+        except ConversionCancelled as e:
+            broker.publish(task_id, run_no, {"error": str(e), "cancelled": True}, error=str(e))
         except Exception as e:
-            _tasks[task_id]["error"] = str(e)
-            q.put({"error": str(e)})
+            broker.publish(task_id, run_no, {"error": str(e)}, error=str(e))
         finally:
-            try:
-                os.unlink(tmp_in.name)
-            except OSError:
-                pass
+            for path in (upload.path if upload else None, tmp_out.name):
+                try:
+                    if path:
+                        os.unlink(path)
+                except OSError:
+                    pass
 
-    threading.Thread(target=run, daemon=True).start()
+    try:
+        job = _submit(task_id, run_no, run, cancel)
+    except QueueFull as e:
+        tasks.delete(task_id)
+        artifacts.delete(f"vid2gif:{task_id}")
+        for path in (upload.path if upload else None, tmp_out.name):
+            if path:
+                os.unlink(path)
+        return jsonify(error=str(e)), 429, {"Retry-After": str(e.retry_after)}
+    if preview is not None:
+        preview["borrower"] = job
     return jsonify(task_id=task_id)
 
 
-@bp.route("/api/vid2gif/progress/<task_id>")
-def vid2gif_progress(task_id):
-    """SSE stream for conversion progress."""
-    if task_id not in _tasks:
+@bp.route("/api/vid2gif/cancel/<task_id>", methods=["POST"])
+def vid2gif_cancel(task_id):
+    """Stop a running preview or conversion; its stream then reports the cancellation."""
+    task = tasks.get(task_id)
+    if task is None:
         return jsonify(error="Invalid task_id"), 404
+    return jsonify(cancelled=tasks.cancel(task_id, task["run"]))
+
 
-    def generate():
-        q = _tasks[task_id]["queue"]
-        while True:
-            try:
-                msg = q.get(timeout=60)
-                yield f"data: {json.dumps(msg)}\n\n"
-                if "done" in msg or "error" in msg:
-                    break
-            except queue.Empty:
-                yield f"data: {json.dumps({'keepalive': True})}\n\n"
+@bp.route("/api/vid2gif/progress/<task_id>")
+def vid2gif_progress(task_id):
+    """SSE stream for the task's current run, from any worker process.
 
-    return Response(generate(), mimetype="text/event-stream",
-                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    While the run waits for a free worker, {"queued": true} events carry
+    its queue position and an ETA in seconds (null until known). Status
+    messages are coalesced. Each event has an id, so a reconnecting
+    EventSource resumes after the last one it saw (Last-Event-ID); a run
+    left without a stream for SSE_DETACH_GRACE_SECONDS is cancelled.
+    """
+    task = tasks.get(task_id)
+    if task is None:
+        return jsonify(error="Invalid task_id"), 404
+    return broker.sse_response(task_id, task["run"], request.headers.get("Last-Event-ID"), _KEEPALIVE)
 
 
 @bp.route("/api/vid2gif/download/<task_id>")
 def vid2gif_download(task_id):
     """Download the converted GIF."""
-    if task_id not in _tasks:
+    task = tasks.get(task_id)
+    if task is None:
         return jsonify(error="Invalid task_id"), 404
 
-    task = _tasks[task_id]
     if task["error"]:
         return jsonify(error=task["error"]), 500
-    if task["result_size"] is None:
+    artifact = artifacts.get(f"vid2gif:{task_id}")
+    if task["state"] != "done" or artifact is None or not artifact.path:
         return jsonify(error="Conversion not complete"), 425
 
-    return send_file(task["output_path"], mimetype="image/gif",
+    return send_file(artifact.path, mimetype="image/gif",
                      as_attachment=True, download_name=task["filename"])
@@ -0,0 +1,109 @@
+"""Production serving: ``akatz-utils serve`` runs the hub under uvicorn.
+
+The desktop launcher uses Werkzeug's development server, which spends a
+thread on every connection and has no timeouts. Serve mode runs the ASGI
+adapter (asgi.py) under uvicorn instead, with a fixed number of request
+threads per worker process and progress streams on the event loop. With
+more than one worker the processes share the task database and the
+"shared" artifact backend, so any of them can answer any request.
+
+On SIGTERM (or Ctrl+C) uvicorn stops accepting connections and gives open
+requests and progress streams graceful_timeout seconds to finish. Each
+worker then drains its job scheduler: new conversions are refused, the
+accepted ones get drain_timeout seconds to complete, and whatever is still
+running is cancelled, so its clients are told instead of left waiting.
+
+uvicorn is an optional dependency (the launcher's "serve" extra).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from .asgi import AsgiApp, create_asgi_app
+
+# Environment variable that hands the options to uvicorn's worker processes
+_OPTIONS_ENV = "AKATZ_UTILS_SERVE_OPTIONS"
+
+
+@dataclass
+class ServeOptions:
+    """Options of ``akatz-utils serve``.
+
+    Attributes:
+        host: Interface to bind.
+        port: Port to bind.
+        workers: Worker processes.
+        threads: Request threads per worker.
+        keep_alive: Seconds an idle keep-alive connection stays open.
+        request_timeout: Seconds a request may go without progress before
+            it is answered 408 or 503 (see asgi.py); None waits forever.
+        graceful_timeout: Seconds open connections get to finish at shutdown.
+        drain_timeout: Seconds running and queued conversions then get to
+            finish before they are cancelled.
+        config: Overrides for create_app's settings.
+    """
+
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 1
+    threads: int = 16
+    keep_alive: int = 5
+    request_timeout: Optional[float] = 300.0
+    graceful_timeout: int = 30
+    drain_timeout: float = 300.0
+    config: dict = field(default_factory=dict)
+
+
+def create_server_app() -> AsgiApp:
+    """uvicorn app factory: build a worker's app from the options serve() passed on."""
+    options = ServeOptions(**json.loads(os.environ[_OPTIONS_ENV]))
+    app = create_asgi_app(options.config, options.threads, options.request_timeout)
+    app.on_shutdown.append(lambda: drain(options.drain_timeout))
+    return app
+
+
+def drain(timeout: float) -> None:
+    """Let this worker's conversions finish, up to timeout seconds, then cancel the rest."""
+    from .jobs import jobs
+    from .tasks import tasks
+
+    # Progress streams closed by the shutdown do not mean their clients left
+    tasks.configure(detach_grace=float("inf"))
+    stats = jobs.stats()
+    pending = stats["running"] + stats["waiting"]
+    if pending:
+        print(f"Waiting up to {timeout:g}s for {pending} conversion(s) to finish...", flush=True)
+    cancelled = jobs.drain(timeout)
+    if cancelled:
+        print(f"Cancelled {cancelled} unfinished conversion(s)", flush=True)
+
+
+def serve(options: ServeOptions) -> None:
+    """Run the hub under uvicorn until it is stopped."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("akatz-utils serve needs uvicorn: install the launcher with its 'serve' extra, "
+                         "e.g. uv tool install './launcher[serve]'") from None
+
+    config = dict(options.config)
+    if options.workers > 1:
+        # Requests of one task may reach any worker
+        config.setdefault("ARTIFACT_BACKEND", "shared")
+    os.environ[_OPTIONS_ENV] = json.dumps(asdict(options) | {"config": config})
+    print(f"Akatz Utils Hub serving at http://{options.host}:{options.port} "
+          f"({options.workers} worker(s) x {options.threads} threads)")
+    uvicorn.run(
+        "launcher.serve:create_server_app",
+        factory=True,
+        host=options.host,
+        port=options.port,
+        workers=options.workers,
+        timeout_keep_alive=options.keep_alive,
+        timeout_graceful_shutdown=options.graceful_timeout,
+        lifespan="on",
+    )
@@ -186,6 +186,7 @@
                 quality: parseInt(qualitySlider.value),
                 mode,
                 format: exportFormat.value,
+                target_kb: parseInt(targetSlider.value),
             }),
         });
         if (!res.ok) return;
@@ -9,8 +9,11 @@
     const progressPercent = $("#progressPercent");
     const resultSection = $("#resultSection");
     const statusMsg = $("#statusMsg");
+    const cancelBtn = $("#cancelBtn");
 
     let taskId = null;
+    // Progress stream of the running conversion, if any
+    let stream = null;
 
     dropzone.addEventListener("click", () => fileInput.click());
     dropzone.addEventListener("dragover", (e) => { e.preventDefault(); dropzone.classList.add("dragover"); });
@@ -24,7 +27,23 @@
         if (fileInput.files.length) startConversion(fileInput.files[0]);
     });
 
+    // Closing the stream would also cancel it, but only on the server's next write
+    function cancelRunning() {
+        if (!stream) return;
+        stream.close();
+        stream = null;
+        cancelBtn.style.display = "none";
+        fetch(`/api/pdf2md/cancel/${taskId}`, { method: "POST" });
+    }
+
+    cancelBtn.addEventListener("click", () => {
+        if (!taskId) return;
+        cancelBtn.disabled = true;
+        fetch(`/api/pdf2md/cancel/${taskId}`, { method: "POST" });
+    });
+
     async function startConversion(file) {
+        cancelRunning();
         filenameEl.textContent = file.name;
         progressSection.style.display = "";
         resultSection.style.display = "none";
@@ -34,7 +53,16 @@
         progressStatus.textContent = "Uploading...";
 
         const form = new FormData();
-        form.append("file", file);
+        try {
+            await chunkedUpload.appendFile(form, file, (frac) => {
+                progressStatus.textContent = `Uploading... ${Math.round(frac * 100)}%`;
+            });
+        } catch (err) {
+            showError(`Upload failed: ${err.message}`);
+            return;
+        }
+        const pages = $("#pagesInput").value.trim();
+        if (pages) form.append("pages", pages);
 
         const res = await fetch("/api/pdf2md/convert", { method: "POST", body: form });
         const data = await res.json();
@@ -48,13 +76,27 @@
     }
 
     function listenProgress(id) {
-        const es = new EventSource(`/api/pdf2md/progress/${id}`);
+        const es = stream = new EventSource(`/api/pdf2md/progress/${id}`);
+        cancelBtn.disabled = false;
+        cancelBtn.style.display = "";
+        const finish = () => {
+            es.close();
+            stream = null;
+            cancelBtn.style.display = "none";
+        };
         es.onmessage = (event) => {
             const msg = JSON.parse(event.data);
             if (msg.keepalive) return;
 
+            if (msg.queued) {
+                const eta = msg.eta !== null ? `, about ${msg.eta}s` : "";
+                progressStatus.textContent = `Queued (position ${msg.position}${eta})`;
+                return;
+            }
+
             if (msg.error) {
-                es.close();
+                finish();
+                if (msg.cancelled) progressStatus.textContent = "Cancelled";
                 showError(msg.error);
                 return;
             }
@@ -67,7 +109,7 @@
             }
 
             if (msg.done) {
-                es.close();
+                finish();
                 progressBar.style.width = "100%";
                 progressPercent.textContent = "100%";
                 progressStatus.textContent = "Done!";
@@ -75,7 +117,12 @@
             }
         };
         es.onerror = () => {
-            es.close();
+            // The browser retries on its own and resumes after the last event
+            if (es.readyState !== EventSource.CLOSED) {
+                progressStatus.textContent = "Reconnecting...";
+                return;
+            }
+            finish();
             showError("Connection lost during conversion");
         };
     }
@@ -108,7 +155,9 @@
         const previewPanel = $("#previewPanel");
         const toggleBtn = $("#togglePreview");
         const mdPreview = $("#mdPreview");
-        mdPreview.textContent = data.markdown;
+        mdPreview.textContent = data.truncated
+            ? `${data.markdown}\n\n[Preview truncated. Download for the full document.]`
+            : data.markdown;
 
         toggleBtn.onclick = () => {
             const visible = previewPanel.style.display !== "none";
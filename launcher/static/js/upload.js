@@ -0,0 +1,61 @@
+// Resumable chunked uploads (see launcher/uploads.py). Files above
+// CHUNKED_THRESHOLD are sent in chunks; an interrupted chunk is retried from
+// the offset the server last acknowledged.
+window.chunkedUpload = (() => {
+    const CHUNKED_THRESHOLD = 8 * 1024 * 1024;
+    const MAX_RETRIES = 5;
+
+    async function uploadChunked(file, onProgress) {
+        let res = await fetch("/api/uploads", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+        });
+        let session = await res.json();
+        if (session.error) throw new Error(session.error);
+
+        let retries = 0;
+        while (!session.complete) {
+            const end = Math.min(session.offset + session.chunk_size, file.size);
+            try {
+                res = await fetch(`/api/uploads/${session.upload_id}`, {
+                    method: "PATCH",
+                    headers: {
+                        "Content-Type": "application/octet-stream",
+                        "Upload-Offset": String(session.offset),
+                    },
+                    body: file.slice(session.offset, end),
+                });
+                if (res.status === 409) {
+                    // Out of sync: ask the server where to resume
+                    res = await fetch(`/api/uploads/${session.upload_id}`);
+                }
+                const data = await res.json();
+                if (data.error) throw new Error(data.error);
+                session = data;
+                retries = 0;
+            } catch (err) {
+                if (++retries > MAX_RETRIES) throw err;
+                await new Promise((r) => setTimeout(r, 500 * retries));
+                res = await fetch(`/api/uploads/${session.upload_id}`);
+                const data = await res.json();
+                if (data.error) throw new Error(data.error);
+                session = data;
+            }
+            if (onProgress) onProgress(session.offset / file.size);
+        }
+        return session.upload_id;
+    }
+
+    // Append a file to a FormData, as an upload_id if it was sent in chunks
+    async function appendFile(form, file, onProgress) {
+        if (file.size > CHUNKED_THRESHOLD) {
+            form.append("upload_id", await uploadChunked(file, onProgress));
+        } else {
+            form.append("file", file);
+        }
+        return form;
+    }
+
+    return { uploadChunked, appendFile };
+})();
@@ -10,8 +10,16 @@
     const resultSection = $("#resultSection");
     const statusMsg = $("#statusMsg");
 
+    const draftSection = $("#draftSection");
+    const cancelBtn = $("#cancelBtn");
+
     let selectedFile = null;
     let taskId = null;
+    // Preview task that holds the uploaded video and its decoded samples
+    let previewId = null;
+    // Progress stream of the running preview or conversion, and its task
+    let stream = null;
+    let streamId = null;
 
     // Dropzone
     dropzone.addEventListener("click", () => fileInput.click());
@@ -26,11 +34,31 @@
         if (fileInput.files.length) selectFile(fileInput.files[0]);
     });
 
+    // Closing the stream would also cancel it, but only on the server's next write
+    function cancelRunning() {
+        if (!stream) return;
+        stream.close();
+        stream = null;
+        cancelBtn.style.display = "none";
+        progressBar.style.animation = "";
+        setBusy(false);
+        fetch(`/api/vid2gif/cancel/${streamId}`, { method: "POST" });
+    }
+
+    cancelBtn.addEventListener("click", () => {
+        if (!stream) return;
+        cancelBtn.disabled = true;
+        fetch(`/api/vid2gif/cancel/${streamId}`, { method: "POST" });
+    });
+
     function selectFile(file) {
+        cancelRunning();
         selectedFile = file;
+        previewId = null;
         filenameEl.textContent = file.name;
         optionsSection.style.display = "";
         resultSection.style.display = "none";
+        draftSection.style.display = "none";
         statusMsg.innerHTML = "";
     }
 
@@ -41,12 +69,9 @@
         dimControls.style.display = useOriginal.checked ? "none" : "";
     });
 
-    // Convert
-    $("#convertBtn").addEventListener("click", async () => {
-        if (!selectedFile) return;
-
+    function buildForm() {
         const form = new FormData();
-        form.append("file", selectedFile);
+        form.append("start", $("#start").value || "0");
         form.append("duration", $("#duration").value);
         form.append("target_size_mb", $("#targetSize").value);
         form.append("aspect_mode", document.querySelector('input[name="aspect"]:checked').value);
@@ -57,41 +82,106 @@
             if (w) form.append("width", w);
             if (h) form.append("height", h);
         }
+        return form;
+    }
 
-        progressSection.style.display = "";
-        resultSection.style.display = "none";
+    function setBusy(busy) {
+        $("#convertBtn").disabled = busy;
+        $("#previewBtn").disabled = busy;
+    }
+
+    // Sends the video once; later requests name the preview task instead
+    async function submit(url) {
+        const form = buildForm();
         statusMsg.innerHTML = "";
-        progressBar.style.width = "0%";
-        progressStatus.textContent = "Uploading...";
-        $("#convertBtn").disabled = true;
+        setBusy(true);
+        if (previewId) {
+            form.append("preview_id", previewId);
+        } else {
+            progressSection.style.display = "";
+            progressBar.style.width = "0%";
+            progressStatus.textContent = "Uploading...";
+            try {
+                await chunkedUpload.appendFile(form, selectedFile, (frac) => {
+                    progressStatus.textContent = `Uploading... ${Math.round(frac * 100)}%`;
+                });
+            } catch (err) {
+                showError(`Upload failed: ${err.message}`);
+                setBusy(false);
+                return null;
+            }
+        }
 
-        const res = await fetch("/api/vid2gif/convert", { method: "POST", body: form });
+        const res = await fetch(url, { method: "POST", body: form });
         const data = await res.json();
         if (data.error) {
+            if (res.status === 404 && form.has("preview_id")) {
+                // The preview lives in another server process; send the video again
+                previewId = null;
+                return submit(url);
+            }
             showError(data.error);
-            $("#convertBtn").disabled = false;
-            return;
+            setBusy(false);
+            return null;
         }
+        return data.task_id;
+    }
+
+    // Preview
+    $("#previewBtn").addEventListener("click", async () => {
+        if (!selectedFile) return;
+        const id = await submit("/api/vid2gif/preview");
+        if (!id) return;
+        previewId = id;
+        draftSection.style.display = "";
+        $("#draftPreview").style.display = "none";
+        $("#predictedSize").textContent = "-";
+        $("#predictedSettings").textContent = "-";
+        listenProgress(id);
+    });
 
-        taskId = data.task_id;
+    // Convert
+    $("#convertBtn").addEventListener("click", async () => {
+        if (!selectedFile) return;
+        resultSection.style.display = "none";
+        const id = await submit("/api/vid2gif/convert");
+        if (!id) return;
+        taskId = id;
         listenProgress(taskId);
     });
 
     function listenProgress(id) {
+        progressSection.style.display = "";
+        progressStatus.textContent = "Starting...";
         // Use indeterminate progress (pulse animation) since vid2gif doesn't give page-by-page
         progressBar.style.width = "100%";
         progressBar.style.opacity = "0.6";
         progressBar.style.animation = "pulse 1.5s ease-in-out infinite";
 
-        const es = new EventSource(`/api/vid2gif/progress/${id}`);
+        const es = stream = new EventSource(`/api/vid2gif/progress/${id}`);
+        streamId = id;
+        cancelBtn.disabled = false;
+        cancelBtn.style.display = "";
+        const finish = () => {
+            es.close();
+            stream = null;
+            cancelBtn.style.display = "none";
+        };
         es.onmessage = (event) => {
             const msg = JSON.parse(event.data);
             if (msg.keepalive) return;
 
+            if (msg.queued) {
+                const eta = msg.eta !== null ? `, about ${msg.eta}s` : "";
+                progressStatus.textContent = `Queued (position ${msg.position}${eta})`;
+                return;
+            }
+
             if (msg.error) {
-                es.close();
+                finish();
+                if (msg.cancelled) progressStatus.textContent = "Cancelled";
                 showError(msg.error);
-                $("#convertBtn").disabled = false;
+                setBusy(false);
                 progressBar.style.animation = "";
                 return;
             }
@@ -100,20 +190,40 @@
                 progressStatus.textContent = msg.status;
             }
 
-            if (msg.done) {
-                es.close();
+            if (msg.preview) {
+                const draft = $("#draftPreview");
+                draft.src = `/api/vid2gif/preview/${id}?t=${Date.now()}`;
+                draft.style.display = "";
+            }
+
+            if (msg.done && msg.predicted_mb !== undefined) {
+                finish();
+                progressBar.style.animation = "";
+                progressBar.style.opacity = "1";
+                progressStatus.textContent = "Preview ready";
+                $("#predictedSize").textContent = `~${msg.predicted_mb} MB`;
+                $("#predictedSettings").textContent =
+                    `${msg.fps} fps, ${Math.round(msg.scale * 100)}% size, ${msg.colors} colors`;
+                setBusy(false);
+            } else if (msg.done) {
+                finish();
                 progressBar.style.animation = "";
                 progressBar.style.opacity = "1";
                 progressBar.style.width = "100%";
                 progressStatus.textContent = "Done!";
                 showResult(id, msg.size_mb);
-                $("#convertBtn").disabled = false;
+                setBusy(false);
             }
         };
         es.onerror = () => {
-            es.close();
+            // The browser retries on its own and resumes after the last event
+            if (es.readyState !== EventSource.CLOSED) {
+                progressStatus.textContent = "Reconnecting...";
+                return;
+            }
+            finish();
             showError("Connection lost during conversion");
-            $("#convertBtn").disabled = false;
+            setBusy(false);
             progressBar.style.animation = "";
         };
     }
@@ -0,0 +1,701 @@
+"""Bounded artifact store shared by the tool blueprints.
+
+Artifacts are byte payloads (uploads, conversion results) with a small
+metadata dict. The store keeps hot artifacts in memory up to a byte budget,
+spills the least recently used ones to a temp directory (read back through
+mmap), drops artifacts idle for longer than a TTL, and evicts the least
+recently used spilled artifacts once a disk budget is exceeded.
+
+Each artifact may also carry a derived in-memory object (e.g. decoded
+image proxies) whose size counts toward the memory budget. It is dropped
+when the artifact is spilled and callers rebuild it on demand.
+
+ArtifactStore keeps its index in process memory, so only the process that
+stored an artifact can read it. SharedArtifactStore keeps every payload
+and its metadata as files in one directory instead, which all worker
+processes (or hosts mounting the directory) read, and is selected with
+ARTIFACT_BACKEND = "shared". Blueprints use the process-wide ``artifacts``
+handle, which forwards to whichever backend create_app chose.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, Union
+
+_SAFE_KEY = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+@dataclass
+class Artifact:
+    """A stored payload and its bookkeeping.
+
+    Attributes:
+        key: Store key.
+        meta: Caller-defined metadata (kept in memory).
+        size: Payload size in bytes.
+        data: Payload bytes while in memory, None once spilled.
+        path: Spill file path once on disk, otherwise None.
+        cache: Optional derived in-memory object, dropped on spill.
+        cache_bytes: Size accounted for ``cache``.
+    """
+
+    key: str
+    meta: dict
+    size: int = 0
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    cache: Any = None
+    cache_bytes: int = 0
+    on_evict: Optional[Callable[[str], None]] = field(default=None, repr=False)
+    last_access: float = field(default_factory=time.monotonic)
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def read(self) -> bytes:
+        """Return the payload as bytes, reading it whole if spilled.
+
+        Use open() to work on a spilled payload without copying it.
+        """
+        if self.data is not None:
+            return self.data
+        if self.path is None:
+            return b""
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @contextmanager
+    def open(self) -> Iterator[Union[bytes, mmap.mmap]]:
+        """Yield the payload: bytes in memory, or a read-only mmap if spilled.
+
+        The map is closed when the block exits, so a spill file evicted
+        meanwhile is not kept pinned. An empty spilled payload is yielded as
+        b"" since empty files cannot be mapped.
+        """
+        if self.data is not None or self.path is None or self.size == 0:
+            yield self.data or b""
+            return
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with mapped:
+            yield mapped
+
+
+class ArtifactStore:
+    """Thread-safe, memory-bounded artifact store with disk spill.
+
+    Args:
+        name: Subdirectory name for spill files.
+        max_memory_bytes: Budget for in-memory payloads and caches.
+        max_disk_bytes: Budget for spilled payloads.
+        ttl_seconds: Artifacts idle for longer than this are removed.
+        spill_dir: Parent directory for spill files (defaults to the system
+            temp directory).
+    """
+
+    _SUFFIX = ".artifact"
+
+    def __init__(
+        self,
+        name: str = "akatz-utils",
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        max_disk_bytes: int = 4 * 1024 * 1024 * 1024,
+        ttl_seconds: float = 6 * 3600,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = os.path.join(spill_dir or tempfile.gettempdir(), name)
+        self._entries: OrderedDict[str, Artifact] = OrderedDict()
+        self._lock = threading.RLock()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._last_sweep = time.monotonic()
+        self._counters = dict.fromkeys(
+            ("hits", "misses", "spills", "evictions", "expirations", "orphans_removed"), 0
+        )
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.remove_orphans()
+
+    def configure(
+        self,
+        max_memory_bytes: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        """Adjust budgets at runtime and enforce them immediately."""
+        with self._lock:
+            if max_memory_bytes is not None:
+                self.max_memory_bytes = max_memory_bytes
+            if max_disk_bytes is not None:
+                self.max_disk_bytes = max_disk_bytes
+            if ttl_seconds is not None:
+                self.ttl_seconds = ttl_seconds
+            self._enforce()
+
+    # -- Writing ----------------------------------------------------------
+
+    def put(
+        self,
+        key: str,
+        data: bytes = b"",
+        meta: Optional[dict] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ) -> Artifact:
+        """Store a payload in memory, replacing any existing artifact.
+
+        Metadata and on_evict carry over from a replaced artifact unless
+        given. on_evict(key) is called when the artifact expires or is
+        evicted, but not when it is deleted explicitly.
+        """
+        with self._lock:
+            old = self._pop(key)
+            artifact = Artifact(
+                key=key,
+                meta=meta if meta is not None else (old.meta if old else {}),
+                size=len(data),
+                data=data,
+                on_evict=on_evict or (old.on_evict if old else None),
+            )
+            self._entries[key] = artifact
+            self._memory_bytes += artifact.size
+            self._enforce()
+            return artifact
+
+    def put_file(
+        self,
+        key: str,
+        path: str,
+        meta: Optional[dict] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ) -> Artifact:
+        """Adopt an existing file as a spilled artifact (the file is moved)."""
+        with self._lock:
+            old = self._pop(key)
+            spill_path = self._spill_path(key)
+            shutil.move(path, spill_path)
+            artifact = Artifact(
+                key=key,
+                meta=meta if meta is not None else (old.meta if old else {}),
+                size=os.path.getsize(spill_path),
+                path=spill_path,
+                on_evict=on_evict or (old.on_evict if old else None),
+            )
+            self._entries[key] = artifact
+            self._disk_bytes += artifact.size
+            self._enforce()
+            return artifact
+
+    def set_cache(self, key: str, obj: Any, nbytes: int) -> None:
+        """Attach a derived in-memory object to an artifact."""
+        with self._lock:
+            artifact = self._entries.get(key)
+            if artifact is None:
+                return
+            self._memory_bytes += nbytes - artifact.cache_bytes
+            artifact.cache, artifact.cache_bytes = obj, nbytes
+            self._enforce()
+
+    def set_on_evict(self, key: str, on_evict: Callable[[str], None]) -> None:
+        """Call on_evict(key) when the artifact expires or is evicted."""
+        with self._lock:
+            artifact = self._entries.get(key)
+            if artifact is not None:
+                artifact.on_evict = on_evict
+
+    def delete(self, key: str) -> None:
+        """Remove an artifact and its spill file without calling on_evict."""
+        with self._lock:
+            self._pop(key)
+
+    # -- Reading ----------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Artifact]:
+        """Return an artifact and mark it recently used, or None."""
+        with self._lock:
+            self._maybe_sweep()
+            artifact = self._entries.get(key)
+            if artifact is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            artifact.last_access = time.monotonic()
+            self._entries.move_to_end(key)
+            return artifact
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def stats(self) -> dict:
+        """Return entry counts, byte usage, budgets and event counters."""
+        with self._lock:
+            spilled = sum(1 for a in self._entries.values() if a.spilled)
+            return {
+                "entries": len(self._entries),
+                "in_memory": len(self._entries) - spilled,
+                "spilled": spilled,
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                **self._counters,
+            }
+
+    # -- Maintenance ------------------------------------------------------
+
+    def sweep(self) -> int:
+        """Remove artifacts idle longer than the TTL. Returns the count."""
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            cutoff = self._last_sweep - self.ttl_seconds
+            expired = [k for k, a in self._entries.items() if a.last_access < cutoff]
+            for key in expired:
+                self._evict(key, "expirations")
+            return len(expired)
+
+    def remove_orphans(self) -> int:
+        """Delete spill files not owned by this store and older than the TTL.
+
+        Such files are left behind by crashed or restarted processes. Files
+        younger than the TTL may belong to another live process sharing the
+        directory and are kept.
+        """
+        with self._lock:
+            owned = {a.path for a in self._entries.values() if a.path}
+            cutoff = time.time() - self.ttl_seconds
+            removed = 0
+            try:
+                names = os.listdir(self.spill_dir)
+            except OSError:
+                return 0
+            for name in names:
+                path = os.path.join(self.spill_dir, name)
+                if not name.endswith(self._SUFFIX) or path in owned:
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.unlink(path)
+                        removed += 1
+                except OSError:
+                    pass
+            self._counters["orphans_removed"] += removed
+            return removed
+
+    # -- Internals (call with the lock held) --------------------------------
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{os.getpid()}-{_SAFE_KEY.sub('_', key)}{self._SUFFIX}")
+
+    def _maybe_sweep(self) -> None:
+        # Sweep at most every tenth of the TTL (capped at a minute)
+        if time.monotonic() - self._last_sweep > min(60.0, self.ttl_seconds / 10):
+            self.sweep()
+            self.remove_orphans()
+
+    def _pop(self, key: str) -> Optional[Artifact]:
+        artifact = self._entries.pop(key, None)
+        if artifact is None:
+            return None
+        self._memory_bytes -= artifact.cache_bytes
+        if artifact.path is None:
+            self._memory_bytes -= artifact.size
+        else:
+            self._disk_bytes -= artifact.size
+            try:
+                os.unlink(artifact.path)
+            except OSError:
+                # Still mapped elsewhere on Windows; remove_orphans retries
+                pass
+        return artifact
+
+    def _evict(self, key: str, counter: str) -> None:
+        artifact = self._pop(key)
+        if artifact is None:
+            return
+        self._counters[counter] += 1
+        if artifact.on_evict is not None:
+            try:
+                artifact.on_evict(key)
+            except Exception:
+                pass
+
+    def _spill(self, artifact: Artifact) -> None:
+        self._memory_bytes -= artifact.cache_bytes
+        artifact.cache, artifact.cache_bytes = None, 0
+        if artifact.data is None:
+            return
+        path = self._spill_path(artifact.key)
+        with open(path, "wb") as f:
+            f.write(artifact.data)
+        artifact.path, artifact.data = path, None
+        self._memory_bytes -= artifact.size
+        self._disk_bytes += artifact.size
+        self._counters["spills"] += 1
+
+    def _enforce(self) -> None:
+        # Spill least recently used artifacts until memory fits
+        for artifact in list(self._entries.values()):
+            if self._memory_bytes <= self.max_memory_bytes:
+                break
+            if artifact.data is not None or artifact.cache is not None:
+                self._spill(artifact)
+        # Then evict least recently used spilled artifacts until disk fits
+        for key, artifact in list(self._entries.items()):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            if artifact.spilled:
+                self._evict(key, "evictions")
+
+
+class SharedArtifactStore:
+    """Artifact store on a directory shared by every worker process.
+
+    Each artifact is a payload file plus a JSON sidecar with its key and
+    metadata; both are written to a temp file and renamed into place, so
+    readers never see a partial artifact. A payload's mtime is its last
+    access: reads touch it, the TTL and the disk budget go by it, and any
+    process's sweep removes expired files.
+
+    Caches (see set_cache) and on_evict callbacks stay in the process that
+    set them. A process calls its on_evict callbacks once it notices the
+    artifact is gone, whichever process removed it.
+
+    Args:
+        directory: Shared directory (created if missing).
+        max_memory_bytes: Budget for this process's caches.
+        max_disk_bytes: Budget for all payloads in the directory.
+        ttl_seconds: Artifacts idle for longer than this are removed.
+    """
+
+    _SUFFIX = ".artifact"
+    _META = ".meta"
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        max_disk_bytes: int = 4 * 1024 * 1024 * 1024,
+        ttl_seconds: float = 6 * 3600,
+    ) -> None:
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "akatz-utils-shared")
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (payload inode, object, bytes); the inode detects replacement
+        self._caches: OrderedDict[str, tuple[int, Any, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._on_evict: dict[str, Callable[[str], None]] = {}
+        self._lock = threading.RLock()
+        self._last_sweep = time.monotonic()
+        self._counters = dict.fromkeys(("hits", "misses", "evictions", "expirations", "orphans_removed"), 0)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def configure(
+        self,
+        max_memory_bytes: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        """Adjust budgets at runtime and enforce them immediately."""
+        with self._lock:
+            if max_memory_bytes is not None:
+                self.max_memory_bytes = max_memory_bytes
+            if max_disk_bytes is not None:
+                self.max_disk_bytes = max_disk_bytes
+            if ttl_seconds is not None:
+                self.ttl_seconds = ttl_seconds
+            self._trim_caches()
+        self._enforce()
+
+    # -- Writing ----------------------------------------------------------
+
+    def put(
+        self,
+        key: str,
+        data: bytes = b"",
+        meta: Optional[dict] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ) -> Artifact:
+        """Store a payload, replacing any existing artifact (see ArtifactStore.put)."""
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return self._adopt(key, tmp, meta, on_evict)
+
+    def put_file(
+        self,
+        key: str,
+        path: str,
+        meta: Optional[dict] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ) -> Artifact:
+        """Adopt an existing file as the artifact's payload (the file is moved)."""
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        os.close(fd)
+        try:
+            shutil.move(path, tmp)
+        except BaseException:
+            _unlink(tmp)
+            raise
+        return self._adopt(key, tmp, meta, on_evict)
+
+    def set_cache(self, key: str, obj: Any, nbytes: int) -> None:
+        """Attach a derived in-memory object to an artifact, in this process."""
+        try:
+            inode = os.stat(self._path(key)).st_ino
+        except OSError:
+            return
+        with self._lock:
+            self._drop_cache(key)
+            self._caches[key] = (inode, obj, nbytes)
+            self._memory_bytes += nbytes
+            self._trim_caches()
+
+    def set_on_evict(self, key: str, on_evict: Callable[[str], None]) -> None:
+        """Call on_evict(key) in this process once the artifact is gone."""
+        with self._lock:
+            self._on_evict[key] = on_evict
+
+    def delete(self, key: str) -> None:
+        """Remove an artifact without calling on_evict."""
+        with self._lock:
+            self._drop_cache(key)
+            self._on_evict.pop(key, None)
+        _unlink(self._path(key))
+        _unlink(self._path(key, self._META))
+
+    # -- Reading ----------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Artifact]:
+        """Return an artifact and mark it recently used, or None."""
+        self._maybe_sweep()
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+            if time.time() - st.st_mtime > self.ttl_seconds:
+                raise FileNotFoundError(path)
+            os.utime(path)
+            meta = self._read_meta(key)
+        except OSError:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        with self._lock:
+            self._counters["hits"] += 1
+            cached = self._caches.get(key)
+            if cached is not None and cached[0] != st.st_ino:
+                self._drop_cache(key)
+                cached = None
+            if cached is not None:
+                self._caches.move_to_end(key)
+            return Artifact(key=key, meta=meta, size=st.st_size, path=path,
+                            cache=cached[1] if cached else None, cache_bytes=cached[2] if cached else 0,
+                            on_evict=self._on_evict.get(key))
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def stats(self) -> dict:
+        """Return entry counts, byte usage, budgets and this process's counters."""
+        entries = self._entries()
+        with self._lock:
+            return {
+                "backend": "shared",
+                "directory": self.directory,
+                "entries": len(entries),
+                "in_memory": 0,
+                "spilled": len(entries),
+                "cached": len(self._caches),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": sum(size for _, size, _ in entries),
+                "max_memory_bytes": self.max_memory_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                **self._counters,
+            }
+
+    # -- Maintenance ------------------------------------------------------
+
+    def sweep(self) -> int:
+        """Remove artifacts idle longer than the TTL and report vanished ones.
+
+        Returns the number of artifacts this call removed.
+        """
+        self._last_sweep = time.monotonic()
+        cutoff = time.time() - self.ttl_seconds
+        expired = 0
+        for path, _, mtime in self._entries():
+            if mtime < cutoff:
+                self._remove(path)
+                expired += 1
+        self.remove_orphans()
+        gone = []
+        with self._lock:
+            self._counters["expirations"] += expired
+            for key in list(self._on_evict):
+                if not os.path.exists(self._path(key)):
+                    gone.append((key, self._on_evict.pop(key)))
+                    self._drop_cache(key)
+        for key, on_evict in gone:
+            try:
+                on_evict(key)
+            except Exception:
+                pass
+        return expired
+
+    def remove_orphans(self) -> int:
+        """Delete temp files and metadata sidecars left behind by crashed writers."""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            orphan = name.startswith(".tmp-") or (
+                name.endswith(self._META) and not os.path.exists(path[:-len(self._META)] + self._SUFFIX))
+            try:
+                if orphan and os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._counters["orphans_removed"] += removed
+        return removed
+
+    # -- Internals ------------------------------------------------------------
+
+    def _path(self, key: str, suffix: str = _SUFFIX) -> str:
+        # The digest keeps keys that sanitize alike apart
+        digest = hashlib.sha1(key.encode()).hexdigest()[:10]
+        return os.path.join(self.directory, f"{_SAFE_KEY.sub('_', key)}-{digest}{suffix}")
+
+    def _read_meta(self, key: str) -> dict:
+        try:
+            with open(self._path(key, self._META), encoding="utf-8") as f:
+                return json.load(f)["meta"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _adopt(self, key: str, tmp: str, meta: Optional[dict], on_evict) -> Artifact:
+        """Rename a temp file in the directory into place as key's payload."""
+        path = self._path(key)
+        try:
+            if meta is None:
+                meta = self._read_meta(key)
+            else:
+                fd, meta_tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"key": key, "meta": meta}, f)
+                os.replace(meta_tmp, self._path(key, self._META))
+            os.replace(tmp, path)
+        except BaseException:
+            _unlink(tmp)
+            raise
+        with self._lock:
+            self._drop_cache(key)
+            if on_evict is not None:
+                self._on_evict[key] = on_evict
+            on_evict = self._on_evict.get(key)
+        self._enforce()
+        return Artifact(key=key, meta=meta, size=os.path.getsize(path), path=path, on_evict=on_evict)
+
+    def _entries(self) -> list[tuple[str, int, float]]:
+        """Return (path, size, mtime) of every payload in the directory."""
+        entries = []
+        try:
+            scan = os.scandir(self.directory)
+        except OSError:
+            return entries
+        with scan:
+            for entry in scan:
+                if entry.name.endswith(self._SUFFIX):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((entry.path, st.st_size, st.st_mtime))
+        return entries
+
+    def _remove(self, path: str) -> None:
+        _unlink(path)
+        _unlink(path[:-len(self._SUFFIX)] + self._META)
+
+    def _maybe_sweep(self) -> None:
+        # Sweep at most every tenth of the TTL (capped at a minute)
+        if time.monotonic() - self._last_sweep > min(60.0, self.ttl_seconds / 10):
+            self.sweep()
+
+    def _enforce(self) -> None:
+        """Evict least recently used payloads until the directory fits its budget."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_disk_bytes:
+            return
+        evicted = 0
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._counters["evictions"] += evicted
+        # Runs on_evict for this process's artifacts among them
+        self.sweep()
+
+    def _drop_cache(self, key: str) -> None:
+        cached = self._caches.pop(key, None)
+        if cached is not None:
+            self._memory_bytes -= cached[2]
+
+    def _trim_caches(self) -> None:
+        while self._memory_bytes > self.max_memory_bytes and self._caches:
+            _, (_, _, nbytes) = self._caches.popitem(last=False)
+            self._memory_bytes -= nbytes
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class _Handle:
+    """Forwards to the backend create_app chose, so blueprints can import one name."""
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+
+    def use(self, backend) -> None:
+        self.backend = backend
+
+    def __getattr__(self, name: str):
+        return getattr(self.backend, name)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.backend
+
+
+# Process-wide store used by all tool blueprints (configured in create_app)
+artifacts = _Handle(ArtifactStore())
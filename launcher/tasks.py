@@ -0,0 +1,427 @@
+"""Task state and progress events shared by every launcher process.
+
+Conversion tasks used to live in per-blueprint dicts, so a progress or
+download request that reached another worker process answered 404. The
+TaskStore keeps them in a SQLite database in WAL mode instead, which any
+number of processes on the host (or on hosts sharing the file) can read
+while one of them writes:
+
+    tasks   one row per task: tool, state, current run, caller data (JSON),
+            a cancel request and the process that owns the run
+    events  the progress messages of each run, in publish order
+    owners  a heartbeat per process that runs tasks
+
+A task's run is executed by the process that accepted it, which publishes
+progress as events. Any process can follow them (see broker.py) and
+request a cancel, which the owner's poller hands to the job. Progress
+streams attach to a task while open; a run left without streams for longer
+than a grace period is cancelled, so a client that reconnects in time keeps
+its conversion. Tasks survive restarts: once an owner's heartbeat goes
+stale, its unfinished runs are failed with an error event so their clients
+are told instead of waiting forever.
+
+A run number lets a task be run again (vid2gif previews): starting a new
+run drops the previous run's events, and events published by a superseded
+run are discarded.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Iterator, Optional
+
+# Seconds between checks for cancel requests made through other processes
+_CANCEL_POLL = 0.5
+# Seconds between owner heartbeats
+_HEARTBEAT = 5.0
+# Owners silent for this long are presumed dead and their runs failed
+_OWNER_TIMEOUT = 30.0
+# States after which a run publishes nothing more
+_FINAL = ("done", "error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    state TEXT NOT NULL,
+    run INTEGER NOT NULL,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL,
+    streams INTEGER NOT NULL DEFAULT 0,
+    detached REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    run INTEGER NOT NULL,
+    final INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_task ON events (task_id, run, seq);
+CREATE TABLE IF NOT EXISTS owners (
+    owner TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+# Columns added after the first release of the schema, for older databases
+_MIGRATIONS = {
+    "streams": "ALTER TABLE tasks ADD COLUMN streams INTEGER NOT NULL DEFAULT 0",
+    "detached": "ALTER TABLE tasks ADD COLUMN detached REAL",
+}
+
+
+def event_state(event: dict) -> str:
+    """Return the task state an event implies by default (see TaskStore.publish)."""
+    return "done" if "done" in event else "error" if "error" in event else \
+        "queued" if "queued" in event else "running"
+
+
+class TaskStore:
+    """Tasks, their progress events and cancel requests in a SQLite database.
+
+    Args:
+        path: Database file (created if missing). ":memory:" keeps the
+            database in this process only, for a single-process hub.
+        ttl_seconds: Tasks not updated for longer than this are deleted.
+        detach_grace: Seconds a run may go without progress streams (after
+            having one) before it is cancelled.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 6 * 3600,
+                 detach_grace: float = 10.0) -> None:
+        self.path = path or os.path.join(tempfile.gettempdir(), "akatz-utils-tasks.db")
+        self.ttl_seconds = ttl_seconds
+        self.detach_grace = detach_grace
+        # Unique per process, and per store so that tests may run two
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._schemas = [_SCHEMA]
+        self._local = threading.local()
+        self._generation = 0
+        # Keeps a ":memory:" database alive between threads' connections
+        self._anchor: Optional[sqlite3.Connection] = None
+        self._watched: dict[tuple[str, int], Callable[[], None]] = {}
+        self._cond = threading.Condition()
+        self._poller: Optional[threading.Thread] = None
+        self._closed = False
+        self._counters = dict.fromkeys(("created", "published", "cancel_requests", "recovered", "expired"), 0)
+
+    def configure(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                  detach_grace: Optional[float] = None) -> None:
+        """Point the store at another database or change the TTL or grace period."""
+        with self._cond:
+            if path is not None and path != self.path:
+                self.path = path
+                self._generation += 1
+                self._anchor = None
+            if ttl_seconds is not None:
+                self.ttl_seconds = ttl_seconds
+            if detach_grace is not None:
+                self.detach_grace = detach_grace
+
+    def add_schema(self, sql: str) -> None:
+        """Create extra tables (e.g. upload sessions) in the store's database."""
+        self._schemas.append(sql)
+        self._generation += 1
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yield this thread's connection inside a write transaction."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    # -- Writing ----------------------------------------------------------
+
+    def create(self, task_id: str, tool: str, **data) -> int:
+        """Record a new task, waiting on its first run. Returns the run number (1)."""
+        self._start()
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO tasks (id, tool, state, run, owner, data, updated) VALUES (?, ?, 'queued', 1, ?, ?, ?)",
+                (task_id, tool, self.owner, json.dumps(data), now),
+            )
+        self._counters["created"] += 1
+        return 1
+
+    def restart(self, task_id: str, **data) -> Optional[int]:
+        """Start a new run of a task owned by this process, merging data.
+
+        The previous run's events are deleted and anything it publishes
+        later is ignored. Returns the new run number, or None if the task
+        no longer exists.
+        """
+        with self.transaction() as conn:
+            row = conn.execute("SELECT run, data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            run = row[0] + 1
+            conn.execute(
+                "UPDATE tasks SET state = 'queued', run = ?, cancel = 0, detached = NULL, owner = ?, data = ?, "
+                "updated = ? WHERE id = ?",
+                (run, self.owner, json.dumps({**json.loads(row[1]), **data}), time.time(), task_id),
+            )
+            conn.execute("DELETE FROM events WHERE task_id = ?", (task_id,))
+        return run
+
+    def publish(self, task_id: str, run: int, event: dict, state: Optional[str] = None,
+                **data) -> Optional[int]:
+        """Append a progress event to a run and update the task's state and data.
+
+        state defaults to what the event says: "done" or "error" keys end
+        the run, "queued" marks it waiting and anything else running. Pass
+        it explicitly for events that carry such keys with another meaning.
+        Returns the event's sequence number, or None (storing nothing) if
+        the run was superseded or the task deleted. Use the broker's
+        publish so that this process's followers are woken.
+        """
+        state = state or event_state(event)
+        with self.transaction() as conn:
+            row = conn.execute("SELECT run, data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None or row[0] != run:
+                return None
+            merged = json.dumps({**json.loads(row[1]), **data}) if data else row[1]
+            conn.execute("UPDATE tasks SET state = ?, data = ?, updated = ? WHERE id = ?",
+                         (state, merged, time.time(), task_id))
+            seq = conn.execute("INSERT INTO events (task_id, run, final, data) VALUES (?, ?, ?, ?)",
+                               (task_id, run, state in _FINAL, json.dumps(event))).lastrowid
+        self._counters["published"] += 1
+        return seq
+
+    def delete(self, task_id: str) -> None:
+        """Forget a task and its events."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            conn.execute("DELETE FROM events WHERE task_id = ?", (task_id,))
+
+    def attach(self, task_id: str) -> None:
+        """Count an open progress stream of a task."""
+        with self.transaction() as conn:
+            conn.execute("UPDATE tasks SET streams = streams + 1, detached = NULL WHERE id = ?", (task_id,))
+
+    def detach(self, task_id: str, finished: bool = True) -> None:
+        """Uncount a progress stream; unless finished, the last one starts the grace period."""
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET streams = MAX(streams - 1, 0), "
+                "detached = CASE WHEN streams <= 1 AND ? THEN ? ELSE detached END WHERE id = ?",
+                (not finished, time.time(), task_id),
+            )
+
+    # -- Cancelling ---------------------------------------------------------
+
+    def request_cancel(self, task_id: str, run: Optional[int] = None) -> bool:
+        """Ask the owning process to cancel a task's unfinished run.
+
+        With run, only that run is cancelled. Returns False if there is no
+        such unfinished run.
+        """
+        with self.transaction() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET cancel = run WHERE id = ? AND state NOT IN (?, ?) AND (? IS NULL OR run = ?)",
+                (task_id, *_FINAL, run, run),
+            )
+        self._counters["cancel_requests"] += cur.rowcount
+        return cur.rowcount > 0
+
+    def watch(self, task_id: str, run: int, on_cancel: Callable[[], bool]) -> None:
+        """Have cancel requests for a run of this process call on_cancel().
+
+        Requests made through another process reach on_cancel on the
+        poller thread. The watch ends by itself once the run is over.
+        """
+        self._start()
+        with self._cond:
+            self._watched[(task_id, run)] = on_cancel
+
+    def cancel(self, task_id: str, run: Optional[int] = None) -> bool:
+        """Cancel a task's unfinished run, at once if this process owns it.
+
+        Returns what the run's on_cancel returned, or for runs of other
+        processes whether a cancel was requested (see request_cancel).
+        """
+        with self._cond:
+            on_cancel = next((fn for (tid, r), fn in self._watched.items()
+                              if tid == task_id and run in (None, r)), None)
+        if on_cancel is not None:
+            return on_cancel()
+        return self.request_cancel(task_id, run)
+
+    # -- Reading ----------------------------------------------------------
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        """Run a read-only query on this thread's connection and return its rows."""
+        return self._connect().execute(sql, params).fetchall()
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """Return a task's data with its "tool", "state" and "run", or None."""
+        row = self._connect().execute(
+            "SELECT tool, state, run, data FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[3]), "tool": row[0], "state": row[1], "run": row[2]}
+
+    def stats(self) -> dict:
+        """Return task counts by state, live owners and event counters."""
+        conn = self._connect()
+        states = dict(conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        owners = conn.execute("SELECT COUNT(*) FROM owners WHERE heartbeat >= ?",
+                              (time.time() - _OWNER_TIMEOUT,)).fetchone()[0]
+        return {
+            "path": self.path,
+            "tasks": sum(states.values()),
+            "states": states,
+            "events": conn.execute("SELECT COUNT(*) FROM events").fetchone()[0],
+            "owners": owners,
+            "watched": len(self._watched),
+            "ttl_seconds": self.ttl_seconds,
+            **self._counters,
+        }
+
+    # -- Maintenance ------------------------------------------------------
+
+    def recover(self) -> int:
+        """Fail unfinished runs whose owner stopped heartbeating. Returns the count."""
+        cutoff = time.time() - _OWNER_TIMEOUT
+        with self.transaction() as conn:
+            stale = conn.execute(
+                "SELECT id, run FROM tasks WHERE state NOT IN (?, ?) AND owner IS NOT ? AND "
+                "owner NOT IN (SELECT owner FROM owners WHERE heartbeat >= ?)",
+                (*_FINAL, self.owner, cutoff),
+            ).fetchall()
+        for task_id, run in stale:
+            self.publish(task_id, run, {"error": "Interrupted: the server process running it stopped"},
+                         error="Interrupted: the server process running it stopped")
+        self._counters["recovered"] += len(stale)
+        return len(stale)
+
+    def sweep(self) -> int:
+        """Delete tasks not updated within the TTL, and dead owners. Returns the count."""
+        cutoff = time.time() - self.ttl_seconds
+        with self.transaction() as conn:
+            expired = [r[0] for r in conn.execute("SELECT id FROM tasks WHERE updated < ?", (cutoff,))]
+            conn.executemany("DELETE FROM tasks WHERE id = ?", [(i,) for i in expired])
+            conn.executemany("DELETE FROM events WHERE task_id = ?", [(i,) for i in expired])
+            conn.execute("DELETE FROM owners WHERE heartbeat < ?", (cutoff,))
+        self._counters["expired"] += len(expired)
+        return len(expired)
+
+    def close(self) -> None:
+        """Stop heartbeating; other processes then fail this one's unfinished runs."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            with self.transaction() as conn:
+                conn.execute("DELETE FROM owners WHERE owner = ?", (self.owner,))
+        except sqlite3.Error:
+            pass
+
+    # -- Internals ------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = self._open()
+            local.generation = self._generation
+        return local.conn
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path == ":memory:":
+            uri = f"file:akatz-tasks-{id(self)}?mode=memory&cache=shared"
+            conn = sqlite3.connect(uri, uri=True, isolation_level=None, timeout=30)
+            if self._anchor is None:
+                self._anchor = sqlite3.connect(uri, uri=True)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        for sql in self._schemas:
+            conn.executescript(sql)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column, sql in _MIGRATIONS.items():
+            if column not in columns:
+                try:
+                    conn.execute(sql)
+                except sqlite3.OperationalError:
+                    pass  # added by another process meanwhile
+        return conn
+
+    def _beat(self) -> None:
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)",
+                         (self.owner, time.time()))
+
+    def _start(self) -> None:
+        """Register this process as an owner and start the poller, once."""
+        with self._cond:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target=self._poll, daemon=True, name="akatz-tasks")
+        self._beat()
+        self._poller.start()
+        atexit.register(self.close)
+
+    def _poll(self) -> None:
+        """Heartbeat, relay cancel requests and fail orphaned runs."""
+        last_beat = last_sweep = time.monotonic()
+        while True:
+            with self._cond:
+                self._cond.wait(_CANCEL_POLL)
+                if self._closed:
+                    return
+                watched = dict(self._watched)
+            try:
+                if watched:
+                    ids = sorted({task_id for task_id, _ in watched})
+                    rows = self._connect().execute(
+                        f"SELECT id, run, cancel, state, streams, detached FROM tasks "
+                        f"WHERE id IN ({','.join('?' * len(ids))})", ids,
+                    ).fetchall()
+                    current = {row[0]: row[1:] for row in rows}
+                    abandoned_before = time.time() - self.detach_grace
+                    for (task_id, run), on_cancel in watched.items():
+                        now_run, cancel, state, streams, detached = current.get(task_id, (None, 0, None, 0, None))
+                        abandoned = streams == 0 and detached is not None and detached < abandoned_before
+                        live = now_run == run and state not in _FINAL
+                        if not live or cancel == run or abandoned:
+                            with self._cond:
+                                self._watched.pop((task_id, run), None)
+                        if live and (cancel == run or abandoned):
+                            on_cancel()
+                now = time.monotonic()
+                if now - last_beat >= _HEARTBEAT:
+                    last_beat = now
+                    self._beat()
+                    self.recover()
+                if now - last_sweep >= min(60.0, self.ttl_seconds / 10):
+                    last_sweep = now
+                    self.sweep()
+            except Exception:
+                pass  # a locked or replaced database; retried on the next tick
+
+
+# Process-wide task store used by all tool blueprints (configured in create_app)
+tasks = TaskStore()
@@ -0,0 +1,421 @@
+"""Streaming and resumable uploads written straight to disk.
+
+Multipart file fields are written by the form parser straight into temp
+files in fixed-size chunks while being hashed (see StreamingRequest), so
+an upload never has to fit in memory and is never copied a second time.
+Large files can also be sent as a resumable session: the client creates a session, PATCHes chunks
+at explicit offsets (retrying or resuming from the last acknowledged
+offset) and then hands the completed upload_id to a tool endpoint. Each
+file completes on its own, so conversion of one file can start while the
+client is still sending the rest of a batch. Sessions are kept in the task
+store's database and their files in a directory set with configure(), so
+the chunks of one upload may be handled by different worker processes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Optional
+
+from flask import Request
+
+from .tasks import tasks
+
+CHUNK_SIZE = 1024 * 1024  # bytes read and written per step
+SESSION_TTL_SECONDS = 24 * 3600  # incomplete sessions are discarded after this
+
+
+class UploadError(Exception):
+    """An upload could not be accepted. Carries the HTTP status to return."""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class StoredUpload:
+    """A complete upload on disk. The receiver owns (and must delete) path."""
+
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+
+@dataclass
+class UploadSession:
+    """A resumable upload in progress.
+
+    Sessions are rows in the task store's database, so chunks may reach any
+    worker process. hasher is this process's running hash of the first
+    offset bytes, or None if other processes wrote some of them; the file
+    is then hashed once when it completes.
+    """
+
+    upload_id: str
+    filename: str
+    size: int
+    path: str
+    offset: int = 0
+    hasher: Any = field(default=None, repr=False)
+    expected_sha256: Optional[str] = None
+    sha256: Optional[str] = None
+    updated: float = field(default_factory=time.time)
+
+    @property
+    def complete(self) -> bool:
+        return self.offset >= self.size
+
+    def status(self) -> dict:
+        info = {"upload_id": self.upload_id, "offset": self.offset, "size": self.size,
+                "complete": self.complete, "chunk_size": CHUNK_SIZE}
+        if self.complete:
+            info["sha256"] = self.sha256
+        return info
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    expected_sha256 TEXT,
+    sha256 TEXT,
+    updated REAL NOT NULL
+);
+"""
+tasks.add_schema(_SCHEMA)
+
+# Running hashes of sessions whose chunks this process wrote, as
+# upload_id -> (offset, hasher), and per-session locks for this process
+_hashers: dict[str, tuple[int, Any]] = {}
+_locks: dict[str, threading.Lock] = {}
+_sessions_lock = threading.Lock()
+
+# Directory for upload files (None = the system temp dir); with several
+# worker processes it must be one they all see
+_upload_dir: Optional[str] = None
+
+
+def configure(directory: Optional[str] = None) -> None:
+    """Write uploads to directory instead of the system temp dir."""
+    global _upload_dir
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    _upload_dir = directory
+
+
+def _temp_path(filename: str) -> str:
+    suffix = os.path.splitext(filename)[1]
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="akatz-upload-", dir=_upload_dir)
+    os.close(fd)
+    return path
+
+
+def copy_stream(
+    src: BinaryIO,
+    dst: BinaryIO,
+    hasher=None,
+    limit: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """Copy src to dst in chunks, feeding each chunk to hasher if given.
+
+    Args:
+        src: Readable binary stream.
+        dst: Writable binary stream.
+        hasher: Optional hashlib object updated with every chunk.
+        limit: Stop after this many bytes; raise UploadError if exceeded.
+        chunk_size: Bytes per read.
+
+    Returns:
+        Number of bytes copied.
+    """
+    copied = 0
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if limit is not None and copied > limit:
+            raise UploadError("Chunk extends past the declared upload size", 413)
+        if hasher is not None:
+            hasher.update(chunk)
+        dst.write(chunk)
+
+
+def save_stream(src: BinaryIO, filename: str) -> StoredUpload:
+    """Write a stream to a new temp file in chunks, hashing as it goes."""
+    path = _temp_path(filename)
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "wb") as dst:
+            size = copy_stream(src, dst, hasher)
+    except BaseException:
+        _unlink(path)
+        raise
+    return StoredUpload(path=path, filename=filename, size=size, sha256=hasher.hexdigest())
+
+
+# -- Resumable sessions ----------------------------------------------------
+
+def create_session(
+    filename: str,
+    size: int,
+    sha256: Optional[str] = None,
+    max_size: Optional[int] = None,
+    max_sessions: Optional[int] = None,
+) -> UploadSession:
+    """Start a resumable upload of ``size`` bytes.
+
+    Args:
+        filename: Name of the uploaded file.
+        size: Declared upload size in bytes.
+        sha256: Optional expected checksum, verified once the upload completes.
+        max_size: Largest size accepted; larger ones raise UploadError(413).
+        max_sessions: Most sessions open at once, complete or not, until
+            they are taken, discarded or expire; another one raises
+            UploadError(429).
+    """
+    if size < 0:
+        raise UploadError("Upload size must not be negative")
+    if max_size is not None and size > max_size:
+        raise UploadError(f"Upload exceeds the {max_size // (1024 * 1024)} MB limit", 413)
+    expire_sessions()
+    session = UploadSession(
+        upload_id=uuid.uuid4().hex[:12],
+        filename=filename or "upload",
+        size=size,
+        path=_temp_path(filename or "upload"),
+        hasher=hashlib.sha256(),
+        expected_sha256=sha256.lower() if sha256 else None,
+    )
+    if size == 0:
+        session.sha256 = session.hasher.hexdigest()
+    with tasks.transaction() as conn:
+        if max_sessions is not None:
+            (count,) = conn.execute("SELECT COUNT(*) FROM uploads").fetchone()
+            if count >= max_sessions:
+                _unlink(session.path)
+                raise UploadError("Too many uploads in progress; try again later", 429)
+        conn.execute(
+            "INSERT INTO uploads (id, filename, size, path, offset, expected_sha256, sha256, updated) "
+            "VALUES (?, ?, ?, ?, 0, ?, ?, ?)",
+            (session.upload_id, session.filename, size, session.path, session.expected_sha256,
+             session.sha256, session.updated),
+        )
+    with _sessions_lock:
+        _hashers[session.upload_id] = (0, session.hasher)
+    return session
+
+
+def get_session(upload_id: str) -> UploadSession:
+    rows = tasks.query(
+        "SELECT filename, size, path, offset, expected_sha256, sha256, updated FROM uploads WHERE id = ?",
+        (upload_id,),
+    )
+    if not rows:
+        raise UploadError("Unknown upload_id", 404)
+    row = rows[0]
+    session = UploadSession(upload_id, *row[:4], expected_sha256=row[4], sha256=row[5], updated=row[6])
+    with _sessions_lock:
+        cached = _hashers.get(upload_id)
+    if cached is not None and cached[0] == session.offset:
+        session.hasher = cached[1]
+    return session
+
+
+def append_chunk(upload_id: str, offset: int, src: BinaryIO) -> UploadSession:
+    """Write a chunk at offset, which must equal the session's current offset.
+
+    A mismatched offset raises UploadError(409); the client should query the
+    session and resume from its reported offset.
+    """
+    with _sessions_lock:
+        lock = _locks.setdefault(upload_id, threading.Lock())
+    with lock:
+        session = get_session(upload_id)
+        if offset != session.offset:
+            raise UploadError(f"Expected offset {session.offset}", 409)
+        with open(session.path, "r+b") as dst:
+            dst.seek(offset)
+            written = copy_stream(src, dst, session.hasher, limit=session.size - offset)
+        session.offset += written
+        session.updated = time.time()
+        if session.complete:
+            session.sha256 = (session.hasher or _hash_file(session.path)).hexdigest()
+        with tasks.transaction() as conn:
+            # Another process may have written the same chunk meanwhile
+            moved = conn.execute(
+                "UPDATE uploads SET offset = ?, sha256 = ?, updated = ? WHERE id = ? AND offset = ?",
+                (session.offset, session.sha256, session.updated, upload_id, offset),
+            ).rowcount
+        with _sessions_lock:
+            if moved and session.hasher is not None and not session.complete:
+                _hashers[upload_id] = (session.offset, session.hasher)
+            else:
+                _hashers.pop(upload_id, None)
+        if not moved:
+            raise UploadError(f"Expected offset {get_session(upload_id).offset}", 409)
+        if session.complete and session.expected_sha256 and session.sha256 != session.expected_sha256:
+            discard_session(upload_id)
+            raise UploadError("Checksum mismatch; upload discarded", 422)
+    return session
+
+
+def take_upload(upload_id: str) -> StoredUpload:
+    """Hand a completed session's file to the caller and forget the session."""
+    with tasks.transaction() as conn:
+        row = conn.execute("SELECT filename, size, path, offset, sha256 FROM uploads WHERE id = ?",
+                           (upload_id,)).fetchone()
+        if row is None:
+            raise UploadError("Unknown upload_id", 404)
+        filename, size, path, offset, sha256 = row
+        if offset < size:
+            raise UploadError("Upload not complete", 409)
+        conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+    _forget(upload_id)
+    return StoredUpload(path=path, filename=filename, size=size, sha256=sha256)
+
+
+def discard_session(upload_id: str) -> None:
+    with tasks.transaction() as conn:
+        row = conn.execute("SELECT path FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+    _forget(upload_id)
+    if row is not None:
+        _unlink(row[0])
+
+
+def expire_sessions() -> int:
+    """Discard sessions idle for longer than SESSION_TTL_SECONDS."""
+    cutoff = time.time() - SESSION_TTL_SECONDS
+    stale = tasks.query("SELECT id FROM uploads WHERE updated < ?", (cutoff,))
+    for (upload_id,) in stale:
+        discard_session(upload_id)
+    return len(stale)
+
+
+def _forget(upload_id: str) -> None:
+    with _sessions_lock:
+        _hashers.pop(upload_id, None)
+        _locks.pop(upload_id, None)
+
+
+def _hash_file(path: str):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher
+
+
+class _HashingFile:
+    """Disk-backed file that hashes everything written to it."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self._file = open(path, "w+b")
+
+    def write(self, data: bytes) -> int:
+        self.hasher.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class StreamingRequest(Request):
+    """Request that spools multipart file fields straight to hashed temp files.
+
+    Werkzeug's default keeps small files in memory and spools large ones to
+    anonymous temp files, which receive_file() would then have to copy.
+    Here every file part goes to a named temp file that receive_file() can
+    adopt as-is; any file not adopted is deleted when the request closes.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = _HashingFile(_temp_path(filename or "upload"))
+        self.__dict__.setdefault("_spooled", []).append(stream)
+        return stream
+
+    def close(self) -> None:
+        super().close()
+        for stream in self.__dict__.pop("_spooled", []):
+            stream.close()
+            _unlink(stream.path)
+
+
+def receive_file(request) -> Optional[StoredUpload]:
+    """Return the upload for a tool request, on disk and owned by the caller.
+
+    Accepts either an ``upload_id`` (form field or JSON) naming a completed
+    resumable session, or a multipart ``file`` field. Returns None if the
+    request carries neither.
+    """
+    upload_id = request.form.get("upload_id")
+    if upload_id is None and request.is_json:
+        upload_id = (request.get_json(silent=True) or {}).get("upload_id")
+    if upload_id:
+        return take_upload(upload_id)
+
+    f = request.files.get("file")
+    if not f:
+        return None
+    return _adopt(request, f)
+
+
+def receive_files(request, field: str = "files") -> list[StoredUpload]:
+    """Return every upload for a batch request, on disk and owned by the caller.
+
+    Collects completed resumable sessions named by repeated ``upload_id``
+    form fields (or an ``upload_ids`` JSON list) followed by every multipart
+    file in ``field``.
+    """
+    upload_ids = request.form.getlist("upload_id")
+    if not upload_ids and request.is_json:
+        upload_ids = (request.get_json(silent=True) or {}).get("upload_ids", [])
+    uploads: list[StoredUpload] = []
+    try:
+        uploads.extend(take_upload(upload_id) for upload_id in upload_ids if upload_id)
+        uploads.extend(_adopt(request, f) for f in request.files.getlist(field) if f)
+    except BaseException:
+        for upload in uploads:
+            _unlink(upload.path)
+        raise
+    return uploads
+
+
+def _adopt(request, f) -> StoredUpload:
+    filename = f.filename or "upload"
+    stream = f.stream
+    spooled = request.__dict__.get("_spooled", [])
+    if isinstance(stream, _HashingFile) and stream in spooled:
+        # Adopt the spooled file rather than copying it
+        spooled.remove(stream)
+        stream.close()
+        return StoredUpload(path=stream.path, filename=filename,
+                            size=stream.size, sha256=stream.hasher.hexdigest())
+    return save_stream(stream, filename)
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
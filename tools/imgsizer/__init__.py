@@ -1,6 +1,47 @@
 """ImgSizer - Image resizing and compression utilities."""
 
-from .imgsizer import load_image, resize_image, estimate_size, auto_adjust, export_image
+from .imgsizer import (
+    AutoAdjustResult,
+    LazyImage,
+    load_image,
+    resize_image,
+    build_pyramid,
+    pyramid_level,
+    estimate_size,
+    auto_adjust,
+    search_quality_scale,
+    export_image,
+    FORMATS,
+    available_formats,
+)
+from .formats import FormatCandidate, FormatChoice, choose_format
+from .estimate import SizeEstimate, estimate, estimate_exact, estimate_fast
+from .batch import BatchOptions, BatchResult, create_executor, resize_batch, stream_zip
 
 __version__ = "0.1.0"
-__all__ = ["load_image", "resize_image", "estimate_size", "auto_adjust", "export_image"]
+__all__ = [
+    "AutoAdjustResult",
+    "LazyImage",
+    "load_image",
+    "resize_image",
+    "build_pyramid",
+    "pyramid_level",
+    "estimate_size",
+    "auto_adjust",
+    "search_quality_scale",
+    "export_image",
+    "FORMATS",
+    "available_formats",
+    "FormatCandidate",
+    "FormatChoice",
+    "choose_format",
+    "SizeEstimate",
+    "estimate",
+    "estimate_exact",
+    "estimate_fast",
+    "BatchOptions",
+    "BatchResult",
+    "create_executor",
+    "resize_batch",
+    "stream_zip",
+]
@@ -0,0 +1,266 @@
+"""
+Image Resizer - Batch processing across a process pool.
+
+Usable from plain Python:
+
+    from imgsizer import BatchOptions, resize_batch, stream_zip
+
+    results = resize_batch(["a.jpg", "b.png"], BatchOptions(width=1200))
+    with open("out.zip", "wb") as f:
+        for chunk in stream_zip(results):
+            f.write(chunk)
+
+Inputs are passed to workers as file paths, and each worker decodes only
+the resolution it needs. With an output_dir, workers also write their
+results there and hand back paths, so no image bytes cross the process
+boundary. Results are yielded as they complete rather than in input order.
+"""
+
+from __future__ import annotations
+
+import io
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+from PIL import Image
+
+from .formats import choose_format
+from .imgsizer import FORMATS, _format_name, export_image, load_image, resize_image, search_quality_scale
+
+# Downscales tried for WebP/AVIF when no quality fits target_kb
+_MAX_RESCALES = 4
+
+
+@dataclass
+class BatchOptions:
+    """Settings applied to every image in a batch.
+
+    Attributes:
+        width: Target width; None keeps the aspect ratio from height.
+        height: Target height; None keeps the aspect ratio from width.
+        mode: "stretch" or "crop" when both width and height are given.
+        quality: Quality for lossy formats (ignored when target_kb is set
+            or for PNG).
+        fmt: Output format (see available_formats()).
+        target_kb: If set, fit each image under this size: JPEG searches
+            quality and scale (search_quality_scale()); WebP and AVIF search
+            quality (choose_format()) and scale down if even the lowest
+            quality is too large. PNG is lossless and cannot be sized, so
+            resize_batch() rejects it.
+    """
+
+    width: Optional[int] = None
+    height: Optional[int] = None
+    mode: str = "stretch"
+    quality: int = 85
+    fmt: str = "JPEG"
+    target_kb: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    """Outcome for one input image.
+
+    Attributes:
+        index: Position of the input in the batch.
+        name: Output file name (input stem + "_resized" + extension).
+        data: Encoded output, or None on error or when written to path.
+        width: Output width in pixels.
+        height: Output height in pixels.
+        quality: Quality used (0 for PNG).
+        error: Error message if the image failed.
+        path: File holding the encoded output when the batch was given an
+            output_dir; the caller owns it.
+    """
+
+    index: int
+    name: str
+    data: Optional[bytes] = None
+    width: int = 0
+    height: int = 0
+    quality: int = 0
+    error: Optional[str] = None
+    path: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        if self.path is not None:
+            return os.path.getsize(self.path)
+        return len(self.data) if self.data is not None else 0
+
+
+def target_size(size: Tuple[int, int], width: Optional[int], height: Optional[int]) -> Tuple[int, int]:
+    """Resolve (width, height) options against an image size.
+
+    A missing dimension is derived from the other to keep the aspect ratio;
+    with neither given the original size is kept.
+    """
+    src_w, src_h = size
+    if width and height:
+        return width, height
+    if width:
+        return width, max(1, round(src_h * width / src_w))
+    if height:
+        return max(1, round(src_w * height / src_h)), height
+    return src_w, src_h
+
+
+def output_name(source_name: str, fmt: str) -> str:
+    ext = FORMATS.get(fmt.upper(), FORMATS["JPEG"])[0]
+    return Path(source_name).stem + f"_resized{ext}"
+
+
+def process_image(index: int, path: str, name: str, options: BatchOptions,
+                  output_dir: Optional[str] = None) -> BatchResult:
+    """Resize and encode one image. Runs inside a worker process.
+
+    With output_dir, the encoded image is written to a new file there and
+    returned as the result's path instead of its data.
+    """
+    out_name = output_name(name, options.fmt)
+    try:
+        with Image.open(path) as probe:
+            width, height = target_size(probe.size, options.width, options.height)
+        img = resize_image(load_image(path, (width, height)), width, height, options.mode)
+
+        quality = options.quality
+        data = None
+        fmt = _format_name(options.fmt)
+        if options.target_kb and fmt == "JPEG":
+            found = search_quality_scale(img, options.target_kb * 1024)
+            quality = found.quality
+            if found.scale < 1.0:
+                img = img.resize((found.width, found.height), Image.Resampling.LANCZOS)
+        elif options.target_kb:
+            target = options.target_kb * 1024
+            choice = choose_format(img, target, quality, formats=[fmt])
+            for _ in range(_MAX_RESCALES):
+                if choice.fits:
+                    break
+                # Bytes grow roughly with pixel area; aim a little under
+                factor = 0.95 * (target / choice.size) ** 0.5
+                img = img.resize((max(1, int(img.width * factor)), max(1, int(img.height * factor))),
+                                 Image.Resampling.LANCZOS)
+                choice = choose_format(img, target, quality, formats=[fmt])
+            quality, data = choice.quality, choice.data
+
+        if data is None:
+            data = export_image(img, options.fmt, quality)
+        out_path = None
+        if output_dir is not None:
+            fd, out_path = tempfile.mkstemp(suffix=os.path.splitext(out_name)[1], dir=output_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            data = None
+        return BatchResult(
+            index=index, name=out_name, data=data, width=img.width, height=img.height,
+            quality=0 if options.fmt.upper() == "PNG" else quality, path=out_path,
+        )
+    except Exception as e:
+        return BatchResult(index=index, name=out_name, error=str(e).replace(path, name))
+
+
+def create_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return a process pool suitable for resize_batch().
+
+    Workers are spawned rather than forked, since callers such as the Flask
+    hub are multi-threaded.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def resize_batch(
+    sources: Iterable[Union[str, Path, Tuple[str, str]]],
+    options: BatchOptions,
+    max_workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    output_dir: Optional[str] = None,
+) -> Iterator[BatchResult]:
+    """Process many images with one set of options, yielding as they finish.
+
+    Args:
+        sources: File paths, or (path, display_name) tuples.
+        options: Settings applied to every image.
+        max_workers: Pool size when no executor is given (default: CPU count).
+        executor: Optional existing executor to reuse (e.g. a warm pool).
+        output_dir: If set, outputs are written to files in this directory
+            (see BatchResult.path) rather than returned as bytes.
+
+    Yields:
+        BatchResult per input, in completion order.
+
+    Raises:
+        ValueError: If options.target_kb is set for PNG output.
+    """
+    if options.target_kb and _format_name(options.fmt) == "PNG":
+        raise ValueError("target_kb needs a lossy format; PNG cannot be sized")
+    own_executor = executor is None
+    pool = create_executor(max_workers) if own_executor else executor
+    try:
+        futures = []
+        for index, source in enumerate(sources):
+            path, name = source if isinstance(source, tuple) else (source, source)
+            futures.append(pool.submit(process_image, index, os.fspath(path), os.path.basename(name), options,
+                                       output_dir))
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        if own_executor:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target that hands out what was written so far."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def stream_zip(results: Iterable[BatchResult]) -> Iterator[bytes]:
+    """Encode results as a ZIP archive, yielding bytes as each entry is added.
+
+    Entries are stored uncompressed (the images are already compressed).
+    Duplicate names get a numeric suffix; failed images are listed in
+    ERRORS.txt at the end of the archive.
+    """
+    sink = _ChunkSink()
+    seen: dict[str, int] = {}
+    errors: list[str] = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for result in results:
+            if result.error is not None:
+                errors.append(f"{result.name}: {result.error}")
+                continue
+            name = result.name
+            if name in seen:
+                seen[name] += 1
+                stem, ext = os.path.splitext(name)
+                name = f"{stem}_{seen[result.name]}{ext}"
+            else:
+                seen[name] = 0
+            if result.path is not None:
+                zf.write(result.path, name)
+            else:
+                zf.writestr(name, result.data)
+            yield sink.drain()
+        if errors:
+            zf.writestr("ERRORS.txt", "\n".join(errors) + "\n")
+    yield sink.drain()
@@ -0,0 +1,208 @@
+"""
+Image Resizer - Encoded size estimation.
+
+Two modes are provided:
+
+- "exact" encodes once and keeps the bytes, so a caller that also needs the
+  encoded image (a preview, an export) never pays for a second encode.
+- "fast" encodes a stratified sample of tiles and scales their payload by
+  area. Its error bound comes from the spread of per-tile payloads.
+"""
+
+from __future__ import annotations
+
+import io
+import math
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+from .imgsizer import _write_image
+
+# Tiles are multiples of the 16px JPEG MCU so block boundaries line up
+_TILE = 64
+_TILES = 24
+# Large images sample at least this fraction of their area
+_MIN_SAMPLE_FRACTION = 0.01
+# Small JPEG tiles restart DC prediction and build Huffman tables from little
+# data, so they cost a few percent more per pixel than the whole image
+_JPEG_TILE_BIAS = 0.94
+# PNG bands: full-width strips this many rows tall
+_BAND = 64
+# Two-sided z-score for the reported error bound (~95% coverage)
+_Z = 2.0
+# Fast mode falls back to exact when the sample would cover this much area
+_MAX_SAMPLE_FRACTION = 0.25
+
+
+@dataclass
+class SizeEstimate:
+    """Estimated encoded size of an image.
+
+    Attributes:
+        size: Estimated size in bytes.
+        error: Relative error bound (0.25 means +/-25%); 0.0 when exact.
+        mode: "exact" or "fast" (the mode actually used).
+        data: Encoded bytes when mode is "exact", otherwise None.
+    """
+
+    size: int
+    error: float
+    mode: str
+    data: Optional[bytes] = None
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    _write_image(img, buf, fmt, quality)
+    return buf.getvalue()
+
+
+def estimate_exact(img: Image.Image, quality: int = 85, fmt: str = "JPEG") -> SizeEstimate:
+    """Encode once and return the size together with the encoded bytes.
+
+    Args:
+        img: PIL Image.
+        quality: Quality for lossy formats (ignored for PNG).
+        fmt: Output format (see imgsizer.available_formats()).
+
+    Returns:
+        SizeEstimate with ``data`` set and zero error.
+    """
+    data = _encode(img, fmt, quality)
+    return SizeEstimate(size=len(data), error=0.0, mode="exact", data=data)
+
+
+def _tile_boxes(width: int, height: int, count: int, tile: int) -> list[tuple[int, int, int, int]]:
+    """Spread tile boxes over a grid, one per stratum.
+
+    Each tile is jittered within its stratum (deterministically) so that
+    periodic content such as UI chrome or text lines does not alias with
+    the grid.
+    """
+    rng = random.Random(width * 31 + height)
+    cols = max(1, round(math.sqrt(count * width / height)))
+    rows = max(1, math.ceil(count / cols))
+    cell_w, cell_h = width / cols, height / rows
+    boxes = []
+    for r in range(rows):
+        for c in range(cols):
+            x = int(c * cell_w + rng.random() * max(0, cell_w - tile))
+            y = int(r * cell_h + rng.random() * max(0, cell_h - tile))
+            # Snap to the 16px MCU grid so block boundaries line up
+            x = min(x // 16 * 16, width - tile)
+            y = min(y // 16 * 16, height - tile)
+            boxes.append((x, y, x + tile, y + tile))
+    return boxes[:count]
+
+
+def _band_boxes(width: int, height: int, count: int, band: int) -> list[tuple[int, int, int, int]]:
+    """Evenly spread full-width horizontal bands over the image."""
+    boxes = []
+    for r in range(count):
+        y = min(height - band, int((r + 0.5) * height / count - band / 2))
+        boxes.append((0, max(0, y), width, max(0, y) + band))
+    return boxes
+
+
+def estimate_fast(
+    img: Image.Image,
+    quality: int = 85,
+    fmt: str = "JPEG",
+    tiles: int = _TILES,
+    tile_size: int = _TILE,
+) -> SizeEstimate:
+    """Predict the encoded size from a sample of encoded tiles.
+
+    Each tile's payload is its encoded size minus the fixed container
+    overhead (headers and tables, measured on a minimal image). PNG samples
+    full-width bands rather than square tiles. The mean payload per pixel
+    is scaled by the image area and the overhead added back once. The
+    error bound is two standard errors of the per-tile payloads, plus a
+    small allowance for entropy-coder effects that tiles do not capture.
+    Small images, where sampling saves little, are encoded exactly.
+
+    Args:
+        img: PIL Image.
+        quality: Quality for lossy formats (ignored for PNG).
+        fmt: Output format (see imgsizer.available_formats()).
+        tiles: Minimum number of tiles (or PNG bands) to sample.
+        tile_size: Tile edge in pixels.
+
+    Returns:
+        SizeEstimate; ``mode`` is "exact" if the image was too small to sample
+        or the format is not JPEG or PNG.
+    """
+    area = img.width * img.height
+    if fmt.upper() not in ("JPEG", "JPG", "PNG"):
+        # WebP and AVIF predict across blocks and adapt to content, so tiles
+        # overstate flat graphics several times over; encode exactly
+        return estimate_exact(img, quality, fmt)
+    if fmt.upper() == "PNG":
+        # Deflate matches along rows, so square tiles miss most of the
+        # redundancy in flat graphics; sample full-width bands instead
+        count = min(tiles, int(img.height * _MAX_SAMPLE_FRACTION) // _BAND)
+        boxes = _band_boxes(img.width, img.height, count, _BAND) if count > 1 else []
+    elif img.width >= tile_size * 2 and img.height >= tile_size * 2:
+        count = max(tiles, int(area * _MIN_SAMPLE_FRACTION) // (tile_size * tile_size))
+        boxes = _tile_boxes(img.width, img.height, count, tile_size)
+    else:
+        boxes = []
+    sample_area = sum((r - l) * (b - t) for l, t, r, b in boxes)
+    if not boxes or sample_area > area * _MAX_SAMPLE_FRACTION:
+        return estimate_exact(img, quality, fmt)
+
+    sample_w, sample_h = boxes[0][2] - boxes[0][0], boxes[0][3] - boxes[0][1]
+
+    # Container overhead (signature, headers, tables) from a minimal image;
+    # a flat sample-sized image would also count the cost of flat pixels
+    overhead = len(_encode(Image.new(img.mode, (16, 16)), fmt, quality))
+    payloads = []
+    for box in boxes:
+        sample_bytes = len(_encode(img.crop(box), fmt, quality))
+        payloads.append(max(0, sample_bytes - overhead))
+
+    n = len(payloads)
+    mean = sum(payloads) / n
+    bias = 1.0 if fmt.upper() == "PNG" else _JPEG_TILE_BIAS
+    size = overhead + bias * mean * area / (sample_w * sample_h)
+
+    if mean > 0 and n > 1:
+        variance = sum((p - mean) ** 2 for p in payloads) / (n - 1)
+        error = _Z * math.sqrt(variance / n) / mean
+    else:
+        error = 0.0
+    # Per-tile Huffman tables and filter choices differ from a whole-image
+    # encode; measured bias on the benchmark corpus stays within ~10%
+    error = min(1.0, error + 0.10)
+
+    return SizeEstimate(size=int(size), error=round(error, 3), mode="fast")
+
+
+def estimate(
+    img: Image.Image,
+    quality: int = 85,
+    fmt: str = "JPEG",
+    mode: str = "exact",
+) -> SizeEstimate:
+    """Estimate the encoded size of an image.
+
+    Args:
+        img: PIL Image.
+        quality: Quality for lossy formats (ignored for PNG).
+        fmt: Output format (see imgsizer.available_formats()).
+        mode: "exact" (encode once, keep bytes) or "fast" (tile sampling).
+
+    Returns:
+        SizeEstimate.
+
+    Raises:
+        ValueError: If mode is not recognised.
+    """
+    if mode == "exact":
+        return estimate_exact(img, quality, fmt)
+    if mode == "fast":
+        return estimate_fast(img, quality, fmt)
+    raise ValueError(f"Unknown estimate mode: {mode}")
@@ -0,0 +1,223 @@
+"""
+Image Resizer - Output format selection.
+
+choose_format() encodes an image in each available format and keeps the
+smallest result that fits a byte budget. Formats are tried cheapest first,
+and every later encode is capped at the best size so far (or the budget),
+so formats that clearly lose are never fully encoded:
+
+- JPEG and PNG encoders write output as they go, so an encode that passes
+  the cap is abandoned part-way. This is what keeps optimize=True PNG of a
+  large photo cheap.
+- WebP and AVIF only write output at the end. Large images are first
+  encoded at half resolution; a full-size encode is at least
+  _HALF_SIZE_RATIO times larger, so if that bound already exceeds the cap
+  the format is skipped after a quarter of the work.
+"""
+
+from __future__ import annotations
+
+import io
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from PIL import Image
+
+from .imgsizer import _best_quality, _format_name, _write_image, available_formats
+
+# Cheapest encoders first so they set the cap for the expensive ones
+_ORDER = ("JPEG", "PNG", "WEBP", "AVIF")
+# Encoders that write output incrementally and can be stopped part-way
+_STREAMING = ("JPEG", "PNG")
+# Full-size encodes measured 1.56x-3.4x their half-resolution encode on
+# photos and flat graphics across all formats; keep a margin below that
+_HALF_SIZE_RATIO = 1.4
+# Images smaller than this are encoded directly, without a half-size probe
+_PROBE_MIN_PIXELS = 512 * 512
+
+
+@dataclass
+class FormatCandidate:
+    """One format/quality pair considered by choose_format().
+
+    Attributes:
+        fmt: Output format.
+        quality: Quality tried (0 for PNG).
+        size: Encoded size in bytes, or None if the encode was stopped early
+            or skipped.
+        seconds: Time spent on this candidate, including probes.
+        encodes: Number of encodes (full, partial or probe) performed.
+        status: "chosen", "larger" (did not beat the best or the budget),
+            or "skipped" (ruled out by a half-resolution probe).
+    """
+
+    fmt: str
+    quality: int
+    size: Optional[int] = None
+    seconds: float = 0.0
+    encodes: int = 0
+    status: str = "larger"
+
+
+@dataclass
+class FormatChoice:
+    """Result of choose_format().
+
+    Attributes:
+        fmt: Chosen format.
+        quality: Chosen quality (0 for PNG).
+        size: Encoded size in bytes.
+        data: Encoded image.
+        fits: False if nothing fit the budget even at min_quality; data is
+            then the smallest-quality encode of the first lossy format.
+        candidates: Every candidate tried, in order, with timings.
+    """
+
+    fmt: str
+    quality: int
+    size: int
+    data: bytes = field(repr=False)
+    fits: bool = True
+    candidates: list[FormatCandidate] = field(default_factory=list)
+
+    @property
+    def seconds(self) -> float:
+        return sum(c.seconds for c in self.candidates)
+
+
+class _OverCap(Exception):
+    pass
+
+
+class _CappedBuffer(io.BytesIO):
+    """In-memory output that stops the encoder once it passes cap bytes."""
+
+    def __init__(self, cap: Optional[int]) -> None:
+        super().__init__()
+        self.cap = cap
+
+    def write(self, data) -> int:
+        if self.cap is not None and self.tell() + len(data) > self.cap:
+            raise _OverCap
+        return super().write(data)
+
+
+def _encode_capped(img: Image.Image, fmt: str, quality: int, cap: Optional[int]) -> Optional[bytes]:
+    """Encode img, or return None as soon as the output exceeds cap bytes."""
+    buf = _CappedBuffer(cap)
+    try:
+        _write_image(img, buf, fmt, quality)
+    except _OverCap:
+        return None
+    return buf.getvalue()
+
+
+def _cap(best: Optional[FormatCandidate], target_bytes: Optional[int]) -> Optional[int]:
+    # Ties keep the earlier (cheaper) format, so a new best must be smaller
+    caps = [c for c in (best.size - 1 if best else None, target_bytes) if c is not None]
+    return min(caps) if caps else None
+
+
+def choose_format(
+    img: Image.Image,
+    target_bytes: Optional[int] = None,
+    quality: int = 85,
+    formats: Optional[Iterable[str]] = None,
+    min_quality: int = 15,
+) -> FormatChoice:
+    """Find the format/quality pair with the fewest bytes under target_bytes.
+
+    Every format is first tried at ``quality`` and the smallest encode that
+    fits wins. If none fits, each lossy format searches for its highest
+    fitting quality down to ``min_quality``; the highest quality wins, with
+    ties going to the smaller file. A format that cannot fit at the current
+    best quality is rejected after a single capped encode.
+
+    Args:
+        img: PIL Image (already at the desired dimensions).
+        target_bytes: Maximum file size in bytes, or None for no budget.
+        quality: Quality for lossy formats.
+        formats: Formats to consider (defaults to available_formats()).
+        min_quality: Lowest quality tried when nothing fits at ``quality``.
+
+    Returns:
+        FormatChoice with the encoded bytes and per-candidate timings.
+
+    Raises:
+        ValueError: If a requested format is not available.
+    """
+    wanted = {_format_name(f) for f in (formats or available_formats())}
+    order = [f for f in _ORDER if f in wanted]
+    if not order:
+        raise ValueError("No output formats to choose from")
+
+    candidates: list[FormatCandidate] = []
+    best: Optional[FormatCandidate] = None
+    best_data = b""
+
+    # Every format at the requested quality, capped at the best so far
+    for fmt in order:
+        q = 0 if fmt == "PNG" else quality
+        candidate = FormatCandidate(fmt, q)
+        candidates.append(candidate)
+        start = time.perf_counter()
+        cap = _cap(best, target_bytes)
+        data = None
+        if (fmt not in _STREAMING and cap is not None
+                and img.width * img.height >= _PROBE_MIN_PIXELS):
+            candidate.encodes += 1
+            if _encode_capped(img.reduce(2), fmt, q, int(cap / _HALF_SIZE_RATIO)) is None:
+                candidate.status = "skipped"
+        if candidate.status != "skipped":
+            candidate.encodes += 1
+            data = _encode_capped(img, fmt, q, cap)
+        candidate.seconds = time.perf_counter() - start
+        if data is not None:
+            candidate.size = len(data)
+            best, best_data = candidate, data
+
+    # Nothing fit: trade quality for size, format by format
+    if best is None and target_bytes is not None:
+        for fmt in (f for f in order if f != "PNG"):
+            floor = best.quality if best is not None else min_quality
+            candidate = FormatCandidate(fmt, floor)
+            candidates.append(candidate)
+            start = time.perf_counter()
+            encoded: dict[int, bytes] = {}
+
+            def size_at(q: int, fmt: str = fmt, candidate: FormatCandidate = candidate) -> int:
+                if q not in encoded:
+                    candidate.encodes += 1
+                    encoded[q] = _encode_capped(img, fmt, q, None)
+                return len(encoded[q])
+
+            # One capped encode rejects a format that cannot fit at the
+            # best quality found so far
+            candidate.encodes += 1
+            data = _encode_capped(img, fmt, floor, target_bytes)
+            found = None
+            if data is not None:
+                encoded[floor] = data
+                # Secant steps assume libjpeg's quantizer curve; for WebP and
+                # AVIF they are only a guess inside a safeguarded bisection
+                found = _best_quality(size_at, target_bytes, floor, max(floor, quality - 1))
+            candidate.seconds = time.perf_counter() - start
+            if found is None:
+                continue
+            candidate.quality, candidate.size = found, len(encoded[found])
+            # At equal quality only a smaller file wins
+            if best is None or found > best.quality or candidate.size < best.size:
+                best, best_data = candidate, encoded[found]
+
+    if best is None:
+        lossy = [f for f in order if f != "PNG"] or order
+        fmt = lossy[0]
+        q = 0 if fmt == "PNG" else min_quality
+        start = time.perf_counter()
+        data = _encode_capped(img, fmt, q, None)
+        candidates.append(FormatCandidate(fmt, q, len(data), time.perf_counter() - start, 1, "chosen"))
+        return FormatChoice(fmt, q, len(data), data, fits=False, candidates=candidates)
+
+    best.status = "chosen"
+    return FormatChoice(best.fmt, best.quality, best.size, best_data, candidates=candidates)
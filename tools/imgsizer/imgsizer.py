@@ -7,20 +7,49 @@ from __future__ import annotations
 
 from PIL import Image, ImageOps
 import io
+import math
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 
 
-def load_image(source) -> Image.Image:
-    """Load an image from a file path or file-like object and normalize to RGB.
+# Output formats: name -> (file extension, MIME type). WEBP and AVIF are
+# only offered when the installed Pillow can encode them.
+FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+    "AVIF": (".avif", "image/avif"),
+}
 
-    Args:
-        source: File path (str/Path) or file-like object (BytesIO, etc.)
 
-    Returns:
-        PIL Image in RGB mode.
-    """
-    img = Image.open(source)
+def available_formats() -> list[str]:
+    """Return the output formats this Pillow build can encode."""
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt in Image.SAVE]
+
+
+def _format_name(fmt: str) -> str:
+    name = fmt.upper()
+    name = "JPEG" if name == "JPG" else name
+    if name not in available_formats():
+        raise ValueError(f"Unsupported format: {fmt}")
+    return name
+
+
+def _write_image(img: Image.Image, fp, fmt: str, quality: int) -> None:
+    """Encode img into fp with the settings every export path shares."""
+    fmt = _format_name(fmt)
+    if fmt == "PNG":
+        img.save(fp, format="PNG", optimize=True)
+    elif fmt == "JPEG":
+        img.save(fp, format="JPEG", quality=quality, optimize=True)
+    else:
+        img.save(fp, format=fmt, quality=quality)
+
+
+def _normalize_mode(img: Image.Image) -> Image.Image:
+    """Flatten alpha onto white and convert to RGB, leaving RGB and L alone."""
     if img.mode == "RGBA":
         background = Image.new("RGB", img.size, (255, 255, 255))
         background.paste(img, mask=img.split()[3])
@@ -30,6 +59,85 @@ def load_image(source) -> Image.Image:
     return img
 
 
+def _reduced_open(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """Decode an opened image at the smallest resolution that still covers size.
+
+    JPEGs use DCT-domain scaling via draft() (1/2, 1/4 or 1/8), so the
+    full-resolution pixels are never materialized. Other formats decode
+    fully and are then box-reduced by the largest integer factor that keeps
+    both dimensions at or above size. reduce() does not take palette and
+    bilevel images (GIFs, palette PNGs), so those are normalized first.
+    """
+    width, height = max(1, size[0]), max(1, size[1])
+    if img.format == "JPEG":
+        img.draft(None, (width, height))
+    img.load()
+    factor = min(img.width // width, img.height // height)
+    if factor >= 2:
+        img = _normalize_mode(img).reduce(factor)
+    return img
+
+
+def load_image(source, size: Optional[Tuple[int, int]] = None) -> Image.Image:
+    """Load an image from a file path or file-like object and normalize to RGB.
+
+    Args:
+        source: File path (str/Path) or file-like object (BytesIO, etc.)
+        size: Optional (width, height) the caller will resize to. When given,
+            the image is decoded at the smallest resolution that still
+            covers it rather than at full resolution.
+
+    Returns:
+        PIL Image in RGB mode.
+    """
+    img = Image.open(source)
+    if size is not None:
+        img = _reduced_open(img, size)
+    return _normalize_mode(img)
+
+
+class LazyImage:
+    """An encoded image whose pixels are decoded only on demand.
+
+    Only the header is parsed up front; the encoded bytes are kept so that
+    each decode can target the resolution the caller actually needs.
+
+    Attributes:
+        data: The encoded image bytes.
+        width: Full-resolution width in pixels.
+        height: Full-resolution height in pixels.
+        format: Pillow format name (e.g. "JPEG", "PNG").
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        with Image.open(io.BytesIO(data)) as img:
+            self.width, self.height = img.size
+            self.format = img.format
+
+    @classmethod
+    def open(cls, source) -> "LazyImage":
+        """Read a file path or file-like object into a LazyImage."""
+        if isinstance(source, (str, Path)):
+            return cls(Path(source).read_bytes())
+        return cls(source.read())
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def decode(self, size: Optional[Tuple[int, int]] = None) -> Image.Image:
+        """Decode to an RGB/L image, reduced to just cover size if given.
+
+        Args:
+            size: Optional (width, height) the result must cover.
+
+        Returns:
+            PIL Image in RGB or L mode.
+        """
+        return load_image(io.BytesIO(self.data), size)
+
+
 def resize_image(
     img: Image.Image,
     width: int,
@@ -52,64 +160,317 @@ def resize_image(
     return img.resize((width, height), Image.Resampling.LANCZOS)
 
 
+def build_pyramid(img: Image.Image, min_size: int = 256) -> list[Image.Image]:
+    """Build a proxy pyramid of successively halved copies of an image.
+
+    Args:
+        img: Source PIL Image (becomes level 0).
+        min_size: Stop before the longest side would drop below this.
+
+    Returns:
+        List of images, largest first.
+    """
+    levels = [img]
+    while max(levels[-1].size) // 2 >= min_size:
+        levels.append(levels[-1].reduce(2))
+    return levels
+
+
+def pyramid_level(pyramid: list[Image.Image], width: int, height: int) -> Image.Image:
+    """Pick the smallest pyramid level that is at least width x height.
+
+    Args:
+        pyramid: Levels as returned by build_pyramid().
+        width: Target width in pixels.
+        height: Target height in pixels.
+
+    Returns:
+        The chosen level, or level 0 when upscaling.
+    """
+    for level in reversed(pyramid):
+        if level.width >= width and level.height >= height:
+            return level
+    return pyramid[0]
+
+
 def estimate_size(img: Image.Image, quality: int = 85, fmt: str = "JPEG") -> int:
     """Estimate the file size in bytes for the given image and quality.
 
     Args:
         img: PIL Image.
-        quality: JPEG quality (10-100).
-        fmt: Output format ("JPEG" or "PNG").
+        quality: Quality (10-100) for lossy formats.
+        fmt: Output format (see available_formats()).
 
     Returns:
         Estimated size in bytes.
     """
     buf = io.BytesIO()
-    if fmt.upper() == "PNG":
-        img.save(buf, format="PNG", optimize=True)
-    else:
-        img.save(buf, format="JPEG", quality=quality, optimize=True)
+    _write_image(img, buf, fmt, quality)
     return buf.tell()
 
 
-def auto_adjust(
+# Fraction of target_bytes left unused that the scale search accepts as done
+_SIZE_SLACK = 0.03
+
+
+@dataclass
+class AutoAdjustResult:
+    """Outcome of a quality/scale search.
+
+    Attributes:
+        quality: JPEG quality to export with.
+        scale: Dimension multiplier (1.0 means dimensions unchanged).
+        width: Output width in pixels at ``scale``.
+        height: Output height in pixels at ``scale``.
+        size: Encoded size in bytes at (quality, scale).
+        encodes: Number of JPEG encodes the search performed.
+        fits: False if even the smallest candidate exceeded the target.
+    """
+
+    quality: int
+    scale: float
+    width: int
+    height: int
+    size: int
+    encodes: int
+    fits: bool = True
+
+
+def _jpeg_size(img: Image.Image, quality: int) -> int:
+    """Encode img as an optimized JPEG and return the byte count."""
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.tell()
+
+
+def _quant_log_scale(quality: int) -> float:
+    """Log of the quantization table scale libjpeg derives from quality."""
+    factor = 5000 / quality if quality < 50 else 200 - 2 * quality
+    return math.log(max(factor, 1))
+
+
+def _quality_for_log_scale(x: float) -> int:
+    """Inverse of _quant_log_scale, rounded to the nearest quality."""
+    factor = math.exp(x)
+    return round(5000 / factor) if factor > 100 else round((200 - factor) / 2)
+
+
+def _best_quality(
+    size_at: Callable[[int], int],
+    target_bytes: int,
+    low: int,
+    high: int,
+    first_guess: Optional[int] = None,
+) -> Optional[int]:
+    """Search for the highest quality in [low, high] that fits target_bytes.
+
+    log(size) is close to linear in the log of libjpeg's quantizer scale, so
+    after checking ``high`` each probe is a secant step through the two most
+    recent measurements, kept inside the bracket. The search bisects instead
+    whenever the same bracket edge has moved twice in a row.
+
+    Args:
+        size_at: Returns the encoded size for a quality (may be memoized).
+        target_bytes: Maximum file size in bytes.
+        low: Lowest quality considered.
+        high: Highest quality considered.
+        first_guess: Quality probed after ``high`` (defaults to the midpoint).
+
+    Returns:
+        The best quality, or None if even ``low`` does not fit. Assumes
+        size is monotonic in quality.
+    """
+    if size_at(high) <= target_bytes:
+        return high
+
+    best: Optional[int] = None  # highest quality known to fit
+    fail = high  # lowest quality known not to fit
+    recent = [high]
+    previous: Optional[bool] = None
+    stalled = False
+    quality: Optional[int] = first_guess
+
+    while True:
+        a = best + 1 if best is not None else low
+        b = fail - 1
+        if b < a:
+            return best
+        if quality is None:
+            quality = (a + b) // 2
+        elif a <= quality <= b:
+            # Keep model probes out of the outer quarters of the bracket so
+            # it keeps shrinking even when the model creeps toward one edge
+            quarter = (b - a) // 4
+            quality = min(max(quality, a + quarter), b - quarter)
+        else:
+            # The model points past an edge; probe that edge directly
+            quality = min(max(quality, a), b)
+
+        fits = size_at(quality) <= target_bytes
+        if fits:
+            best = quality
+        else:
+            fail = quality
+            if quality == low:
+                return None
+        recent = [recent[-1], quality]
+        stalled = fits == previous
+        previous = fits
+
+        # Secant step through the last two probes, unless stalled
+        q0, q1 = recent
+        y0, y1 = math.log(size_at(q0)), math.log(size_at(q1))
+        x0, x1 = _quant_log_scale(q0), _quant_log_scale(q1)
+        quality = None
+        if not stalled and y0 != y1:
+            x = x1 + (math.log(target_bytes) - y1) / (y0 - y1) * (x0 - x1)
+            quality = _quality_for_log_scale(x)
+
+
+def search_quality_scale(
     img: Image.Image,
     target_bytes: int,
-) -> Tuple[int, float]:
-    """Find optimal quality and scale to fit under target_bytes.
+    min_quality: int = 15,
+    scaled_quality: int = 30,
+    max_quality: int = 100,
+    min_scale: float = 0.1,
+    scale_tolerance: float = 0.01,
+) -> AutoAdjustResult:
+    """Jointly search JPEG quality and scale for the best fit under target_bytes.
+
+    Quality is binary-searched at full size first. Only if even
+    ``min_quality`` does not fit is the image scaled down: a single
+    downscaled working copy is made at a model-predicted upper bound
+    (bytes grow roughly with pixel area), the largest scale that fits at
+    ``scaled_quality`` is bisected on that copy, and any leftover budget is
+    then spent by raising quality again at the chosen scale. Scaled sizes
+    are measured on candidates resampled from the working copy, which can
+    differ by a few bytes from resampling the original.
 
     Args:
         img: PIL Image (already at desired dimensions).
         target_bytes: Maximum file size in bytes.
+        min_quality: Lowest quality tried before reducing dimensions.
+        scaled_quality: Quality floor used while searching for a scale.
+        max_quality: Highest quality considered.
+        min_scale: Smallest scale considered.
+        scale_tolerance: Stop bisecting scale once the bracket is this narrow.
 
     Returns:
-        (quality, scale) tuple. scale=1.0 means dimensions unchanged.
+        AutoAdjustResult describing the chosen settings and search cost.
     """
-    # First try adjusting quality only
-    for quality in range(100, 10, -5):
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG", quality=quality, optimize=True)
-        if buf.tell() <= target_bytes:
-            return quality, 1.0
-
-    # Need to reduce dimensions too
-    best_quality = 30
-    best_scale = 1.0
-
-    low, high = 0.1, 1.0
-    while high - low > 0.01:
-        scale = (low + high) / 2
-        test_w = int(img.width * scale)
-        test_h = int(img.height * scale)
-        test_img = img.resize((test_w, test_h), Image.Resampling.LANCZOS)
-        buf = io.BytesIO()
-        test_img.save(buf, format="JPEG", quality=best_quality, optimize=True)
-        if buf.tell() <= target_bytes:
+    encodes = 0
+
+    def measure(image: Image.Image, quality: int) -> int:
+        nonlocal encodes
+        encodes += 1
+        return _jpeg_size(image, quality)
+
+    def sizer(image: Image.Image, sizes: dict[int, int]) -> Callable[[int], int]:
+        def size_at(quality: int) -> int:
+            if quality not in sizes:
+                sizes[quality] = measure(image, quality)
+            return sizes[quality]
+        return size_at
+
+    # Quality-only search at full size
+    full_sizes: dict[int, int] = {}
+    quality = _best_quality(sizer(img, full_sizes), target_bytes, min_quality, max_quality, first_guess=75)
+    if quality is not None:
+        return AutoAdjustResult(
+            quality=quality, scale=1.0, width=img.width, height=img.height,
+            size=full_sizes[quality], encodes=encodes,
+        )
+
+    # Predict the fitting scale from full-size probes already made. The
+    # min_quality size underestimates scaled_quality's, so this errs high,
+    # and downscaled images cost more bytes per pixel, which does too.
+    floor_size = full_sizes.get(scaled_quality, full_sizes[min_quality])
+    upper = min(1.0, max(min_scale, (target_bytes / floor_size) ** 0.5))
+
+    def dims(scale: float) -> Tuple[int, int]:
+        return max(1, int(img.width * scale)), max(1, int(img.height * scale))
+
+    work = img.resize(dims(upper), Image.Resampling.LANCZOS) if upper < 1.0 else img
+
+    def render(scale: float) -> Image.Image:
+        # Candidates above the working copy must come from the original
+        if scale == upper:
+            return work
+        source = work if scale < upper else img
+        return source.resize(dims(scale), Image.Resampling.LANCZOS)
+
+    best_scale: Optional[float] = None
+    best_img: Optional[Image.Image] = None
+    best_size = 0
+
+    # Safeguarded secant search: each probe predicts the next scale from
+    # the area model, clamped inside the bracket, falling back to bisection
+    low, high = min_scale, 1.0
+    scale = upper
+    while True:
+        candidate = render(scale)
+        size = measure(candidate, scaled_quality)
+        if size <= target_bytes:
+            best_scale, best_img, best_size = scale, candidate, size
             low = scale
-            best_scale = scale
+            if size >= target_bytes * (1 - _SIZE_SLACK):
+                break
         else:
             high = scale
+        if high - low <= scale_tolerance:
+            break
+        guess = scale * (target_bytes / size) ** 0.5 * (1 - _SIZE_SLACK / 2)
+        margin = scale_tolerance / 2
+        if low + margin < guess < high - margin:
+            scale = guess
+        else:
+            scale = (low + high) / 2
+
+    if best_img is None or best_scale is None:
+        # Nothing fit; report the smallest candidate so callers can decide
+        smallest = render(min_scale)
+        w, h = smallest.size
+        return AutoAdjustResult(
+            quality=scaled_quality, scale=min_scale, width=w, height=h,
+            size=measure(smallest, scaled_quality), encodes=encodes, fits=False,
+        )
 
-    return best_quality, best_scale
+    # Spend any leftover budget on quality at the chosen scale. The scale
+    # search leaves little slack, so gallop upward rather than probing max.
+    scaled_sizes = {scaled_quality: best_size}
+    size_at = sizer(best_img, scaled_sizes)
+    quality, step = scaled_quality, 1
+    while quality < max_quality:
+        trial = min(max_quality, quality + step)
+        if size_at(trial) > target_bytes:
+            quality = _best_quality(size_at, target_bytes, quality, trial) or quality
+            break
+        quality, step = trial, step * 2
+
+    return AutoAdjustResult(
+        quality=quality, scale=best_scale, width=best_img.width, height=best_img.height,
+        size=scaled_sizes[quality], encodes=encodes,
+    )
+
+
+def auto_adjust(
+    img: Image.Image,
+    target_bytes: int,
+) -> Tuple[int, float]:
+    """Find optimal quality and scale to fit under target_bytes.
+
+    See search_quality_scale() for the search strategy and encode statistics.
+
+    Args:
+        img: PIL Image (already at desired dimensions).
+        target_bytes: Maximum file size in bytes.
+
+    Returns:
+        (quality, scale) tuple. scale=1.0 means dimensions unchanged.
+    """
+    result = search_quality_scale(img, target_bytes)
+    return result.quality, result.scale
 
 
 def export_image(
@@ -121,16 +482,15 @@ def export_image(
 
     Args:
         img: PIL Image.
-        fmt: "JPEG" or "PNG".
-        quality: JPEG quality (ignored for PNG).
+        fmt: Output format (see available_formats()).
+        quality: Quality for lossy formats (ignored for PNG).
 
     Returns:
         Image bytes.
+
+    Raises:
+        ValueError: If the format is not available.
     """
     buf = io.BytesIO()
-    if fmt.upper() == "PNG":
-        img.save(buf, format="PNG", optimize=True)
-    else:
-        img.save(buf, format="JPEG", quality=quality, optimize=True)
-    buf.seek(0)
-    return buf.read()
+    _write_image(img, buf, fmt, quality)
+    return buf.getvalue()
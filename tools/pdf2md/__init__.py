@@ -1,6 +1,19 @@
 """PDF2MD - PDF to Markdown conversion utilities."""
 
-from .pdf2md import convert_pdf, format_size
+from .backends import BACKENDS, open_backend
+from .cache import PageCache
+from .pdf2md import ConversionCancelled, convert_pdf, format_size, iter_markdown, parse_pages
+from .lazy import LazyDocument
 
 __version__ = "0.1.0"
-__all__ = ["convert_pdf", "format_size"]
+__all__ = [
+    "BACKENDS",
+    "ConversionCancelled",
+    "LazyDocument",
+    "PageCache",
+    "convert_pdf",
+    "format_size",
+    "iter_markdown",
+    "open_backend",
+    "parse_pages",
+]
@@ -0,0 +1,241 @@
+"""PDF to Markdown converter - Text extraction backends.
+
+Every backend opens one PDF and returns the plain text of a page by index:
+
+- "pdfplumber": pdfminer layout analysis. Slow, but orders words across
+  columns and table cells by position.
+- "pdfium": pypdfium2 (already a pdfplumber dependency). Returns text in
+  content-stream order, typically 50-100x faster than pdfplumber.
+- "auto": pdfium for simple pages, pdfplumber only for pages that
+  looks_complex() flags (tables, multi-column layouts).
+
+    with open_backend("report.pdf", "auto") as backend:
+        for i in range(backend.page_count):
+            text = backend.extract(i)
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Optional
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = None
+
+# A line is split when two text runs on it are separated by more than this
+# fraction of the page width (column gutters, table cells)
+_GAP_FRACTION = 0.03
+# Pages with at least this fraction of split lines are treated as complex
+_SPLIT_LINES = 0.25
+# Pages with at least this many vector paths are assumed to have ruled tables
+_TABLE_PATHS = 8
+
+
+class Backend(ABC):
+    """Base class: an open PDF whose pages can be extracted by index.
+
+    Attributes:
+        name: Backend name as used by open_backend().
+        page_count: Number of pages in the document.
+    """
+
+    name = ""
+
+    def __init__(self, input_path: str) -> None:
+        self.input_path = input_path
+        self.page_count = 0
+
+    @abstractmethod
+    def extract(self, index: int) -> Optional[str]:
+        """Return the text of page ``index``, or None/"" if it has none."""
+
+    @abstractmethod
+    def page_size(self, index: int) -> tuple[float, float]:
+        """Return (width, height) of page ``index`` in points, without extracting it."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "Backend":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PdfplumberBackend(Backend):
+    """Layout-aware extraction with pdfplumber's extract_text()."""
+
+    name = "pdfplumber"
+
+    def __init__(self, input_path: str) -> None:
+        super().__init__(input_path)
+        if pdfplumber is None:
+            raise RuntimeError("pdfplumber is not installed")
+        self._pdf = pdfplumber.open(input_path)
+        self.page_count = len(self._pdf.pages)
+
+    def extract(self, index: int) -> Optional[str]:
+        page = self._pdf.pages[index]
+        text = page.extract_text()
+        # Drop the page's cached layout objects
+        page.close()
+        return text
+
+    def page_size(self, index: int) -> tuple[float, float]:
+        page = self._pdf.pages[index]
+        return float(page.width), float(page.height)
+
+    def close(self) -> None:
+        self._pdf.close()
+
+
+class PdfiumBackend(Backend):
+    """Fast extraction of text in content-stream order with pypdfium2."""
+
+    name = "pdfium"
+
+    def __init__(self, input_path: str) -> None:
+        super().__init__(input_path)
+        if pdfium is None:
+            raise RuntimeError("pypdfium2 is not installed")
+        self._doc = pdfium.PdfDocument(input_path)
+        self.page_count = len(self._doc)
+
+    def extract(self, index: int) -> Optional[str]:
+        page = self._doc[index]
+        try:
+            textpage = page.get_textpage()
+            try:
+                return _normalize(textpage.get_text_range())
+            finally:
+                textpage.close()
+        finally:
+            page.close()
+
+    def page_size(self, index: int) -> tuple[float, float]:
+        return self._doc.get_page_size(index)
+
+    def close(self) -> None:
+        self._doc.close()
+
+
+class AutoBackend(PdfiumBackend):
+    """pdfium for simple pages, pdfplumber for pages that look complex.
+
+    pdfplumber is only opened once the first complex page is found.
+
+    Attributes:
+        fast_pages: Pages extracted with pdfium.
+        slow_pages: Pages sent to pdfplumber.
+    """
+
+    name = "auto"
+
+    def __init__(self, input_path: str) -> None:
+        super().__init__(input_path)
+        self._layout: Optional[PdfplumberBackend] = None
+        self.fast_pages = 0
+        self.slow_pages = 0
+
+    def extract(self, index: int) -> Optional[str]:
+        page = self._doc[index]
+        try:
+            textpage = page.get_textpage()
+            try:
+                if not looks_complex(page, textpage):
+                    self.fast_pages += 1
+                    return _normalize(textpage.get_text_range())
+            finally:
+                textpage.close()
+        finally:
+            page.close()
+
+        self.slow_pages += 1
+        if self._layout is None:
+            self._layout = PdfplumberBackend(self.input_path)
+        return self._layout.extract(index)
+
+    def close(self) -> None:
+        if self._layout is not None:
+            self._layout.close()
+        super().close()
+
+
+BACKENDS = {
+    "pdfplumber": PdfplumberBackend,
+    "pdfium": PdfiumBackend,
+    "auto": AutoBackend,
+}
+
+
+def open_backend(input_path: str, name: str = "pdfplumber") -> Backend:
+    """Open input_path with the named backend.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+        RuntimeError: If the backend's library is not installed.
+    """
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend: {name}") from None
+    return cls(input_path)
+
+
+def _normalize(text: str) -> str:
+    """Match pdfplumber's line endings and trim trailing whitespace."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def looks_complex(page, textpage) -> bool:
+    """Guess whether a pdfium page needs layout analysis.
+
+    A page is complex if it has enough vector paths to suggest ruled
+    tables, or if a quarter of its text lines are split by a wide
+    horizontal gap (side-by-side columns or unruled tables).
+
+    Args:
+        page: pypdfium2 PdfPage.
+        textpage: The page's PdfTextPage.
+    """
+    paths = sum(1 for _ in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_PATH], max_depth=1))
+    if paths >= _TABLE_PATHS:
+        return True
+
+    # Text runs as (left, bottom, right, top), top to bottom. Runs on the
+    # same line have near-equal tops, so each run only needs comparing with
+    # the line being built
+    runs = sorted(
+        (textpage.get_rect(i) for i in range(textpage.count_rects())),
+        key=lambda r: (-r[3], r[0]),
+    )
+    if not runs:
+        return False
+    gap = page.get_width() * _GAP_FRACTION
+    lines: list[list[tuple]] = []
+    for run in runs:
+        if lines:
+            first = lines[-1][0]
+            # Overlapping by more than half the shorter height
+            overlap = min(first[3], run[3]) - max(first[1], run[1])
+            if overlap > 0.5 * min(first[3] - first[1], run[3] - run[1]):
+                lines[-1].append(run)
+                continue
+        lines.append([run])
+
+    split = 0
+    for line in lines:
+        line.sort(key=lambda r: r[0])
+        if any(b[0] - a[2] > gap for a, b in zip(line, line[1:])):
+            split += 1
+    return split >= _SPLIT_LINES * len(lines)
@@ -0,0 +1,225 @@
+"""PDF to Markdown converter - Persistent page cache for revised documents.
+
+Pages are keyed by a fingerprint of what determines their text: the page's
+content streams, its resources (fonts, XObjects, ... resolved recursively)
+and its boxes and rotation, plus the extraction backend. A revision of a
+document that changes two pages therefore misses on just those two:
+
+    cache = PageCache()
+    markdown = convert_pdf("contract_v7.pdf", cache=cache)
+
+Entries are one file per page. When the cache grows past max_bytes, the
+least recently used entries are removed. Several processes may share a
+cache directory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Iterable, Optional
+
+try:
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import PDFObjRef, PDFStream
+    from pdfminer.psparser import PSLiteral
+except ImportError:
+    PDFDocument = None
+
+# Bump when extraction output changes for the same input, to orphan old entries
+_VERSION = b"pdf2md-page-1"
+_SUFFIX = ".txt"
+# Eviction trims to this fraction of max_bytes so it does not run on every put
+_LOW_WATER = 0.9
+
+
+def default_cache_dir() -> str:
+    """Return the per-user cache directory ($XDG_CACHE_HOME or ~/.cache)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "akatz-utils", "pdf2md")
+
+
+def _digest(obj, h, memo: dict, active: set) -> None:
+    """Feed a PDF object into hash h, resolving references.
+
+    Referenced objects are hashed once per document (memo), so resources
+    shared by many pages, such as embedded fonts, cost nothing after the
+    first page. /Parent links are skipped to stay out of the page tree.
+    """
+    if isinstance(obj, PDFObjRef):
+        objid = obj.objid
+        if objid in memo:
+            h.update(memo[objid])
+        elif objid in active:
+            h.update(b"cycle")
+        else:
+            active.add(objid)
+            sub = hashlib.sha256()
+            _digest(obj.resolve(), sub, memo, active)
+            active.discard(objid)
+            memo[objid] = sub.digest()
+            h.update(memo[objid])
+    elif isinstance(obj, PDFStream):
+        h.update(b"stream")
+        _digest(obj.attrs, h, memo, active)
+        data = obj.get_rawdata()
+        h.update(data if data is not None else obj.get_data())
+    elif isinstance(obj, dict):
+        h.update(b"dict%d" % len(obj))
+        for key in sorted(obj, key=str):
+            if key == "Parent":
+                continue
+            h.update(str(key).encode("utf-8", "replace"))
+            _digest(obj[key], h, memo, active)
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"list%d" % len(obj))
+        for item in obj:
+            _digest(item, h, memo, active)
+    elif isinstance(obj, PSLiteral):
+        h.update(b"/" + str(obj.name).encode("utf-8", "replace"))
+    elif isinstance(obj, bytes):
+        h.update(b"bytes%d" % len(obj) + obj)
+    else:
+        h.update(repr(obj).encode("utf-8", "replace"))
+
+
+def page_fingerprints(input_path: str, indices: Iterable[int], backend: str) -> dict[int, str]:
+    """Return {page_index: fingerprint} for the given 0-based pages.
+
+    Only raw (still compressed) stream bytes are hashed; nothing is
+    decoded or laid out.
+
+    Raises:
+        RuntimeError: If pdfminer (a pdfplumber dependency) is not installed.
+    """
+    if PDFDocument is None:
+        raise RuntimeError("pdfminer.six is not installed")
+    wanted = set(indices)
+    out: dict[int, str] = {}
+    memo: dict = {}
+    with open(input_path, "rb") as f:
+        doc = PDFDocument(PDFParser(f))
+        for index, page in enumerate(PDFPage.create_pages(doc)):
+            if index in wanted:
+                h = hashlib.sha256(_VERSION + b"\0" + backend.encode() + b"\0")
+                for key in ("MediaBox", "CropBox", "Rotate", "Resources", "Contents"):
+                    h.update(key.encode())
+                    _digest(page.attrs.get(key), h, memo, set())
+                out[index] = h.hexdigest()
+                if len(out) == len(wanted):
+                    break
+    return out
+
+
+class PageCache:
+    """On-disk cache of extracted page text, bounded by total size.
+
+    Args:
+        directory: Cache directory (defaults to default_cache_dir()).
+        max_bytes: Size budget; least recently used entries are removed
+            once it is exceeded.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(("hits", "misses", "evictions"), 0)
+        os.makedirs(self.directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def _entries(self) -> list[tuple[str, int, float]]:
+        """Return (path, size, mtime) for every entry on disk."""
+        out = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(_SUFFIX):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue  # removed by another process
+                    out.append((entry.path, st.st_size, st.st_mtime))
+        return out
+
+    def __contains__(self, key: str) -> bool:
+        """Check for a fingerprint without reading it, marking it recently used.
+
+        An absent fingerprint counts as a miss; a hit is counted by get().
+        """
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            with self._lock:
+                self._counters["misses"] += 1
+            return False
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached text for a fingerprint, or None, and mark it recently used."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        with self._lock:
+            self._counters["hits"] += 1
+        return text
+
+    def put(self, key: str, text: Optional[str]) -> None:
+        """Store the text of a page ("" or None for a page without text)."""
+        data = (text or "").encode("utf-8")
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Rescan rather than trust the running total, which drifts when
+        # entries are replaced or other processes share the directory
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * _LOW_WATER
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self._counters["evictions"] += 1
+        self._bytes = total
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for path, _, _ in self._entries():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"directory": self.directory, "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, **self._counters}
@@ -0,0 +1,156 @@
+"""PDF to Markdown converter - On-demand page conversion.
+
+LazyDocument keeps a PDF open and converts single pages the first time
+they are requested, caching the markdown:
+
+    with LazyDocument("report.pdf") as doc:
+        print(doc.page_count)
+        chapter = "".join(doc.page(n) for n in range(120, 141))
+
+The page index (sizes in points, and markdown size once converted) is
+available without converting anything. prefetch() converts pages in a
+background thread so neighbours of the page being read are ready when
+asked for.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from .backends import Backend, open_backend
+from .pdf2md import _page_markdown
+
+
+class LazyDocument:
+    """A PDF whose pages are converted to markdown on first request.
+
+    Safe to use from several threads. A page requested while it is being
+    prefetched waits for that conversion instead of starting another.
+
+    Args:
+        input_path: Path to the PDF file.
+        backend: Extraction backend name (see pdf2md.backends).
+
+    Raises:
+        FileNotFoundError: If input_path does not exist.
+        ValueError: If the backend name is unknown.
+    """
+
+    def __init__(self, input_path: str, backend: str = "auto") -> None:
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"PDF file not found: {input_path}")
+        self.input_path = input_path
+        self._backend: Optional[Backend] = open_backend(input_path, backend)
+        self.page_count = self._backend.page_count
+        self._pages: dict[int, str] = {}
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()  # guards _pages and _pending
+        # Backends are not thread-safe, so extraction is serialized
+        self._extract_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf2md-prefetch")
+        self._sizes: Optional[list[tuple[float, float]]] = None
+        self._closed = False
+
+    def _index(self, number: int) -> int:
+        if not 1 <= number <= self.page_count:
+            raise ValueError(f"Page {number} out of range (document has {self.page_count} pages)")
+        return number - 1
+
+    def _fail(self, index: int, future: Future, error: BaseException) -> None:
+        with self._lock:
+            self._pending.pop(index, None)
+        future.set_exception(error)
+
+    def _convert(self, index: int, future: Future) -> None:
+        try:
+            with self._extract_lock:
+                if self._backend is None:
+                    raise RuntimeError("Document is closed")
+                markdown = _page_markdown(index, self._backend.extract(index))
+        except BaseException as e:
+            self._fail(index, future, e)
+            return
+        with self._lock:
+            self._pages[index] = markdown
+            self._pending.pop(index, None)
+        future.set_result(markdown)
+
+    def page(self, number: int) -> str:
+        """Return the markdown of a page (1-based), converting it if needed.
+
+        Pages without text return "".
+
+        Raises:
+            ValueError: If the page number is out of range.
+        """
+        index = self._index(number)
+        with self._lock:
+            if index in self._pages:
+                return self._pages[index]
+            future = self._pending.get(index)
+            owner = future is None
+            if owner:
+                future = self._pending[index] = Future()
+        if owner:
+            self._convert(index, future)
+        return future.result()
+
+    def prefetch(self, numbers: Iterable[int]) -> None:
+        """Convert pages (1-based) in the background. Out-of-range numbers are ignored."""
+        with self._lock:
+            if self._closed:
+                return
+            for number in numbers:
+                index = number - 1
+                if 0 <= index < self.page_count and index not in self._pages and index not in self._pending:
+                    future = self._pending[index] = Future()
+                    job = self._prefetcher.submit(self._convert, index, future)
+                    # Prefetches cancelled by close() never run _convert
+                    job.add_done_callback(
+                        lambda job, index=index, future=future: job.cancelled()
+                        and self._fail(index, future, RuntimeError("Document is closed"))
+                    )
+
+    def is_converted(self, number: int) -> bool:
+        with self._lock:
+            return self._index(number) in self._pages
+
+    def index(self) -> list[dict]:
+        """Describe every page without converting any.
+
+        Returns:
+            One dict per page with "page" (1-based), "width" and "height" in
+            points, and "bytes": the UTF-8 size of its markdown, or None if
+            not converted yet.
+        """
+        with self._extract_lock:
+            if self._sizes is None:
+                if self._backend is None:
+                    raise RuntimeError("Document is closed")
+                self._sizes = [self._backend.page_size(i) for i in range(self.page_count)]
+            sizes = self._sizes
+        with self._lock:
+            converted = {i: len(md.encode("utf-8")) for i, md in self._pages.items()}
+        return [
+            {"page": i + 1, "width": round(w, 2), "height": round(h, 2), "bytes": converted.get(i)}
+            for i, (w, h) in enumerate(sizes)
+        ]
+
+    def close(self) -> None:
+        """Cancel pending prefetches and close the PDF."""
+        with self._lock:
+            self._closed = True
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        with self._extract_lock:
+            if self._backend is not None:
+                self._backend.close()
+                self._backend = None
+
+    def __enter__(self) -> "LazyDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -2,13 +2,29 @@
 
 from __future__ import annotations
 
+import multiprocessing
 import os
-from typing import Callable, Optional
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional, Union
 
-try:
-    import pdfplumber
-except ImportError:
-    pdfplumber = None
+from .backends import open_backend
+from .cache import PageCache, page_fingerprints
+
+# Pages per worker task: small enough to balance load and report progress
+# often, large enough that reopening the PDF in each task stays cheap
+_CHUNK_PAGES = 8
+# Seconds between cancel checks while waiting on worker processes
+_CANCEL_POLL = 0.2
+
+
+class ConversionCancelled(Exception):
+    """The conversion was stopped through its cancel event."""
+
+
+def _check_cancelled(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise ConversionCancelled("Conversion cancelled")
 
 
 def format_size(size_bytes: float) -> str:
@@ -20,43 +36,234 @@ def format_size(size_bytes: float) -> str:
     return f"{size_bytes:.2f} TB"
 
 
-def convert_pdf(
+def _page_markdown(index: int, text: Optional[str]) -> str:
+    return f"# Page {index + 1}\n\n{text}\n\n" if text else ""
+
+
+def parse_pages(pages: Union[str, Iterable[int], None], page_count: int) -> list[int]:
+    """Turn a page selection into sorted, 0-based page indices.
+
+    Args:
+        pages: 1-based page numbers, either as a spec such as "1-3,7,10-"
+            (open-ended ranges run to the last page) or an iterable of ints.
+            None selects every page.
+        page_count: Number of pages in the document.
+
+    Returns:
+        Distinct page indices in ascending order.
+
+    Raises:
+        ValueError: If the spec is malformed or a page is out of range.
+    """
+    if pages is None:
+        return list(range(page_count))
+    if isinstance(pages, str):
+        numbers: set[int] = set()
+        for part in filter(None, (p.strip() for p in pages.split(","))):
+            first, sep, last = part.partition("-")
+            try:
+                start = int(first) if first.strip() else 1
+                stop = (int(last) if last.strip() else page_count) if sep else start
+            except ValueError:
+                raise ValueError(f"Invalid page range: {part!r}") from None
+            if start > stop:
+                raise ValueError(f"Invalid page range: {part!r}")
+            numbers.update(range(start, stop + 1))
+    else:
+        numbers = set(pages)
+    bad = [n for n in numbers if not 1 <= n <= page_count]
+    if bad:
+        raise ValueError(f"Page {min(bad)} out of range (document has {page_count} pages)")
+    return [n - 1 for n in sorted(numbers)]
+
+
+def _extract_pages(input_path: str, backend: str, indices: list[int]) -> list[Optional[str]]:
+    """Return the text of the given pages. Runs inside a worker process."""
+    with open_backend(input_path, backend) as pdf:
+        return [pdf.extract(i) for i in indices]
+
+
+def _iter_parallel(
+    input_path: str,
+    indices: list[int],
+    workers: int,
+    backend: str,
+    on_progress: Callable[[int], None],
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[Optional[str]]:
+    """Yield the text of the given pages in order; on_progress(done) after each chunk.
+
+    Raises:
+        ConversionCancelled: If cancel is set while waiting on the workers.
+            Queued chunks are dropped; running ones finish in the background.
+    """
+    total_pages = len(indices)
+    chunk = max(1, min(_CHUNK_PAGES, total_pages // (workers * 4)))
+    starts = range(0, total_pages, chunk)
+    # Spawned rather than forked, since callers such as the Flask hub are
+    # multi-threaded
+    ctx = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+    try:
+        futures = {
+            pool.submit(_extract_pages, input_path, backend, indices[start:start + chunk]): n
+            for n, start in enumerate(starts)
+        }
+        # Chunks finishing out of order wait here until the gap is filled
+        pending: dict[int, list[Optional[str]]] = {}
+        next_chunk = done = 0
+        running = set(futures)
+        while running:
+            finished, running = wait(running, timeout=_CANCEL_POLL, return_when=FIRST_COMPLETED)
+            _check_cancelled(cancel)
+            for future in finished:
+                pages = future.result()
+                pending[futures[future]] = pages
+                done += len(pages)
+                on_progress(done)
+            while next_chunk in pending:
+                yield from pending.pop(next_chunk)
+                next_chunk += 1
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_markdown(
     input_path: str,
     progress_callback: Optional[Callable[[int, int, str], None]] = None,
-) -> str:
-    """Convert a PDF file to markdown text.
+    workers: Optional[int] = 1,
+    backend: str = "pdfplumber",
+    pages: Union[str, Iterable[int], None] = None,
+    cache: Optional[PageCache] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[str]:
+    """Yield a PDF's markdown one page at a time, in page order.
+
+    Each page's parsed objects are released once its text is extracted, so
+    memory stays flat however long the document is. Pages without text
+    yield "".
 
     Args:
         input_path: Path to the input PDF file.
         progress_callback: Optional callback(current_page, total_pages, status_msg).
+            In parallel mode current_page counts completed pages.
+        workers: Number of worker processes (None = CPU count). 1 extracts
+            in this process.
+        backend: Extraction backend: "pdfplumber" (layout-aware), "pdfium"
+            (fast, stream order) or "auto" (pdfium for simple pages only).
+        pages: Optional 1-based page selection, e.g. "1-3,7" or [2, 5]
+            (see parse_pages()). Progress totals count selected pages.
+        cache: Optional PageCache. Unchanged pages are reused and only
+            changed ones extracted; progress messages report how many
+            pages were cached and extracted.
+        cancel: Optional event; once set, extraction stops before the next
+            page (or chunk, in parallel mode) and the PDF is closed.
 
-    Returns:
-        The markdown content as a string.
+    Yields:
+        Markdown for each page.
 
     Raises:
-        RuntimeError: If pdfplumber is not installed.
+        RuntimeError: If the backend's library is not installed.
+        ValueError: If the backend name or page selection is invalid.
         FileNotFoundError: If input_path does not exist.
+        ConversionCancelled: If cancel was set.
     """
-    if pdfplumber is None:
-        raise RuntimeError("pdfplumber is not installed")
-
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"PDF file not found: {input_path}")
+    _check_cancelled(cancel)
+
+    workers = workers or os.cpu_count() or 1
+
+    with open_backend(input_path, backend) as pdf:
+        indices = parse_pages(pages, pdf.page_count)
+        total_pages = len(indices)
 
-    all_text: list[str] = []
+        keys: dict[int, str] = {}
+        cached: set[int] = set()
+        if cache is not None:
+            keys = page_fingerprints(input_path, indices, backend)
+            # Only presence is checked here; cached text is read as its page
+            # is yielded, so memory stays flat however many pages hit
+            cached = {i for i in indices if keys[i] in cache}
+        missing = [i for i in indices if i not in cached]
+        hits = len(cached)
+        if hits and progress_callback:
+            progress_callback(0, total_pages, f"Reusing {hits} unchanged pages, "
+                              f"extracting {len(missing)}")
 
-    with pdfplumber.open(input_path) as pdf:
-        total_pages = len(pdf.pages)
+        # Short documents are not worth the pool start-up
+        parallel = workers > 1 and len(missing) >= 2 * _CHUNK_PAGES
+        if parallel:
+            def on_progress(done: int) -> None:
+                if progress_callback:
+                    progress_callback(hits + done, total_pages, f"Extracted {done}/{len(missing)} pages"
+                                      + (f" ({hits} cached)" if hits else ""))
 
-        for i, page in enumerate(pdf.pages):
-            if progress_callback:
-                progress_callback(i, total_pages, f"Extracting page {i + 1}/{total_pages}")
+            extracted = _iter_parallel(input_path, missing, workers, backend, on_progress, cancel)
+        else:
+            extracted = (pdf.extract(i) for i in missing)
 
-            text = page.extract_text()
-            if text:
-                all_text.append(f"# Page {i + 1}\n\n{text}\n\n")
+        for n, i in enumerate(indices):
+            _check_cancelled(cancel)
+            if i in cached:
+                text = cache.get(keys[i])
+                if text is None:
+                    # Evicted since the presence check
+                    text = pdf.extract(i)
+                    cache.put(keys[i], text)
+            else:
+                if progress_callback and not parallel:
+                    where = f"{n + 1}/{total_pages}" if pages is None else f"{i + 1} ({n + 1}/{total_pages})"
+                    progress_callback(n, total_pages, f"Extracting page {where}")
+                text = next(extracted)
+                if cache is not None:
+                    cache.put(keys[i], text)
+            yield _page_markdown(i, text)
 
     if progress_callback:
-        progress_callback(total_pages, total_pages, "Conversion complete")
+        summary = f" ({hits} cached, {len(missing)} extracted)" if cache is not None else ""
+        progress_callback(total_pages, total_pages, f"Conversion complete{summary}")
 
-    return "".join(all_text)
+
+def convert_pdf(
+    input_path: str,
+    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+    workers: Optional[int] = 1,
+    backend: str = "pdfplumber",
+    pages: Union[str, Iterable[int], None] = None,
+    cache: Optional[PageCache] = None,
+    cancel: Optional[threading.Event] = None,
+) -> str:
+    """Convert a PDF file to markdown text.
+
+    With more than one worker, the page range is split into chunks that are
+    extracted across a process pool, each worker opening the PDF itself.
+    Pages are reassembled in order, so the output is the same either way.
+    Use iter_markdown() to avoid holding the whole result in memory.
+
+    Args:
+        input_path: Path to the input PDF file.
+        progress_callback: Optional callback(current_page, total_pages, status_msg).
+            In parallel mode current_page counts completed pages.
+        workers: Number of worker processes (None = CPU count). 1 extracts
+            in this process.
+        backend: Extraction backend: "pdfplumber" (layout-aware), "pdfium"
+            (fast, stream order) or "auto" (pdfium for simple pages only).
+        pages: Optional 1-based page selection, e.g. "1-3,7" or [2, 5]
+            (see parse_pages()). Progress totals count selected pages.
+        cache: Optional PageCache. Unchanged pages are reused and only
+            changed ones extracted; progress messages report how many
+            pages were cached and extracted.
+        cancel: Optional event; once set, conversion stops at the next page
+            (see iter_markdown()).
+
+    Returns:
+        The markdown content as a string.
+
+    Raises:
+        RuntimeError: If the backend's library is not installed.
+        ValueError: If the backend name or page selection is invalid.
+        FileNotFoundError: If input_path does not exist.
+        ConversionCancelled: If cancel was set.
+    """
+    return "".join(iter_markdown(input_path, progress_callback, workers, backend, pages, cache, cancel))
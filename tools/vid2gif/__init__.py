@@ -1,6 +1,15 @@
 """Vid2GIF - Video to GIF conversion utilities."""
 
-from .vid2gif import convert_video
+from .encoder import DeltaGifWriter, PaletteMapper, build_palette
+from .ffmpeg_engine import FfmpegEngine
+from .pipeline import GifWriter, write_gif
+from .planning import LADDER, GifPlan, GifSettings
+from .source import ConversionCancelled, FfmpegError, VideoSource
+from .vid2gif import ENGINES, GifSession, convert_video, plan_gif
 
 __version__ = "0.1.0"
-__all__ = ["convert_video"]
+__all__ = [
+    "convert_video", "plan_gif", "write_gif", "build_palette", "GifSession",
+    "GifPlan", "GifSettings", "GifWriter", "DeltaGifWriter", "PaletteMapper",
+    "FfmpegEngine", "FfmpegError", "ConversionCancelled", "VideoSource", "ENGINES", "LADDER",
+]
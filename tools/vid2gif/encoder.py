@@ -0,0 +1,216 @@
+"""Video to GIF converter - Global-palette GIF encoder (NumPy).
+
+One palette is computed for the whole clip from a color histogram of a few
+frames, and frames are mapped to it with a lookup table:
+
+    palette = build_palette(sample_frames, colors=256)
+    mapper = PaletteMapper(palette)
+    writer = DeltaGifWriter(fp, (width, height), palette)
+    for frame in frames:
+        writer.add(mapper.map(frame), duration=100)
+    writer.close()
+
+After the first frame, only the rectangle that changed is written, and
+pixels inside it that did not change are transparent, which LZW compresses
+to almost nothing. Static regions of screen recordings therefore cost no
+bytes after the first frame.
+"""
+
+from __future__ import annotations
+
+from typing import BinaryIO, Iterable, Optional
+
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+# Histogram / lookup table resolution per channel
+_BITS = 5
+_LEVELS = 1 << _BITS
+# Pixels sampled per frame when building the histogram
+_SAMPLE_PIXELS = 65536
+# Lookup table rows compared against the palette at once
+_LUT_CHUNK = 4096
+
+
+def _bin_index(pixels: np.ndarray) -> np.ndarray:
+    """Map (..., 3) uint8 RGB to histogram bins."""
+    shift = 8 - _BITS
+    p = pixels.astype(np.uint16) >> shift
+    return (p[..., 0] << (2 * _BITS)) | (p[..., 1] << _BITS) | p[..., 2]
+
+
+def _bin_colors() -> np.ndarray:
+    """RGB center of every bin, shape (_LEVELS ** 3, 3)."""
+    levels = (np.arange(_LEVELS, dtype=np.float32) + 0.5) * (256 / _LEVELS)
+    r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+    return np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+
+def _histogram(frames: Iterable[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Return pixel counts and RGB sums per color bin over a few RGB frames."""
+    counts = np.zeros(_LEVELS ** 3, dtype=np.int64)
+    sums = np.zeros((_LEVELS ** 3, 3), dtype=np.float64)
+    for frame in frames:
+        pixels = frame.reshape(-1, 3)
+        pixels = pixels[::max(1, len(pixels) // _SAMPLE_PIXELS)]
+        bins = _bin_index(pixels)
+        counts += np.bincount(bins, minlength=counts.size)
+        for channel in range(3):
+            sums[:, channel] += np.bincount(bins, weights=pixels[:, channel], minlength=counts.size)
+    return counts, sums
+
+
+def build_palette(frames: Iterable[np.ndarray], colors: int = 256) -> np.ndarray:
+    """Compute one palette for a set of RGB frames by median cut.
+
+    The histogram's occupied bins are split repeatedly, always cutting
+    the box with the largest weighted extent along its widest channel at
+    the weighted median. One palette slot is left free for transparency.
+
+    Args:
+        frames: RGB frames (HxWx3 uint8 arrays), e.g. evenly spaced samples.
+        colors: Palette size including the transparent slot (2-256).
+
+    Returns:
+        (n, 3) uint8 array with n <= colors - 1.
+
+    Raises:
+        ValueError: If colors is out of range or there are no frames.
+    """
+    if not 2 <= colors <= 256:
+        raise ValueError(f"colors must be between 2 and 256, got {colors}")
+    counts, sums = _histogram(frames)
+    occupied = np.flatnonzero(counts)
+    if occupied.size == 0:
+        raise ValueError("No frames to build a palette from")
+    weights = counts[occupied].astype(np.float64)
+    # Mean color of each bin, so flat colors (UI, text) are reproduced exactly
+    points = sums[occupied] / weights[:, None]
+
+    def split_key(box: np.ndarray) -> tuple[float, int]:
+        # (weighted extent along the widest channel, that channel)
+        if box.size < 2:
+            return 0.0, 0
+        extent = np.ptp(points[box], axis=0)
+        axis = int(extent.argmax())
+        return float(extent[axis] * weights[box].sum()), axis
+
+    boxes = [np.arange(occupied.size)]
+    keys = [split_key(boxes[0])]
+    while len(boxes) < colors - 1:
+        best = max(range(len(boxes)), key=lambda i: keys[i][0])
+        if keys[best][0] <= 0:
+            break  # every box is a single color
+        box, (_, axis) = boxes.pop(best), keys.pop(best)
+        box = box[np.argsort(points[box, axis], kind="stable")]
+        cumulative = np.cumsum(weights[box])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2)) + 1
+        cut = min(max(cut, 1), box.size - 1)
+        for half in (box[:cut], box[cut:]):
+            boxes.append(half)
+            keys.append(split_key(half))
+
+    palette = np.array([np.average(points[box], axis=0, weights=weights[box]) for box in boxes])
+    return np.clip(np.rint(palette), 0, 255).astype(np.uint8)
+
+
+class PaletteMapper:
+    """Map RGB frames to the nearest palette entry through a lookup table.
+
+    The table holds the nearest entry for every histogram bin, so mapping
+    a frame is two array indexing operations.
+    """
+
+    def __init__(self, palette: np.ndarray) -> None:
+        self.palette = np.asarray(palette, dtype=np.uint8)
+        centers = _bin_colors()
+        entries = self.palette.astype(np.float32)
+        lut = np.empty(len(centers), dtype=np.uint8)
+        for start in range(0, len(centers), _LUT_CHUNK):
+            chunk = centers[start:start + _LUT_CHUNK]
+            distance = ((chunk[:, None, :] - entries[None, :, :]) ** 2).sum(axis=2)
+            lut[start:start + _LUT_CHUNK] = distance.argmin(axis=1)
+        self._lut = lut
+
+    def map(self, frame: np.ndarray) -> np.ndarray:
+        """Return the HxW uint8 palette indices of an RGB frame."""
+        return self._lut[_bin_index(frame)]
+
+
+def _table_bits(entries: int) -> int:
+    # GIF color tables hold 2 ** (n + 1) entries
+    bits = 1
+    while (1 << bits) < entries:
+        bits += 1
+    return bits
+
+
+class DeltaGifWriter:
+    """Write a global-palette GIF from palette-index frames.
+
+    Args:
+        fp: Binary file object to write to.
+        size: Canvas (width, height).
+        palette: (n, 3) uint8 colors, n <= 255; index n is transparent.
+        loop: Loop count (0 = forever).
+    """
+
+    def __init__(self, fp: BinaryIO, size: tuple[int, int], palette: np.ndarray, loop: int = 0) -> None:
+        if len(palette) > 255:
+            raise ValueError("Palette must leave one slot for transparency")
+        self._fp = fp
+        self.size = size
+        self.transparent = len(palette)
+        bits = _table_bits(len(palette) + 1)
+        table = np.zeros((1 << bits, 3), dtype=np.uint8)
+        table[:len(palette)] = palette
+        width, height = size
+        fp.write(b"GIF89a" + width.to_bytes(2, "little") + height.to_bytes(2, "little")
+                 + bytes([0x80 | (bits - 1), 0, 0]) + table.tobytes())
+        fp.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + loop.to_bytes(2, "little") + b"\x00")
+        self._canvas: Optional[np.ndarray] = None
+        self._pending: Optional[tuple[np.ndarray, tuple[int, int], int]] = None
+        self.frames = 0
+
+    def add(self, indices: np.ndarray, duration: int) -> None:
+        """Queue an HxW uint8 index frame shown for duration milliseconds."""
+        if self._canvas is None:
+            self._canvas = indices.copy()
+            self._pending = (indices, (0, 0), duration)
+            return
+        changed = indices != self._canvas
+        rows = np.flatnonzero(changed.any(axis=1))
+        if rows.size == 0:
+            tile, offset, held = self._pending
+            self._pending = (tile, offset, held + duration)
+            return
+        cols = np.flatnonzero(changed.any(axis=0))
+        top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        tile = indices[top:bottom, left:right].copy()
+        tile[~changed[top:bottom, left:right]] = self.transparent
+        self._canvas[changed] = indices[changed]
+        self._flush()
+        self._pending = (tile, (int(left), int(top)), duration)
+
+    def _flush(self) -> None:
+        if self._pending is None:
+            return
+        tile, offset, duration = self._pending
+        self._pending = None
+        # Disposal 1 keeps the previous frame under transparent pixels
+        for chunk in GifImagePlugin.getdata(Image.fromarray(tile), offset, duration=duration,
+                                            transparency=self.transparent, disposal=1):
+            self._fp.write(chunk)
+        self.frames += 1
+
+    def close(self) -> None:
+        """Write the last frame and the trailer.
+
+        Raises:
+            ValueError: If no frame was added.
+        """
+        if self._pending is None and self.frames == 0:
+            raise ValueError("No frames to encode")
+        self._flush()
+        self._fp.write(b";")
+        self._canvas = None
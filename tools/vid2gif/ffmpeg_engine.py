@@ -0,0 +1,168 @@
+"""Video to GIF converter - ffmpeg engine.
+
+Runs the whole conversion inside the ffmpeg binary that moviepy already
+ships with (imageio-ffmpeg), without decoding frames into Python:
+
+    -ss <start> -t <duration> -i input
+    fps -> [scale + crop for aspect_mode] -> scale
+        -> split -> (subsample) palettegen (pass 1) -> paletteuse (pass 2) -> GIF
+
+The input window and scaling are those of VideoSource (source.py). Sizing
+uses the same ladder and sampled-segment prediction as the moviepy engine
+(planning.py). The sampled segments are decoded and scaled once into a
+small raw video (VideoSource.samples), and each probe is one ffmpeg encode
+of that file.
+Progress of the full encode is parsed from ffmpeg's -progress stats.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import threading
+import time
+from typing import Callable, Optional
+
+from .planning import (
+    _MAX_PROBES, _SAMPLE_FPS, LADDER, GifPlan, GifSettings,
+    _extrapolate, _frame_count, _gif_frame_sizes, _sample_spans, _scaled_size, _search_ladder,
+)
+from .source import ConversionCancelled, FfmpegError, VideoSource, _check_cancelled, _run
+
+# Ordered dithering compresses far better than error diffusion in GIF's LZW
+_PALETTEUSE = "paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle"
+# palettegen hashes every pixel, so it sees every third frame at half size;
+# the palette is the same for practical purposes at a third of the cost
+_PALETTE_SOURCE = "select='not(mod(n\\,3))',scale=iw/2:-1"
+# Progress is reported in steps of at least this fraction
+_PROGRESS_STEP = 0.05
+
+
+class FfmpegEngine:
+    """Convert with ffmpeg's palettegen/paletteuse filters.
+
+    Args:
+        input_path: Path to the input video file.
+        duration: Maximum GIF duration in seconds.
+        width: Output width (None to keep original).
+        height: Output height (None to keep original).
+        aspect_mode: "maintain", "crop", or "fill".
+        start: Offset into the video in seconds.
+        cancel: Optional event; once set, the running ffmpeg process is
+            killed and ConversionCancelled is raised.
+
+    Raises:
+        FfmpegError: If the ffmpeg binary is missing or cannot read the input.
+        ValueError: If start is outside the video.
+    """
+
+    def __init__(
+        self,
+        input_path: str,
+        duration: float,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        aspect_mode: str = "maintain",
+        start: float = 0.0,
+        cancel: Optional[threading.Event] = None,
+    ) -> None:
+        self.source = VideoSource(input_path, duration, width, height, aspect_mode, start, cancel)
+        self.duration = self.source.duration
+        self.size = self.source.size
+
+    def _graph(self, chain: list[str], colors: int) -> str:
+        return (f"[0:v]{','.join(chain)},split[a][b];[a]{_PALETTE_SOURCE},palettegen=max_colors={colors}[p];"
+                f"[b][p]{_PALETTEUSE}")
+
+    def _command(self, settings: GifSettings, samples: Optional[str] = None,
+                 seconds: Optional[float] = None) -> list[str]:
+        """ffmpeg arguments up to the output for the input window or a samples file."""
+        size = _scaled_size(*self.size, settings.scale)
+        if samples is None:
+            head = self.source.input_args()
+            chain = self.source.chain(settings.fps, size)
+        else:
+            head = [self.source.exe, "-hide_banner", "-nostdin", "-v", "error",
+                    "-t", f"{seconds:.3f}", "-i", samples]
+            chain = [f"fps={settings.fps}", f"scale={size[0]}:{size[1]}:flags=lanczos"]
+        return head + ["-filter_complex", self._graph(chain, settings.colors), "-loop", "0", "-f", "gif"]
+
+    def _run(self, cmd: list[str]) -> bytes:
+        return _run(cmd, self.source.cancel)
+
+    def _predict(self, settings: GifSettings, spans: list[tuple[int, int]],
+                 samples: Optional[str]) -> tuple[int, Optional[bytes]]:
+        if samples is None:
+            # The whole clip was sampled, so the probe is the real encode
+            data = self._run(self._command(settings) + ["pipe:1"])
+            return len(data), data
+        # One encode over all segments, so one palette covers them like
+        # the full encode's; frames at segment starts are the "first" frames
+        total = sum(count for _, count in spans)
+        data = self._run(self._command(settings, samples, total / _SAMPLE_FPS) + ["pipe:1"])
+        header, sizes = _gif_frame_sizes(data)
+        starts, offset = set(), 0
+        for _, count in spans:
+            starts.add(min(len(sizes) - 1, round(offset * settings.fps / _SAMPLE_FPS)))
+            offset += count
+        firsts = [sizes[j] for j in starts]
+        return _extrapolate(header + sum(firsts) / len(firsts), sum(sizes) - sum(firsts),
+                            len(sizes) - len(firsts), _frame_count(self.duration, settings.fps)), None
+
+    def plan(self, target_bytes: int, ladder: Optional[list[GifSettings]] = None,
+             max_probes: int = _MAX_PROBES) -> GifPlan:
+        """Choose settings predicted to fit target_bytes (see plan_gif).
+
+        Raises:
+            FfmpegError: If ffmpeg fails.
+        """
+        ladder = ladder or LADDER
+        start = time.perf_counter()
+        spans, whole = _sample_spans(self.duration)
+        samples = None if whole else self.source.samples(spans)
+        chosen, measured = _search_ladder(ladder, target_bytes, max_probes,
+                                          lambda settings: self._predict(settings, spans, samples))
+        size, data = measured[chosen]
+        return GifPlan(ladder[chosen], size, len(measured), time.perf_counter() - start, data)
+
+    def draft(self, settings: GifSettings, path: str) -> None:
+        """Encode the sampled segments (see plan) back to back to path.
+
+        Raises:
+            FfmpegError: If ffmpeg fails.
+        """
+        spans, _ = _sample_spans(self.duration)
+        total = sum(count for _, count in spans)
+        self._run(self._command(settings, self.source.samples(spans), total / _SAMPLE_FPS) + ["-y", path])
+
+    def encode(self, settings: GifSettings, path: str,
+               on_progress: Optional[Callable[[float], None]] = None) -> None:
+        """Encode the clip to path, reporting the fraction done to on_progress.
+
+        Raises:
+            FfmpegError: If ffmpeg fails.
+            ConversionCancelled: If the cancel event was set.
+        """
+        cmd = self._command(settings) + ["-progress", "pipe:1", "-nostats", "-y", path]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        reported = 0.0
+        try:
+            # ffmpeg writes progress about twice a second, which paces the checks
+            for line in proc.stdout:
+                _check_cancelled(self.source.cancel)
+                key, _, value = line.strip().partition("=")
+                if on_progress is None or key != "out_time_us" or not value.isdigit():
+                    continue
+                done = min(1.0, int(value) / 1e6 / self.duration) if self.duration else 1.0
+                if done - reported >= _PROGRESS_STEP:
+                    reported = done
+                    on_progress(done)
+        except ConversionCancelled:
+            proc.kill()
+            proc.communicate()
+            raise
+        stderr = proc.stderr.read()
+        if proc.wait():
+            raise FfmpegError(stderr.strip() or "ffmpeg failed")
+
+    def close(self) -> None:
+        self.source.close()
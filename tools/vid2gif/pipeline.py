@@ -0,0 +1,254 @@
+"""Video to GIF converter - Streaming frame pipeline.
+
+Frames flow through three bounded stages so memory does not grow with the
+clip length:
+
+    decode (thread) -> resize + quantize (thread pool) -> GIF encode (caller)
+
+By default frames are mapped to one global palette and written as
+transparent delta rectangles (encoder.py). The "adaptive" method quantizes
+every frame to its own palette with Pillow; Pillow's multi-frame GIF save
+keeps every frame until the end, so GifWriter instead writes each frame as
+soon as the next one is known, holding at most one frame back to merge
+identical frames.
+"""
+
+from __future__ import annotations
+
+import functools
+import itertools
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+import numpy as np
+from PIL import GifImagePlugin, Image, ImageChops
+
+from .encoder import DeltaGifWriter, PaletteMapper, build_palette
+from .source import _check_cancelled
+
+# Decoded frames waiting to be submitted for quantization
+_DECODE_AHEAD = 4
+# Quantize jobs in flight per worker thread
+_JOBS_PER_WORKER = 2
+# Pillow's resize and quantize release the GIL, so a few threads help
+_MAX_WORKERS = 4
+# Leading frames used to build the global palette when none is given
+_PALETTE_FRAMES = 8
+
+
+def default_workers() -> int:
+    """Return the default number of quantize threads."""
+    return max(1, min(_MAX_WORKERS, os.cpu_count() or 1))
+
+
+def resize_frame(frame: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+    """Resize an RGB frame (NumPy array) to (width, height) if needed."""
+    if frame.shape[1::-1] == size:
+        return frame
+    return np.asarray(Image.fromarray(frame).resize(size, Image.Resampling.LANCZOS))
+
+
+def prepare_frame(frame, size: tuple[int, int], colors: int) -> Image.Image:
+    """Resize an RGB frame (NumPy array) and quantize it to its own palette."""
+    img = Image.fromarray(frame)
+    if img.size != size:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    return img.convert("P", palette=Image.Palette.ADAPTIVE, colors=colors)
+
+
+def _map_frame(frame: np.ndarray, mapper: PaletteMapper, size: tuple[int, int]) -> np.ndarray:
+    return mapper.map(resize_frame(frame, size))
+
+
+class GifWriter:
+    """Write an animated GIF one palette frame at a time.
+
+    Each frame after the first is cropped to the region that differs from
+    the previous frame and carries its own color table. Identical
+    consecutive frames are merged by extending the earlier one's duration.
+
+    Args:
+        fp: Binary file object to write to.
+        loop: Loop count (0 = forever).
+    """
+
+    def __init__(self, fp: BinaryIO, loop: int = 0) -> None:
+        self._fp = fp
+        self._loop = loop
+        self._previous: Optional[Image.Image] = None
+        self._pending: Optional[tuple[Image.Image, tuple[int, int, int, int], int]] = None
+        self.frames = 0
+
+    def add(self, frame: Image.Image, duration: int) -> None:
+        """Queue a "P" mode frame shown for duration milliseconds."""
+        rgb = frame.convert("RGB")
+        if self._previous is None:
+            bbox = (0, 0) + frame.size
+        else:
+            bbox = ImageChops.difference(self._previous, rgb).getbbox()
+            if bbox is None:
+                image, box, held = self._pending
+                self._pending = (image, box, held + duration)
+                return
+        self._flush()
+        self._previous = rgb
+        self._pending = (frame, bbox, duration)
+
+    def _flush(self) -> None:
+        if self._pending is None:
+            return
+        image, bbox, duration = self._pending
+        self._pending = None
+        if self.frames == 0:
+            header, _ = GifImagePlugin.getheader(image, info={"loop": self._loop, "duration": duration})
+            chunks = header + GifImagePlugin.getdata(image, duration=duration)
+        else:
+            if bbox != (0, 0) + image.size:
+                image = image.crop(bbox)
+            chunks = GifImagePlugin.getdata(image, bbox[:2], duration=duration, include_color_table=True)
+        for chunk in chunks:
+            self._fp.write(chunk)
+        self.frames += 1
+
+    def close(self) -> None:
+        """Write the last frame and the trailer.
+
+        Raises:
+            ValueError: If no frame was added.
+        """
+        if self._pending is None and self.frames == 0:
+            raise ValueError("No frames to encode")
+        self._flush()
+        self._fp.write(b";")
+        self._previous = None
+
+
+_DONE = object()
+
+
+def _decode(frames: Iterable, out: queue.Queue, stop: threading.Event) -> None:
+    """Producer: move frames from the (decoding) iterator into a bounded queue."""
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for frame in frames:
+            if not put(frame):
+                # Stop the decoder (e.g. ffmpeg) now rather than when collected
+                if hasattr(frames, "close"):
+                    frames.close()
+                return
+        put(_DONE)
+    except BaseException as e:
+        put(e)
+
+
+def _drain(decoded: queue.Queue) -> Iterator:
+    """Yield frames from the decode queue, re-raising decoder errors."""
+    while True:
+        item = decoded.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def write_gif(
+    frames: Iterable,
+    fp: Union[str, BinaryIO],
+    fps: int,
+    size: tuple[int, int],
+    colors: int = 256,
+    workers: Optional[int] = None,
+    method: str = "global",
+    palette: Optional[Union[np.ndarray, PaletteMapper]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> int:
+    """Stream RGB frames (NumPy arrays) into a looping GIF.
+
+    Used for both plan_gif()'s sample probes and the full encode, so
+    predictions measure the same encoder that produces the output.
+
+    Frames are pulled from the iterator on a background thread, resized
+    and mapped to a palette on a thread pool, and written in order. At most
+    _DECODE_AHEAD decoded frames and workers * _JOBS_PER_WORKER mapped
+    frames are held at any time.
+
+    Args:
+        frames: Iterable of HxWx3 uint8 arrays, e.g. clip.iter_frames().
+        fp: Output path or binary file object.
+        fps: Frame rate of the iterable.
+        size: Output (width, height).
+        colors: Palette size.
+        workers: Worker threads (None = default_workers()).
+        method: "global" for one palette and transparent delta frames
+            (see encoder.py), or "adaptive" for a palette per frame.
+        palette: Colors for the "global" method, or a PaletteMapper to
+            reuse its lookup table across calls; by default built from the
+            first _PALETTE_FRAMES frames.
+        cancel: Optional event checked before each frame; once set, the
+            decoder is stopped, queued frames are dropped and
+            ConversionCancelled is raised.
+
+    Returns:
+        Number of frames written (identical consecutive frames count once).
+
+    Raises:
+        ValueError: If the iterable is empty or the method is unknown.
+        ConversionCancelled: If cancel was set.
+    """
+    if method not in ("global", "adaptive"):
+        raise ValueError(f"Unknown GIF method: {method}")
+    workers = workers or default_workers()
+    duration = round(1000 / fps)
+    decoded: queue.Queue = queue.Queue(maxsize=_DECODE_AHEAD)
+    stop = threading.Event()
+    reader = threading.Thread(target=_decode, args=(frames, decoded, stop),
+                              name="vid2gif-decode", daemon=True)
+    own = isinstance(fp, str)
+    out = open(fp, "wb") if own else fp
+    try:
+        reader.start()
+        source = _drain(decoded)
+        if method == "adaptive":
+            writer = GifWriter(out)
+            job = functools.partial(prepare_frame, size=size, colors=colors)
+        else:
+            if palette is None:
+                head = [resize_frame(f, size) for f in itertools.islice(source, _PALETTE_FRAMES)]
+                if not head:
+                    raise ValueError("No frames to encode")
+                palette = build_palette(head, colors)
+                source = itertools.chain(head, source)
+            mapper = palette if isinstance(palette, PaletteMapper) else PaletteMapper(palette)
+            writer = DeltaGifWriter(out, size, mapper.palette)
+            job = functools.partial(_map_frame, mapper=mapper, size=size)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vid2gif-quantize") as pool:
+            jobs: deque = deque()
+            for frame in source:
+                _check_cancelled(cancel)
+                jobs.append(pool.submit(job, frame))
+                del frame
+                if len(jobs) >= workers * _JOBS_PER_WORKER:
+                    writer.add(jobs.popleft().result(), duration)
+            while jobs:
+                writer.add(jobs.popleft().result(), duration)
+        writer.close()
+        return writer.frames
+    finally:
+        stop.set()
+        reader.join()
+        if own:
+            out.close()
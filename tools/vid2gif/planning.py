@@ -0,0 +1,187 @@
+"""Video to GIF converter - Size planning shared by the engines.
+
+The settings ladder, the plan result and the search over the ladder. Each
+engine (moviepy in vid2gif.py, ffmpeg in ffmpeg_engine.py) supplies its own
+size prediction for a rung.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class GifSettings:
+    """Encoding settings chosen by plan_gif().
+
+    Attributes:
+        fps: Frames per second.
+        scale: Factor applied to the clip's dimensions.
+        colors: Palette size per frame.
+    """
+
+    fps: int
+    scale: float
+    colors: int
+
+
+# Settings from best to worst. The first is the previous fixed default of
+# 10 fps at the requested size; later rungs trade palette, then frame rate,
+# then dimensions
+LADDER = [
+    GifSettings(10, 1.0, 256), GifSettings(10, 1.0, 128), GifSettings(8, 1.0, 128),
+    GifSettings(8, 0.85, 128), GifSettings(6, 0.85, 128), GifSettings(6, 0.7, 128),
+    GifSettings(5, 0.7, 64), GifSettings(5, 0.6, 64), GifSettings(4, 0.5, 64),
+    GifSettings(4, 0.4, 64), GifSettings(3, 0.35, 64), GifSettings(2, 0.3, 32),
+    GifSettings(2, 0.25, 32), GifSettings(1, 0.2, 32),
+]
+
+# Sampled segments are decoded at this rate, the highest on the ladder
+_SAMPLE_FPS = 10
+_SEGMENTS = 3
+# At most this share of the clip's frames (and never more than
+# _MAX_SAMPLE_FRAMES) is decoded for prediction
+_SAMPLE_FRACTION = 0.3
+_MAX_SAMPLE_FRAMES = 30
+# Sample encodes allowed while searching the ladder
+_MAX_PROBES = 4
+# Rough relative size per rung, only used to pick which rung to probe next
+# after a measurement; every chosen rung is then measured on the sample
+_COLOR_FACTOR = {256: 1.0, 128: 0.8, 64: 0.6, 32: 0.45}
+
+
+@dataclass
+class GifPlan:
+    """Result of plan_gif().
+
+    Attributes:
+        settings: Chosen settings.
+        predicted_bytes: Predicted size of the full GIF.
+        probes: Number of sample encodes performed.
+        seconds: Time spent decoding samples and probing.
+        data: The encoded GIF if the sample covered the whole clip at the
+            chosen settings (no full encode needed), else None.
+        palettes: Global palettes built from the sampled frames, keyed by
+            palette size (empty for the "adaptive" method).
+    """
+
+    settings: GifSettings
+    predicted_bytes: int
+    probes: int = 0
+    seconds: float = 0.0
+    data: Optional[bytes] = field(default=None, repr=False)
+    palettes: dict[int, np.ndarray] = field(default_factory=dict, repr=False)
+
+
+def _frame_count(duration: float, fps: int) -> int:
+    # Same frame times as moviepy's iter_frames
+    return max(1, int(duration * fps))
+
+
+def _scaled_size(width: int, height: int, scale: float) -> tuple[int, int]:
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _sample_spans(duration: float) -> tuple[list[tuple[int, int]], bool]:
+    """Choose short evenly spaced segments to sample at _SAMPLE_FPS.
+
+    Returns ([(first frame, frame count), ...], whole) where whole is True
+    if the segments cover every frame of the clip.
+    """
+    total = _frame_count(duration, _SAMPLE_FPS)
+    if total <= _MAX_SAMPLE_FRAMES:
+        # Short clips are sampled whole; the probe is then the real encode
+        return [(0, total)], True
+    budget = min(_MAX_SAMPLE_FRAMES, max(2 * _SEGMENTS, int(total * _SAMPLE_FRACTION)))
+    per_segment = budget // _SEGMENTS
+    return [(int((k + 0.5) * total / _SEGMENTS) - per_segment // 2, per_segment)
+            for k in range(_SEGMENTS)], False
+
+
+def _gif_frame_sizes(data: bytes) -> tuple[int, list[int]]:
+    """Split an encoded GIF into (header bytes, [bytes per frame]).
+
+    A frame's size includes the extensions (delay, transparency) before its
+    image. The header includes the global color table, application
+    extensions (looping) and the trailer.
+    """
+    def skip_sub_blocks(pos: int) -> int:
+        while data[pos]:
+            pos += data[pos] + 1
+        return pos + 1
+
+    flags = data[10]
+    pos = header = 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+    frames: list[int] = []
+    pending = 0
+    while pos < len(data) and data[pos] != 0x3B:
+        start = pos
+        if data[pos] == 0x21:
+            label = data[pos + 1]
+            pos = skip_sub_blocks(pos + 2)
+            if label == 0xFF:
+                header += pos - start
+            else:
+                pending += pos - start
+        else:
+            flags = data[pos + 9]
+            pos += 10 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+            pos = skip_sub_blocks(pos + 1)  # after the LZW minimum code size
+            frames.append(pending + pos - start)
+            pending = 0
+    return header + 1, frames
+
+
+def _extrapolate(first_bytes: float, delta_bytes: float, deltas: int, frames: int) -> int:
+    """Full size from the mean first-frame cost and total delta cost of samples."""
+    # Without deltas to measure (very low fps), assume full frames
+    per_frame = delta_bytes / deltas if deltas else first_bytes
+    return round(first_bytes + per_frame * (frames - 1))
+
+
+def _relative_size(settings: GifSettings) -> float:
+    return settings.fps * settings.scale ** 2 * _COLOR_FACTOR.get(settings.colors, 1.0)
+
+
+def _search_ladder(
+    ladder: list[GifSettings],
+    target_bytes: int,
+    max_probes: int,
+    predict: Callable[[GifSettings], tuple[int, Optional[bytes]]],
+) -> tuple[int, dict[int, tuple[int, Optional[bytes]]]]:
+    """Find the best rung predicted to fit target_bytes.
+
+    The search starts at the best rung, jumps ahead by a rough size model
+    after each miss and bisects between the best known miss and fit.
+
+    Returns:
+        (chosen index, {index: predict() result}); if nothing is predicted
+        to fit, the worst rung measured.
+    """
+    measured: dict[int, tuple[int, Optional[bytes]]] = {}
+    miss, fit = -1, None
+    i = 0
+    while len(measured) < max_probes:
+        if i not in measured:
+            measured[i] = predict(ladder[i])
+        size = measured[i][0]
+        if size <= target_bytes:
+            fit = i
+        else:
+            miss = i
+        if fit is not None:
+            if fit - miss <= 1:
+                break
+            i = (miss + fit) // 2
+        elif i == len(ladder) - 1:
+            break
+        else:
+            # First rung the model expects to fit, given this measurement
+            ratio = target_bytes / size
+            i = next((j for j in range(i + 1, len(ladder))
+                      if _relative_size(ladder[j]) / _relative_size(ladder[i]) <= ratio),
+                     len(ladder) - 1)
+    return (fit if fit is not None else max(measured)), measured
@@ -0,0 +1,275 @@
+"""Video to GIF converter - ffmpeg-decoded input window.
+
+The ffmpeg engine reads the input through VideoSource, which hands the
+time window, the frame rate and the output size to ffmpeg instead of
+decoding full-resolution frames and resizing them in Python (the moviepy
+engine, its fallback, decodes through moviepy instead):
+
+    -ss <start> -t <duration> -i input
+    fps -> [scale + crop for aspect_mode] -> scale -> rgb24 frames
+
+Sampled segments for size prediction are opened as separate seeking inputs
+and joined with concat, so only the sampled seconds are decoded. They are
+decoded once per source into a raw video file that size probes, previews
+and the final render's palettes all read from.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Iterator, Optional
+
+import imageio_ffmpeg
+import numpy as np
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from .planning import _SAMPLE_FPS
+
+# Arguments for raw RGB frames on stdout
+_RAW_OUTPUT = ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+# Seconds between cancel checks while an ffmpeg run produces no output
+_CANCEL_POLL = 0.2
+
+
+class FfmpegError(RuntimeError):
+    """ffmpeg is unavailable or failed on the input."""
+
+
+class ConversionCancelled(Exception):
+    """The conversion was stopped through its cancel event."""
+
+
+def _check_cancelled(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise ConversionCancelled("Conversion cancelled")
+
+
+def _run(cmd: list[str], cancel: Optional[threading.Event] = None) -> bytes:
+    """Run ffmpeg to completion and return its stdout; killed if cancel is set.
+
+    Raises:
+        FfmpegError: If ffmpeg exits with an error.
+        ConversionCancelled: If cancel was set.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=_CANCEL_POLL)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel is not None and cancel.is_set():
+                proc.kill()
+                proc.communicate()
+                raise ConversionCancelled("Conversion cancelled") from None
+    if proc.returncode:
+        raise FfmpegError(stderr.decode(errors="replace").strip() or "ffmpeg failed")
+    return stdout
+
+
+def _geometry(
+    src_w: int,
+    src_h: int,
+    width: Optional[int],
+    height: Optional[int],
+    aspect_mode: str,
+) -> tuple[list[str], tuple[int, int]]:
+    """Return (filters, (w, h)) that bring the source to the requested size.
+
+    "maintain" fits inside width x height, "fill" stretches to it and
+    "crop" scales to cover it and crops the center. The returned filters
+    run before the final scale to (w, h).
+    """
+    if width and height:
+        if aspect_mode == "fill":
+            return [], (width, height)
+        if aspect_mode == "crop":
+            cover = max(width / src_w, height / src_h)
+            return [f"scale={round(src_w * cover)}:{round(src_h * cover)}:flags=lanczos",
+                    f"crop={width}:{height}"], (width, height)
+        if aspect_mode == "maintain":
+            factor = min(width / src_w, height / src_h)
+            return [], (round(src_w * factor), round(src_h * factor))
+    elif (width or height) and aspect_mode in ("maintain", "fill"):
+        factor = width / src_w if width else height / src_h
+        return [], (round(src_w * factor), round(src_h * factor))
+    return [], (src_w, src_h)
+
+
+def _read_frames(cmd: list[str], size: tuple[int, int],
+                 cancel: Optional[threading.Event] = None) -> Iterator[np.ndarray]:
+    """Run ffmpeg and yield its raw RGB output as (h, w, 3) uint8 arrays.
+
+    Closing the generator early, or setting cancel, stops ffmpeg.
+
+    Raises:
+        FfmpegError: If ffmpeg exits with an error.
+        ConversionCancelled: If cancel was set.
+    """
+    w, h = size
+    frame_bytes = w * h * 3
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finished = False
+    try:
+        while True:
+            _check_cancelled(cancel)
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(h, w, 3)
+        finished = True
+    finally:
+        if not finished:
+            proc.kill()
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        code = proc.wait()
+    if code:
+        raise FfmpegError(stderr.decode(errors="replace").strip() or "ffmpeg failed")
+
+
+class VideoSource:
+    """A time window of a video, decoded by ffmpeg at the output size.
+
+    Args:
+        input_path: Path to the input video file.
+        duration: Maximum window length in seconds (None = to the end).
+        width: Output width (None to keep original).
+        height: Output height (None to keep original).
+        aspect_mode: "maintain", "crop", or "fill".
+        start: Offset of the window into the video in seconds.
+        cancel: Optional event; once set, running ffmpeg decodes are killed
+            and raise ConversionCancelled.
+
+    Attributes:
+        duration: Window length, clamped to the end of the video.
+        w, h: Output frame size.
+
+    Raises:
+        FfmpegError: If the ffmpeg binary is missing or cannot read the input.
+        ValueError: If start is negative or past the end of the video.
+    """
+
+    def __init__(
+        self,
+        input_path: str,
+        duration: Optional[float] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        aspect_mode: str = "maintain",
+        start: float = 0.0,
+        cancel: Optional[threading.Event] = None,
+    ) -> None:
+        self.cancel = cancel
+        try:
+            self.exe = imageio_ffmpeg.get_ffmpeg_exe()
+            infos = ffmpeg_parse_infos(input_path)
+        except (RuntimeError, OSError) as e:
+            raise FfmpegError(str(e)) from e
+        if not infos.get("video_found"):
+            raise FfmpegError(f"No video stream in {input_path}")
+        if not 0 <= start < infos["duration"]:
+            raise ValueError(f"Start {start:g}s is outside the video (0-{infos['duration']:g}s)")
+        src_w, src_h = infos["video_size"]
+        if abs(infos.get("video_rotation", 0)) in (90, 270):
+            src_w, src_h = src_h, src_w  # ffmpeg autorotates
+        self.input_path = input_path
+        self.start = start
+        remaining = infos["duration"] - start
+        self.duration = min(duration, remaining) if duration else remaining
+        self.filters, self.size = _geometry(src_w, src_h, width, height, aspect_mode)
+        self.w, self.h = self.size
+        self._samples: Optional[tuple[list[tuple[int, int]], str]] = None
+
+    def _head(self) -> list[str]:
+        return [self.exe, "-hide_banner", "-nostdin", "-v", "error"]
+
+    def input_args(self) -> list[str]:
+        """ffmpeg arguments up to and including the seeking, trimmed input."""
+        args = self._head()
+        if self.start:
+            args += ["-ss", f"{self.start:.3f}"]
+        return args + ["-t", f"{self.duration:.3f}", "-i", self.input_path]
+
+    def chain(self, fps: int, size: Optional[tuple[int, int]] = None) -> list[str]:
+        """Filters that resample the window to fps and scale it to size."""
+        w, h = size or self.size
+        return [f"fps={fps}", *self.filters, f"scale={w}:{h}:flags=lanczos"]
+
+    def span_args(self, spans: list[tuple[int, int]]) -> list[str]:
+        """ffmpeg arguments that decode only the given spans, as one stream.
+
+        Args:
+            spans: (first frame, frame count) pairs at _SAMPLE_FPS, as
+                returned by _sample_spans.
+        """
+        args, graph = self._head(), []
+        for k, (first, count) in enumerate(spans):
+            args += ["-ss", f"{self.start + first / _SAMPLE_FPS:.3f}",
+                     "-t", f"{count / _SAMPLE_FPS:.3f}", "-i", self.input_path]
+            graph.append(f"[{k}:v]{','.join(self.chain(_SAMPLE_FPS))},"
+                         f"trim=end_frame={count},setpts=PTS-STARTPTS[s{k}]")
+        inputs = "".join(f"[s{k}]" for k in range(len(spans)))
+        graph.append(f"{inputs}concat=n={len(spans)}:v=1:a=0,setpts=N/{_SAMPLE_FPS}/TB")
+        return args + ["-filter_complex", ";".join(graph)]
+
+    def iter_frames(self, fps: int, size: Optional[tuple[int, int]] = None) -> Iterator[np.ndarray]:
+        """Yield the window's frames at fps, already scaled to size.
+
+        Raises:
+            FfmpegError: If decoding fails.
+        """
+        size = size or self.size
+        cmd = self.input_args() + ["-vf", ",".join(self.chain(fps, size))] + _RAW_OUTPUT
+        return _read_frames(cmd, size, self.cancel)
+
+    def samples(self, spans: list[tuple[int, int]]) -> str:
+        """Return a raw video of the spans (see span_args), decoding it once.
+
+        The file lives until close() or until different spans are asked for.
+
+        Raises:
+            FfmpegError: If decoding fails.
+        """
+        if self._samples is not None and self._samples[0] == spans:
+            return self._samples[1]
+        self._drop_samples()
+        fd, path = tempfile.mkstemp(suffix=".nut", prefix="vid2gif-samples-")
+        os.close(fd)
+        try:
+            _run(self.span_args(spans) + ["-c:v", "rawvideo", "-pix_fmt", "rgb24", "-f", "nut", "-y", path],
+                 self.cancel)
+        except BaseException:
+            os.unlink(path)
+            raise
+        self._samples = (list(spans), path)
+        return path
+
+    def read_spans(self, spans: list[tuple[int, int]]) -> list[list[np.ndarray]]:
+        """Return the frames of the spans (see samples()), one list per span.
+
+        Raises:
+            FfmpegError: If decoding fails.
+        """
+        cmd = self._head() + ["-i", self.samples(spans)] + _RAW_OUTPUT
+        frames = list(_read_frames(cmd, self.size, self.cancel))
+        segments, offset = [], 0
+        for _, count in spans:
+            segments.append(frames[offset:offset + count])
+            offset += count
+        return [segment for segment in segments if segment]
+
+    def _drop_samples(self) -> None:
+        if self._samples is not None:
+            try:
+                os.unlink(self._samples[1])
+            except OSError:
+                pass
+            self._samples = None
+
+    def close(self) -> None:
+        """Delete the decoded samples."""
+        self._drop_samples()
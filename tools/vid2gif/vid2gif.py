@@ -2,13 +2,412 @@
 
 from __future__ import annotations
 
+import io
 import os
 import shutil
 import tempfile
-from typing import Callable, Optional
+import threading
+import time
+from dataclasses import replace
+from typing import Callable, Iterable, Iterator, Optional, Union
 
+import numpy as np
 from moviepy import VideoFileClip
 
+from .encoder import PaletteMapper, build_palette
+from .ffmpeg_engine import FfmpegEngine
+from .pipeline import write_gif
+from .planning import (
+    _MAX_PROBES, _SAMPLE_FPS, LADDER, GifPlan, GifSettings,
+    _extrapolate, _frame_count, _gif_frame_sizes, _relative_size, _sample_spans, _scaled_size, _search_ladder,
+)
+from .source import FfmpegError, VideoSource, _check_cancelled, _geometry
+
+
+ENGINES = ("auto", "ffmpeg", "moviepy")
+
+# Draft settings for GifSession.preview(), at most _PREVIEW_WIDTH pixels wide
+_PREVIEW = GifSettings(5, 0.5, 64)
+_PREVIEW_WIDTH = 320
+
+
+def _sample_frames(video, duration: float) -> tuple[list[list], bool]:
+    """Decode the segments chosen by _sample_spans at _SAMPLE_FPS.
+
+    Returns (segments, whole) where whole is True if the segments cover
+    every frame of the clip.
+    """
+    spans, whole = _sample_spans(duration)
+    if isinstance(video, VideoSource):
+        return video.read_spans(spans), whole
+    return [[video.get_frame((start + n) / _SAMPLE_FPS) for n in range(count)]
+            for start, count in spans], whole
+
+
+def _predict(
+    segments: list[list],
+    duration: float,
+    settings: GifSettings,
+    method: str = "global",
+    palette: Optional[Union[np.ndarray, PaletteMapper]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> tuple[int, Optional[bytes]]:
+    """Predict the full GIF size from the sampled segments.
+
+    Each segment is encoded at the candidate settings and split into
+    per-frame sizes. The first frame's cost is paid once; every later
+    frame costs the average delta seen in the segments. Lower frame rates
+    use the nearest sampled frames.
+
+    Returns:
+        (predicted bytes, encoded GIF or None). The GIF is returned when the
+        sample is the whole clip at its own frame rate, i.e. the prediction
+        is the real encode.
+    """
+    height, width = segments[0][0].shape[:2]
+    size = _scaled_size(width, height, settings.scale)
+    step = _SAMPLE_FPS / settings.fps
+    first_bytes = delta_bytes = deltas = 0
+    for segment in segments:
+        frames = [segment[round(k * step)] for k in range(max(1, int(len(segment) / step)))]
+        buf = io.BytesIO()
+        write_gif(frames, buf, settings.fps, size, settings.colors, method=method, palette=palette, cancel=cancel)
+        if len(segments) == 1 and settings.fps == _SAMPLE_FPS and len(frames) == _frame_count(duration, settings.fps):
+            return buf.tell(), buf.getvalue()
+        header, sizes = _gif_frame_sizes(buf.getvalue())
+        first_bytes += header + sizes[0]
+        delta_bytes += sum(sizes[1:])
+        deltas += len(sizes) - 1
+    return _extrapolate(first_bytes / len(segments), delta_bytes, deltas,
+                        _frame_count(duration, settings.fps)), None
+
+
+def plan_gif(
+    video,
+    target_bytes: int,
+    ladder: Optional[list[GifSettings]] = None,
+    max_probes: int = _MAX_PROBES,
+    method: str = "global",
+    cancel: Optional[threading.Event] = None,
+) -> GifPlan:
+    """Choose the best settings predicted to fit target_bytes in one encode.
+
+    A few short segments of the clip are decoded once and encoded at
+    candidate settings to predict the full size (see _search_ladder for
+    how rungs are chosen).
+
+    Args:
+        video: VideoSource, or the moviepy engine's _ClipSource.
+        target_bytes: Size budget for the GIF.
+        ladder: Candidate settings from best to worst (default LADDER).
+        max_probes: Maximum number of sample encodes.
+        method: GIF encoding method (see write_gif). For "global", one
+            palette per palette size is built from all sampled frames, so
+            it covers the whole clip rather than just its start.
+        cancel: Optional event checked between sample frames; once set,
+            ConversionCancelled is raised.
+
+    Returns:
+        GifPlan; if nothing is predicted to fit, the last rung.
+
+    Raises:
+        ConversionCancelled: If cancel was set.
+    """
+    ladder = ladder or LADDER
+    start = time.perf_counter()
+    segments, whole = _sample_frames(video, video.duration)
+    palettes = {}
+    if method == "global":
+        samples = [frame for segment in segments for frame in segment]
+        palettes = {colors: build_palette(samples, colors) for colors in {s.colors for s in ladder}}
+    # Mapping tables are built once per palette size, not once per probe
+    mappers: dict[int, PaletteMapper] = {}
+
+    def mapper(colors: int) -> Optional[PaletteMapper]:
+        if colors in palettes and colors not in mappers:
+            mappers[colors] = PaletteMapper(palettes[colors])
+        return mappers.get(colors)
+
+    chosen, measured = _search_ladder(
+        ladder, target_bytes, max_probes,
+        lambda settings: _predict(segments, video.duration, settings, method, mapper(settings.colors), cancel),
+    )
+    size, data = measured[chosen]
+    return GifPlan(ladder[chosen], size, len(measured), time.perf_counter() - start,
+                   data if whole else None, palettes)
+
+
+class _ClipSource:
+    """A time window of a video, decoded and resized by moviepy.
+
+    Offers what plan_gif, _write_clip and GifSession use of VideoSource,
+    without going through VideoSource's ffmpeg probe and filter graphs, so
+    it stays a real fallback when those fail on an input.
+
+    Args:
+        input_path: Path to the input video file.
+        duration: Maximum window length in seconds.
+        width: Output width (None to keep original).
+        height: Output height (None to keep original).
+        aspect_mode: "maintain", "crop", or "fill".
+        start: Offset of the window into the video in seconds.
+        cancel: Optional event; checked for every decoded frame, once set
+            ConversionCancelled is raised.
+
+    Raises:
+        ValueError: If start is negative or past the end of the video.
+    """
+
+    def __init__(self, input_path: str, duration: float, width: Optional[int], height: Optional[int],
+                 aspect_mode: str, start: float = 0.0, cancel: Optional[threading.Event] = None) -> None:
+        self.cancel = cancel
+        video = VideoFileClip(input_path)
+        try:
+            if not 0 <= start < video.duration:
+                raise ValueError(f"Start {start:g}s is outside the video (0-{video.duration:g}s)")
+            clip = video.subclipped(start, min(start + duration, video.duration))
+            src_w, src_h = clip.size
+            _, size = _geometry(src_w, src_h, width, height, aspect_mode)
+            if aspect_mode == "crop" and width and height:
+                cover = max(width / src_w, height / src_h)
+                clip = clip.resized(new_size=(round(src_w * cover), round(src_h * cover)))
+                clip = clip.cropped(x_center=clip.w / 2, y_center=clip.h / 2, width=width, height=height)
+            elif size != (src_w, src_h):
+                clip = clip.resized(new_size=size)
+        except BaseException:
+            video.close()
+            raise
+        self._video = video
+        self.clip = clip
+        self.duration = clip.duration
+        self.size = size
+        self.w, self.h = size
+
+    def get_frame(self, t: float) -> np.ndarray:
+        _check_cancelled(self.cancel)
+        return self.clip.get_frame(t)
+
+    def iter_frames(self, fps: int, size: Optional[tuple[int, int]] = None) -> Iterator[np.ndarray]:
+        """Yield the window's frames at fps; write_gif() scales them to size."""
+        for frame in self.clip.iter_frames(fps=fps, dtype="uint8"):
+            _check_cancelled(self.cancel)
+            yield frame
+
+    def close(self) -> None:
+        self._video.close()
+
+
+class _MoviepyEngine:
+    """Decode frames into Python with moviepy and encode with write_gif()."""
+
+    def __init__(self, input_path: str, duration: float, width: Optional[int], height: Optional[int],
+                 aspect_mode: str, workers: Optional[int], method: str, start: float = 0.0,
+                 cancel: Optional[threading.Event] = None) -> None:
+        self.source = _ClipSource(input_path, duration, width, height, aspect_mode, start, cancel)
+        self.size = self.source.size
+        self.workers = workers
+        self.method = method
+        # Global palettes from the sampled frames, by palette size; the
+        # samples do not depend on the target, so any plan's serve every encode
+        self.palettes: dict[int, np.ndarray] = {}
+
+    def plan(self, target_bytes: int) -> GifPlan:
+        plan = plan_gif(self.source, target_bytes, method=self.method, cancel=self.source.cancel)
+        self.palettes.update(plan.palettes)
+        return plan
+
+    def draft(self, settings: GifSettings, path: str) -> None:
+        """Encode the sampled segments (see plan_gif) back to back to path."""
+        segments, _ = _sample_frames(self.source, self.source.duration)
+        samples = [frame for segment in segments for frame in segment]
+        step = _SAMPLE_FPS / settings.fps
+        frames = [samples[round(k * step)] for k in range(max(1, int(len(samples) / step)))]
+        size = _scaled_size(*self.size, settings.scale)
+        palette = build_palette(frames, settings.colors) if self.method == "global" else None
+        write_gif(frames, path, settings.fps, size, settings.colors, self.workers, self.method, palette,
+                  self.source.cancel)
+
+    def encode(self, settings: GifSettings, path: str,
+               on_progress: Optional[Callable[[float], None]] = None) -> None:
+        """Encode the clip to path with the palettes of earlier plans (see plan_gif)."""
+        _write_clip(self.source, path, settings, self.workers, self.method, self.palettes, on_progress)
+
+    def close(self) -> None:
+        self.source.close()
+
+
+class GifSession:
+    """A video window opened for previews and conversions to GIF.
+
+    The sampled segments that size prediction reads are decoded once, on
+    first use, and shared by every later preview, plan and convert. A
+    convert at a target that was already planned reuses that plan, so a
+    preview followed by the full render decodes the samples once and plans
+    once.
+
+    Args:
+        input_path: Path to the input video file.
+        duration: Maximum GIF duration in seconds.
+        width: Output width (None to keep original).
+        height: Output height (None to keep original).
+        aspect_mode: "maintain", "crop", or "fill".
+        start: Offset into the video in seconds where the GIF begins.
+        progress_callback: Optional callback(status_message); may be
+            reassigned between calls.
+        workers: Palette quantization threads (see convert_video).
+        method: GIF encoding method (see convert_video).
+        engine: "auto", "ffmpeg" or "moviepy" (see convert_video).
+        cancel: Optional event (see convert_video); may be reassigned
+            between calls. After a cancelled call the session stays usable
+            with a cleared or new event.
+
+    Raises:
+        ValueError: If engine is unknown or start is outside the video.
+        FfmpegError: If engine is "ffmpeg" and ffmpeg fails.
+    """
+
+    def __init__(
+        self,
+        input_path: str,
+        duration: float = 5.0,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        aspect_mode: str = "maintain",
+        start: float = 0.0,
+        progress_callback: Optional[Callable[[str], None]] = None,
+        workers: Optional[int] = None,
+        method: str = "global",
+        engine: str = "auto",
+        cancel: Optional[threading.Event] = None,
+    ) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        self.engine = engine
+        self.progress_callback = progress_callback
+        self._moviepy_args = (input_path, duration, width, height, aspect_mode, workers, method, start)
+        self._plans: dict[int, GifPlan] = {}
+        self._status("Loading video...")
+        self.runner = None
+        if engine != "moviepy":
+            try:
+                self.runner = FfmpegEngine(input_path, duration, width, height, aspect_mode, start, cancel)
+            except FfmpegError as e:
+                if engine == "ffmpeg":
+                    raise
+                self._status(f"ffmpeg failed, using moviepy instead ({str(e).splitlines()[-1]})")
+        if self.runner is None:
+            self.runner = _MoviepyEngine(*self._moviepy_args, cancel)
+
+    def __enter__(self) -> "GifSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def cancel(self) -> Optional[threading.Event]:
+        return self.runner.source.cancel
+
+    @cancel.setter
+    def cancel(self, event: Optional[threading.Event]) -> None:
+        self.runner.source.cancel = event
+
+    def _status(self, msg: str) -> None:
+        if self.progress_callback:
+            self.progress_callback(msg)
+
+    def _run(self, step: Callable):
+        """Run step(runner); with engine "auto", retry once on moviepy if ffmpeg fails."""
+        try:
+            return step(self.runner)
+        except FfmpegError as e:
+            if self.engine != "auto" or not isinstance(self.runner, FfmpegEngine):
+                raise
+            self._status(f"ffmpeg failed, using moviepy instead ({str(e).splitlines()[-1]})")
+            self.runner.close()
+            self.runner = _MoviepyEngine(*self._moviepy_args, self.cancel)
+            self._plans.clear()
+            return step(self.runner)
+
+    def preview(self, output_path: str) -> GifSettings:
+        """Write a low-fps, small draft GIF of the window to output_path.
+
+        The draft plays the sampled segments (a few short moments spread
+        over the window) back to back at _PREVIEW settings, so it costs one
+        small encode on top of decoding the samples, which later plans and
+        the full render reuse.
+
+        Returns:
+            The draft's settings.
+        """
+        w = self.runner.size[0]
+        settings = replace(_PREVIEW, scale=min(_PREVIEW.scale, _PREVIEW_WIDTH / w))
+        self._status("Rendering preview...")
+        self._run(lambda runner: runner.draft(settings, output_path))
+        return settings
+
+    def plan(self, target_size_mb: float = 5.0) -> GifPlan:
+        """Plan the full render for a size target (see plan_gif); cached per target."""
+        target_bytes = int(target_size_mb * 1024 * 1024)
+        plan = self._plans.get(target_bytes)
+        if plan is None:
+            self._status("Calculating optimal settings...")
+            plan = self._plans[target_bytes] = self._run(lambda runner: runner.plan(target_bytes))
+        return plan
+
+    def convert(self, output_path: str, target_size_mb: float = 5.0, tolerance: float = 0.1) -> float:
+        """Encode the GIF once with the planned settings, correcting once if too big.
+
+        Returns:
+            Final file size in MB.
+        """
+        return self._run(lambda runner: self._convert(output_path, target_size_mb, tolerance))
+
+    def _convert(self, output_path: str, target_size_mb: float, tolerance: float) -> float:
+        def progress(done: float) -> None:
+            self._status(f"Creating GIF... {round(done * 100)}%")
+
+        target_bytes = int(target_size_mb * 1024 * 1024)
+        plan = self.plan(target_size_mb)
+        self._status(_describe(plan.settings, plan.predicted_bytes, "Predicted"))
+
+        with tempfile.NamedTemporaryFile(suffix=".gif", delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+
+        try:
+            if plan.data is not None:
+                with open(tmp_path, "wb") as f:
+                    f.write(plan.data)
+            else:
+                self._status("Creating GIF...")
+                self.runner.encode(plan.settings, tmp_path, progress)
+
+            actual = os.path.getsize(tmp_path)
+            if actual > target_bytes * (1 + tolerance) and plan.settings != LADDER[-1]:
+                # Correct the prediction by the observed error and re-plan once
+                self._status("Optimizing file size...")
+                index = LADDER.index(plan.settings)
+                ratio = target_bytes / actual
+                settings = next((s for s in LADDER[index + 1:]
+                                 if _relative_size(s) / _relative_size(plan.settings) <= ratio),
+                                LADDER[-1])
+                self._status(_describe(settings, None, "Re-encoding"))
+                self.runner.encode(settings, tmp_path, progress)
+
+            shutil.move(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        final_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+        self._status("Conversion complete")
+        return final_size_mb
+
+    def close(self) -> None:
+        """Close the engine and delete the decoded samples."""
+        self.runner.close()
+
 
 def convert_video(
     input_path: str,
@@ -19,9 +418,20 @@ def convert_video(
     height: Optional[int] = None,
     aspect_mode: str = "maintain",
     progress_callback: Optional[Callable[[str], None]] = None,
+    tolerance: float = 0.1,
+    workers: Optional[int] = None,
+    method: str = "global",
+    engine: str = "auto",
+    start: float = 0.0,
+    cancel: Optional[threading.Event] = None,
 ) -> float:
     """Convert a video file to GIF.
 
+    Settings (fps, scale, palette size) are chosen up front from sampled
+    segments so that one full encode normally hits the target. A second
+    encode runs only if the result exceeds the target by more than
+    ``tolerance``. To preview before converting, use GifSession.
+
     Args:
         input_path: Path to the input video file.
         output_path: Path for the output GIF file.
@@ -31,65 +441,65 @@ def convert_video(
         height: Output height (None to keep original).
         aspect_mode: "maintain", "crop", or "fill".
         progress_callback: Optional callback(status_message).
+        tolerance: Fraction by which the result may exceed the target
+            before a correction encode is run.
+        workers: Palette quantization threads (None = a few, per CPU count).
+            Frames are streamed, so memory does not grow with clip length.
+            moviepy engine only.
+        method: "global" (one palette, transparent delta frames) or
+            "adaptive" (a palette per frame). moviepy engine only.
+        engine: "ffmpeg" runs decoding, scaling and palette generation in
+            ffmpeg (see ffmpeg_engine.py), which decodes only the frames
+            needed, already trimmed and scaled (see source.py); "moviepy"
+            decodes and resizes with moviepy's VideoFileClip and encodes in
+            Python; "auto" uses ffmpeg and falls back to moviepy if it fails.
+        start: Offset into the video in seconds where the GIF begins.
+        cancel: Optional event, checked for every decoded frame and while
+            ffmpeg runs. Once set, ffmpeg is killed, the temporary GIF and
+            decoded samples are deleted and ConversionCancelled is raised.
 
     Returns:
         Final file size in MB.
+
+    Raises:
+        ValueError: If engine is unknown or start is outside the video.
+        FfmpegError: If engine is "ffmpeg" and ffmpeg fails.
+        ConversionCancelled: If cancel was set.
     """
-    def status(msg: str) -> None:
-        if progress_callback:
-            progress_callback(msg)
-
-    status("Loading video...")
-    video = VideoFileClip(input_path)
-
-    try:
-        clip_duration = min(duration, video.duration)
-        video = video.subclipped(0, clip_duration)
-
-        # Handle dimensions
-        if width is not None or height is not None:
-            if aspect_mode == "maintain":
-                if width and height:
-                    video = video.resized(height=height)
-                    if video.w > width:
-                        video = video.resized(width=width)
-                elif width:
-                    video = video.resized(width=width)
-                elif height:
-                    video = video.resized(height=height)
-            elif aspect_mode == "crop":
-                if width and height:
-                    video = video.resized(newsize=(width, height))
-            elif aspect_mode == "fill":
-                if width and height:
-                    video = video.resized(newsize=(width, height))
-                elif width:
-                    video = video.resized(width=width)
-                elif height:
-                    video = video.resized(height=height)
-
-        status("Calculating optimal settings...")
-        target_fps = 10
+    with GifSession(input_path, duration, width, height, aspect_mode, start,
+                    progress_callback, workers, method, engine, cancel) as session:
+        return session.convert(output_path, target_size_mb, tolerance)
 
-        with tempfile.NamedTemporaryFile(suffix=".gif", delete=False) as tmp_file:
-            tmp_path = tmp_file.name
 
-        status("Creating GIF...")
-        video.write_gif(tmp_path, fps=target_fps, logger=None)
+def _progress_frames(frames: Iterable, total: int, on_progress: Callable[[float], None]) -> Iterator:
+    """Pass frames through, reporting the fraction consumed in 5% steps."""
+    step = max(1, total // 20)
+    for n, frame in enumerate(frames, 1):
+        yield frame
+        if n % step == 0 and n < total:
+            on_progress(n / total)
 
-        file_size_mb = os.path.getsize(tmp_path) / (1024 * 1024)
 
-        if file_size_mb > target_size_mb:
-            status("Optimizing file size...")
-            fps_reduction_factor = (target_size_mb / file_size_mb) ** 0.5
-            new_fps = max(1, int(target_fps * fps_reduction_factor))
-            os.unlink(tmp_path)
-            video.write_gif(tmp_path, fps=new_fps, logger=None)
+def _write_clip(
+    video: Union[VideoSource, _ClipSource],
+    path: str,
+    settings: GifSettings,
+    workers: Optional[int] = None,
+    method: str = "global",
+    palettes: Optional[dict[int, np.ndarray]] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> None:
+    size = _scaled_size(video.w, video.h, settings.scale)
+    # VideoSource decodes at the output size, so write_gif() does not resize
+    frames = video.iter_frames(settings.fps, size)
+    if on_progress:
+        frames = _progress_frames(frames, _frame_count(video.duration, settings.fps), on_progress)
+    write_gif(frames, path, settings.fps, size, settings.colors, workers, method,
+              (palettes or {}).get(settings.colors), video.cancel)
 
-        shutil.move(tmp_path, output_path)
-        final_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-        status("Conversion complete")
-        return final_size_mb
 
-    finally:
-        video.close()
+def _describe(settings: GifSettings, size_bytes: Optional[int], verb: str) -> str:
+    msg = f"{verb}: {settings.fps} fps, {round(settings.scale * 100)}% size, {settings.colors} colors"
+    if size_bytes is not None:
+        msg += f" (~{size_bytes / (1024 * 1024):.2f} MB)"
+    return msg